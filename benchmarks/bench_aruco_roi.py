@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+Time per frame and re-acquisition of ROI-tracking ArUco detection.
+
+The robot's marker drifts over a textured court in a synthetic sequence.
+Every --gap_every frames it disappears for --gap frames and comes back
+somewhere else, as when the robot drives behind the net or out of view.
+The full-frame AgentDetector and the roi_tracking one run over the same
+frames. Reports ms per frame while tracking, how many frames after each
+reappearance the marker is found again, the time of those frames, and the
+largest disagreement with the full-frame result.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.localization import AgentDetector
+
+def synthetic_frames(n_frames, gap_every, gap, width=640, height=480, size=60):
+    rng = np.random.RandomState(0)
+    marker = cv2.aruco.generateImageMarker(
+        cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_6X6_50), 0, size)
+    marker = np.pad(marker, 8, constant_values=255)[:, :, None]
+    background = rng.randint(60, 160, (height, width, 3)).astype(np.uint8)
+    background = cv2.GaussianBlur(background, (5, 5), 0)
+    position = np.array([100.0, 100.0])
+    velocity = rng.uniform(-3, 3, 2)
+    frames, visible = [], []
+    limit = np.array([width, height]) - marker.shape[1] - 1
+    for i in range(n_frames):
+        frame = background.copy()
+        hidden = i % gap_every >= gap_every - gap
+        if i % gap_every == 0 and i:
+            # back in view somewhere else
+            position = rng.uniform(0, limit)
+            velocity = rng.uniform(-3, 3, 2)
+        position = np.clip(position + velocity, 0, limit)
+        if not hidden:
+            x, y = position.astype(int)
+            frame[y:y + marker.shape[0], x:x + marker.shape[1]] = marker
+        frames.append(frame)
+        visible.append(not hidden)
+    return frames, visible
+
+def main(args):
+    frames, visible = synthetic_frames(args.n_frames, args.gap_every, args.gap)
+    results = {}
+    for name, detector in (("full", AgentDetector()),
+                           ("roi", AgentDetector(roi_tracking=True,
+                                                 roi_padding=args.roi_padding))):
+        times, found = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            front, rear = detector.detect(frame)
+            times.append(time.perf_counter() - start)
+            found.append(None if front is None else np.concatenate((front, rear)))
+        results[name] = (np.array(times), found, detector.searches)
+    visible = np.array(visible)
+    # frames where the marker was seen on the previous frame too
+    tracking = visible & np.roll(visible, 1)
+    tracking[0] = False
+    returns = np.flatnonzero(visible & ~np.roll(visible, 1))[1:]
+    for name, (times, found, searches) in results.items():
+        detected = np.array([point is not None for point in found])
+        delays = []
+        for frame in returns:
+            hits = np.flatnonzero(detected[frame:frame + args.gap_every])
+            delays.append(hits[0] if len(hits) else np.inf)
+        print("%-4s tracking %6.2f ms/frame  detected %4d/%4d  re-acquired after %s "
+              "frames, %6.2f ms on those frames  searches %s" %
+              (name, 1000*np.mean(times[tracking]), detected[visible].sum(), visible.sum(),
+               "/".join("%g" % delay for delay in sorted(set(delays))),
+               1000*np.mean(times[returns]), searches))
+    errors = [np.abs(full - roi).max() for full, roi in zip(results["full"][1],
+                                                           results["roi"][1])
+              if full is not None and roi is not None]
+    print("largest roi vs full difference: %.2f px" % max(errors))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--frames", dest="n_frames", default=600, type=int,
+                        help="Frames in the sequence. Defaults to 600.")
+    parser.add_argument("--gap_every", dest="gap_every", default=100, type=int,
+                        help="Frames between disappearances. Defaults to 100.")
+    parser.add_argument("--gap", dest="gap", default=10, type=int,
+                        help="Frames the marker stays hidden. Defaults to 10.")
+    parser.add_argument("--roi_padding", dest="roi_padding", default=40, type=int,
+                        help="Crop padding in pixels. Defaults to 40.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Association cost and identity stability for PersistentTracker.
+
+A fixed set of balls is scattered over the court and observed for a number
+of frames with position noise and random missed detections, as the
+offboard camera would report them. Each frame is one update_target_abs
+call. Reports the time per update and, once the tracks have settled, how
+many confirmed tracks there are per ball and how often a ball's track
+identity changed between frames. The Hungarian method is used when scipy
+is installed, the greedy match otherwise; --greedy forces the latter.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.tracking import trackers
+from tbc_backend.tracking import PersistentTracker
+
+COURT = (78.0, 36.0)
+
+def run(n_balls, args, rng):
+    truth = rng.uniform((0, 0), COURT, (n_balls, 2))
+    tracker = PersistentTracker(offboard_noise=args.noise)
+    times = []
+    previous = None
+    switches = 0
+    for frame in range(args.n_frames):
+        seen = rng.random(n_balls) > args.miss_rate
+        detections = truth[seen] + rng.normal(0, args.noise, (np.count_nonzero(seen), 2))
+        detections = detections[rng.permutation(len(detections))]
+        start = time.perf_counter()
+        tracker.update_target_abs(detections)
+        times.append(time.perf_counter() - start)
+        # identity of the confirmed track nearest each ball
+        confirmed = tracker.hits >= tracker.min_hits
+        if not np.any(confirmed):
+            continue
+        distance = np.sum((truth[:, None, :] - tracker.means[None, confirmed, :])**2, axis=2)
+        identity = tracker.ids[confirmed][np.argmin(distance, axis=1)]
+        if previous is not None and frame >= args.warmup:
+            switches += np.count_nonzero(identity != previous)
+        previous = identity
+    settled = np.array(times[args.warmup:])
+    measured = args.n_frames - args.warmup
+    return (1000*np.median(settled), 1000*np.max(settled),
+            len(tracker.targets)/n_balls, switches/(n_balls*measured))
+
+def main(args):
+    if args.greedy:
+        trackers.linear_sum_assignment = None
+    method = "greedy" if trackers.linear_sum_assignment is None else "hungarian"
+    rng = np.random.default_rng(args.seed)
+    for n_balls in args.n_balls:
+        median, worst, tracks, switches = run(n_balls, args, rng)
+        print("%-9s %5d balls  update p50 %8.2f ms  max %8.2f ms  "
+              "tracks/ball %5.3f  id switches/ball/frame %.4f" %
+              (method, n_balls, median, worst, tracks, switches))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--balls", dest="n_balls", default=[10, 100, 300, 1000],
+                        type=int, nargs="+", help="""Simultaneous detections.
+                        Defaults to 10 100 300 1000.""")
+    parser.add_argument("--frames", dest="n_frames", default=60, type=int,
+                        help="Frames per run. Defaults to 60.")
+    parser.add_argument("--warmup", dest="warmup", default=10, type=int,
+                        help="Frames before measuring. Defaults to 10.")
+    parser.add_argument("--noise", dest="noise", default=.25, type=float,
+                        help="Detection noise in feet. Defaults to 0.25.")
+    parser.add_argument("--miss_rate", dest="miss_rate", default=.1, type=float,
+                        help="Chance a ball is not detected. Defaults to 0.1.")
+    parser.add_argument("--greedy", dest="greedy", action="store_true",
+                        help="Use the greedy match even when scipy is installed.")
+    parser.add_argument("--seed", dest="seed", default=0, type=int,
+                        help="Random seed. Defaults to 0.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Reply latency of 'get_target_rel' under concurrent producer load.
+
+Runs the tracking service behind either the synchronous single-socket
+Server or the AsyncServer, floods it from onboard and offboard producer
+processes sending large target lists, and times the controller's queries.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.common import AsyncServer, Client, Server
+from tbc_backend.tracking import TrackingService
+
+def produce(port, message_type, n_targets, stop):
+    client = Client(port)
+    targets = list(map(tuple, np.random.uniform(0, 8, (n_targets, 2))))
+    while not stop.is_set():
+        client.send(message_type, targets)
+
+def start_sync(port, service):
+    server = Server(port)
+
+    def serve():
+        for message_type, message in server.listen():
+            server.reply(service.handle(message_type, message))
+
+    threading.Thread(target=serve, daemon=True).start()
+    return {"controller": port, "onboard": port, "offboard": port}
+
+def start_async(port, service):
+    ports = {"controller": port, "onboard": port + 1, "offboard": port + 2}
+    server = AsyncServer(ports)
+    handler = lambda endpoint, message_type, message: service.handle(message_type,
+                                                                     message)
+    threading.Thread(target=server.run, args=(handler,), daemon=True).start()
+    return ports
+
+def run(mode, port, args):
+    service = TrackingService()
+    ports = (start_async if mode == "async" else start_sync)(port, service)
+    stop = multiprocessing.Event()
+    producers = []
+    for i in range(args.n_producers):
+        message_type, endpoint = [("offboard_targets", "offboard"),
+                                  ("onboard_targets", "onboard")][i % 2]
+        producer = multiprocessing.Process(target=produce, daemon=True,
+                                           args=(ports[endpoint], message_type,
+                                                 args.n_targets, stop))
+        producer.start()
+        producers.append(producer)
+    time.sleep(.5) # let the producers saturate the server
+    controller = Client(ports["controller"])
+    controller.send("agent_abs", (0., 0., 0.))
+    latencies = []
+    for _ in range(args.n_queries):
+        start = time.perf_counter()
+        controller.request("get_target_rel")
+        latencies.append(time.perf_counter() - start)
+    stop.set()
+    for producer in producers:
+        producer.terminate()
+    latencies = 1000*np.array(latencies)
+    print("%-5s %d producers: get_target_rel p50 %6.2f ms  p99 %6.2f ms" %
+          (mode, args.n_producers, np.percentile(latencies, 50),
+           np.percentile(latencies, 99)))
+
+def main(args):
+    run("sync", args.port, args)
+    run("async", args.port + 10, args)
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--producers", dest="n_producers", default=4, type=int,
+                        help="Concurrent producer processes. Defaults to 4.")
+    parser.add_argument("--targets", dest="n_targets", default=100, type=int,
+                        help="Targets per producer message. Defaults to 100.")
+    parser.add_argument("--queries", dest="n_queries", default=1000, type=int,
+                        help="Controller queries to time. Defaults to 1000.")
+    parser.add_argument("--port", dest="port", default=5800, type=int,
+                        help="First loopback port to use. Defaults to 5800.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+Blob localization with SimpleBlobDetector against connected components.
+
+Synthesizes frames from ground truth: ball positions on the court are
+projected into the image through the inverse of RANSACProjector and drawn
+anti-aliased at their exact sub-pixel centers and apparent sizes, among
+yellow-green streaks (a hose, a strap) that pass the color mask but are
+not round. Every backend detects on the same masks, its points are
+projected back with RANSACProjector.project and matched to the true
+positions. Prints the blob stage's milliseconds per frame and detections
+per millisecond, frames per second of the whole detect() call and the
+world-frame error in inches.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.localization import RANSACProjector, TargetDetector
+
+BALL_RADIUS = 1.3/12 # feet
+HEIGHT = 1/12.
+
+def to_image(projector, object_points, height=HEIGHT):
+    """Inverse of projector.project: (n, 2) ground points to pixels."""
+    points = np.column_stack((object_points, np.full(len(object_points), height)))
+    rays = np.linalg.inv(projector.lhs_part).dot((points + projector.rhs.T).T)
+    return (rays[:2]/rays[2]).T
+
+def synthetic_frames(projector, n_frames, n_balls, n_streaks, width=640, height=480):
+    """Yields (frame, true ground points) pairs."""
+    rng = np.random.RandomState(0)
+    # ground area the camera sees, from the projected image corners
+    corners = projector.project(np.array([[40., 40.], [width - 40., 40.],
+                                          [40., height - 40.],
+                                          [width - 40., height - 40.]]), HEIGHT)
+    low, high = corners.min(axis=0), corners.max(axis=0)
+    for _ in range(n_frames):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = (120, 80, 40)
+        for _ in range(n_streaks):
+            x, y = rng.randint(20, width - 20), rng.randint(20, height - 20)
+            angle = rng.uniform(0, np.pi)
+            length = rng.randint(25, 60)
+            end = (int(x + length*np.cos(angle)), int(y + length*np.sin(angle)))
+            cv2.line(frame, (x, y), end, (40, 200, 180), rng.randint(3, 6))
+        truth = []
+        while len(truth) < n_balls:
+            point = rng.uniform(low, high)
+            center, edge = to_image(projector, np.array([point, point + (BALL_RADIUS, 0)]))
+            radius = np.linalg.norm(edge - center)
+            if not (15 < center[0] < width - 15 and 15 < center[1] < height - 15 and
+                    radius > 2):
+                continue
+            # shift=4 draws at 1/16 pixel precision
+            cv2.circle(frame, tuple(int(round(16*c)) for c in center),
+                       int(round(16*radius)), (40, 220, 200), -1, cv2.LINE_AA, 4)
+            truth.append(point)
+        noise = rng.normal(0, 4, frame.shape)
+        yield np.clip(frame + noise, 0, 255).astype(np.uint8), np.array(truth)
+
+def world_errors(projector, image_points, truth, max_error):
+    """Returns errors in feet of detections matched to the nearest true
+    point and the number of unmatched detections."""
+    image_points = np.reshape(image_points, (-1, 2)).astype(np.float64)
+    if not len(image_points):
+        return np.empty(0), 0
+    world = projector.project(image_points, HEIGHT)
+    distance = np.linalg.norm(world[:, None, :] - truth[None, :, :], axis=2)
+    nearest = distance.min(axis=1)
+    matched = nearest < max_error
+    return nearest[matched], int(np.sum(~matched))
+
+def main(args):
+    projector = RANSACProjector()
+    frames = list(synthetic_frames(projector, args.n_frames, args.n_balls, args.n_streaks))
+    backends = [("simple", TargetDetector(blobs="simple")),
+                ("components", TargetDetector(blobs="components")),
+                ("components circ>=%.2f" % args.min_circularity,
+                 TargetDetector(blobs="components", min_circularity=args.min_circularity))]
+    masks = [backends[0][1]._make_mask(frame) for frame, _ in frames]
+    n_truth = args.n_frames*args.n_balls
+    for name, detector in backends:
+        detections, errors, false_positives = 0, [], 0
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            points = [detector._get_coords(mask) for mask in masks]
+        blob_time = (time.perf_counter() - start)/args.repeats
+        start = time.perf_counter()
+        for frame, _ in frames:
+            detector.detect(frame)
+        detect_time = time.perf_counter() - start
+        for image_points, (_, truth) in zip(points, frames):
+            detections += len(np.reshape(image_points, (-1, 2)))
+            matched, unmatched = world_errors(projector, image_points, truth, 3*BALL_RADIUS)
+            errors.extend(matched)
+            false_positives += unmatched
+        errors = 12*np.array(errors) # feet to inches
+        print("%-22s %5.2f ms/frame  %5.1f detections/ms  %6.1f frames/s  "
+              "found %4d/%d  false %4d  error mean %.3f in  p95 %.3f in" %
+              (name, 1000*blob_time/len(masks), detections/(1000*blob_time),
+               len(frames)/detect_time, len(errors), n_truth, false_positives,
+               errors.mean(), np.percentile(errors, 95)))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--frames", dest="n_frames", default=50, type=int,
+                        help="Synthetic frames. Defaults to 50.")
+    parser.add_argument("--balls", dest="n_balls", default=10, type=int,
+                        help="Balls per frame. Defaults to 10.")
+    parser.add_argument("--streaks", dest="n_streaks", default=3, type=int,
+                        help="Ball colored streaks per frame. Defaults to 3.")
+    parser.add_argument("--min_circularity", dest="min_circularity", default=0.5,
+                        type=float, help="""Circularity for the filtered
+                        components backend. Defaults to 0.5.""")
+    parser.add_argument("--repeats", dest="repeats", default=5, type=int,
+                        help="Passes over the masks for the blob timing. Defaults to 5.")
+    args = parser.parse_args()
+
+    main(args)
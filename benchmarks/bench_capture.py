@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+Frames/sec and transient allocations per frame for CalibratedCamera at 480p.
+
+Uses the 640x480 Raspberry Pi calibration. Frames come from a synthetic
+video file (or --video) so no camera is needed. The 'legacy' path
+reproduces the original capture_single, which allocated a new accumulator,
+average and remap output for every frame and remapped with floating point
+maps. Allocation is measured with tracemalloc as the peak traced memory
+above the steady state during one frame.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.cameras import CalibratedCamera, PI_CALIBRATION_FILE
+
+def make_video(path, n_frames, width=640, height=480):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30,
+                             (width, height))
+    for i in range(n_frames):
+        frame = np.full((height, width, 3), 60, dtype=np.uint8)
+        cv2.circle(frame, (40 + 5*i % 560, 240), 12, (40, 220, 200), -1)
+        writer.write(frame)
+    writer.release()
+
+def legacy_capture_single(camera, map_x, map_y):
+    average = np.zeros((camera.height, camera.width, 3), dtype=np.float32)
+    for i in range(camera.n_frames):
+        ret, frame = camera.camera.read()
+        cv2.accumulate(frame, average)
+    average = (average/float(camera.n_frames)).astype(np.uint8)
+    return cv2.remap(average, map_x, map_y, cv2.INTER_LINEAR)
+
+def undistort_points(calibration, points):
+    # raw points into the same frame that the remapped image would use
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+    return cv2.undistortPoints(points, calibration["camera_matrix"],
+                               calibration["dist_coeffs"],
+                               P=calibration["new_camera_matrix"]).reshape(-1, 2)
+
+def measure(name, capture, n_frames):
+    capture() # warm up buffers
+    tracemalloc.start()
+    transient = []
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        capture()
+        transient.append(tracemalloc.get_traced_memory()[1] - current)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    print("%-14s %7.1f frames/s  %8.1f KiB allocated/frame" %
+          (name, n_frames/elapsed, np.mean(transient)/1024.))
+
+def main(args):
+    video = args.video
+    if video is None:
+        video = os.path.join(tempfile.mkdtemp(), "bench_capture.avi")
+        make_video(video, args.n_frames*args.average + 10)
+    calibration = np.load(PI_CALIBRATION_FILE)
+    map_x, map_y = cv2.initUndistortRectifyMap(calibration["camera_matrix"],
+                                               calibration["dist_coeffs"], None,
+                                               calibration["new_camera_matrix"],
+                                               (int(calibration["width"]),
+                                                int(calibration["height"])), 5)
+    camera = CalibratedCamera(video, PI_CALIBRATION_FILE, n_frames=args.average)
+    measure("legacy", lambda: legacy_capture_single(camera, map_x, map_y),
+            args.n_frames)
+    camera = CalibratedCamera(video, PI_CALIBRATION_FILE, n_frames=args.average)
+    measure("preallocated", camera.capture_single, args.n_frames)
+    camera = CalibratedCamera(video, PI_CALIBRATION_FILE, n_frames=args.average,
+                              undistort_frame=False)
+    points = np.random.uniform(0, 480, (10, 2))
+    measure("points only", lambda: (camera.capture_single(),
+                                    undistort_points(calibration, points)),
+            args.n_frames)
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--video", dest="video", default=None, type=str,
+                        help="Recorded 480p video to read frames from.")
+    parser.add_argument("--frames", dest="n_frames", default=100, type=int,
+                        help="Captures per measurement. Defaults to 100.")
+    parser.add_argument("--average", dest="average", default=5, type=int,
+                        help="Frames averaged per capture. Defaults to 5.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark for the communication codecs.
+
+Reports messages/sec and mean per-message latency for target lists of
+1, 10 and 100 points, both for encode/decode alone and for a full
+REQ/REP round trip over loopback TCP.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.common import Client, Server, CODECS
+
+def make_targets(n_targets):
+    return list(map(tuple, np.random.uniform(0, 8, (n_targets, 2))))
+
+def bench_codec(codec, targets, n_messages):
+    start = time.perf_counter()
+    for _ in range(n_messages):
+        frames = codec.encode_request("offboard_targets", targets)
+        frames = [bytes(memoryview(frame)) for frame in frames]
+        codec.decode_request(frames)
+    return time.perf_counter() - start
+
+def bench_round_trip(codec_name, port, targets, n_messages):
+    server = Server(port, codec=codec_name)
+
+    def serve():
+        for _ in server.listen(autoreply=True):
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    client = Client(port, codec=codec_name)
+    start = time.perf_counter()
+    for _ in range(n_messages):
+        client.send("offboard_targets", targets)
+    return time.perf_counter() - start
+
+def report(codec_name, mode, n_targets, n_messages, elapsed):
+    print("%-8s %-10s %4d targets: %10.0f msg/s %8.1f us/msg" %
+          (codec_name, mode, n_targets, n_messages/elapsed,
+           1e6*elapsed/n_messages))
+
+def main(args):
+    port = args.port
+    for n_targets in (1, 10, 100):
+        targets = make_targets(n_targets)
+        for codec_name in sorted(CODECS):
+            elapsed = bench_codec(CODECS[codec_name](), targets, args.n_messages)
+            report(codec_name, "codec", n_targets, args.n_messages, elapsed)
+            elapsed = bench_round_trip(codec_name, port, targets, args.n_messages)
+            report(codec_name, "reqrep", n_targets, args.n_messages, elapsed)
+            port += 1
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--messages", dest="n_messages", default=2000, type=int,
+                        help="Messages per measurement. Defaults to 2000.")
+    parser.add_argument("--port", dest="port", default=5600, type=int,
+                        help="First loopback port to use. Defaults to 5600.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Color mask cost with the HSV threshold against the BGR lookup table.
+
+Times TargetDetector._make_mask at the Pi camera's 640x480 resolution for
+both paths and reports how many mask pixels differ because of the lookup
+table's quantization. Table build and cached load times are reported too.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.localization import COLORMASK_FILE, TargetDetector
+
+def make_frame(width, height, n_balls=10):
+    rng = np.random.RandomState(0)
+    frame = rng.randint(0, 256, (height, width, 3)).astype(np.uint8)
+    frame = cv2.GaussianBlur(frame, (31, 31), 0)
+    for x, y in rng.uniform((20, 20), (width - 20, height - 20), (n_balls, 2)):
+        cv2.circle(frame, (int(x), int(y)), 9, (40, 220, 200), -1)
+    return frame
+
+def time_mask(detector, frame, n_frames):
+    detector._make_mask(frame)
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        mask = detector._make_mask(frame)
+    return 1000*(time.perf_counter() - start)/n_frames, mask
+
+def main(args):
+    config_file = os.path.join(tempfile.mkdtemp(), "tennis_ball_color_mask.json")
+    shutil.copy(COLORMASK_FILE, config_file)
+    frame = make_frame(args.width, args.height)
+    start = time.perf_counter()
+    TargetDetector(config_file, color_lut=True, lut_bits=args.bits)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    lut_detector = TargetDetector(config_file, color_lut=True, lut_bits=args.bits)
+    loaded = time.perf_counter() - start
+    hsv_ms, hsv_mask = time_mask(TargetDetector(config_file), frame, args.n_frames)
+    lut_ms, lut_mask = time_mask(lut_detector, frame, args.n_frames)
+    print("table build %.1f ms, cached load %.1f ms" % (1000*built, 1000*loaded))
+    print("hsv %.3f ms/frame, lut (%d bits) %.3f ms/frame" %
+          (hsv_ms, args.bits, lut_ms))
+    print("mask pixels that differ: %.3f%%" % (100*np.mean(hsv_mask != lut_mask)))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--frames", dest="n_frames", default=200, type=int,
+                        help="Masks per measurement. Defaults to 200.")
+    parser.add_argument("--bits", dest="bits", default=5, type=int,
+                        help="Quantization bits per channel. Defaults to 5.")
+    parser.add_argument("--width", dest="width", default=640, type=int)
+    parser.add_argument("--height", dest="height", default=480, type=int)
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""
+Time-to-capture and vision queries per ball for the two controllers.
+
+A kinematic differential drive simulation stands in for the robot and the
+tracker. Each episode places one ball at a random distance and bearing and
+runs a controller until the robot's front passes within the capture radius
+of it. Every tracker query returns the true relative target plus noise and
+costs a round trip of latency seconds, during which the robot keeps running
+its last command. The wheels run at the commanded speed times a per-episode
+gain error, so open-loop moves drift the way the real robot does.
+
+PointAndShootController is driven the way control.run drives it: query,
+then one blocking move. UnicycleController is driven the way
+control.run_continuous drives it: wheel speeds every 1/rate seconds and a
+query every query_period seconds or whenever the target is reached.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.control import PointAndShootController, UnicycleController
+
+class SimulatedRobot(object):
+
+    def __init__(self, ball, gains, turn_scaling, forward_scaling, capture_radius,
+                 nose=0.5, dt=.005):
+        self.pose = np.zeros(3)
+        self.ball = np.array(ball)
+        self.gains = gains
+        self.turn_scaling = turn_scaling
+        self.forward_scaling = forward_scaling
+        self.capture_radius = capture_radius
+        self.nose = nose # distance from the wheel axle to the collector
+        self.dt = dt
+        self.time = 0.0
+        self.captured = False
+        self.speeds = (0, 0)
+
+    def observe(self, rng, rho_noise, phi_noise):
+        x, y, theta = self.pose
+        dx, dy = self.ball[0] - x, self.ball[1] - y
+        rho = np.hypot(dx, dy) + rng.normal(0, rho_noise)
+        phi = np.arctan2(dy, dx) - theta + rng.normal(0, phi_noise)
+        return rho, (phi + np.pi) % (2*np.pi) - np.pi, True
+
+    def run(self, seconds):
+        left, right = self.speeds[0]*self.gains[0], self.speeds[1]*self.gains[1]
+        forward = (left + right)/2.0/self.forward_scaling
+        turn = (right - left)/2.0/self.turn_scaling
+        end = self.time + seconds
+        while self.time < end and not self.captured:
+            dt = min(self.dt, end - self.time)
+            self.pose += (forward*np.cos(self.pose[2])*dt,
+                          forward*np.sin(self.pose[2])*dt, turn*dt)
+            self.time += dt
+            front = self.pose[:2] + self.nose*np.array([np.cos(self.pose[2]),
+                                                        np.sin(self.pose[2])])
+            self.captured = np.hypot(*(front - self.ball)) < self.capture_radius
+
+def point_and_shoot(robot, controller, rng, args):
+    queries = 0
+    while not robot.captured and robot.time < args.timeout:
+        target_rel = robot.observe(rng, args.rho_noise, args.phi_noise)
+        queries += 1
+        robot.run(args.latency)
+        move, delta = controller.control(*target_rel)
+        left, right, move_time, stop = move
+        robot.speeds = (left, right)
+        robot.run(move_time)
+        if stop:
+            robot.speeds = (0, 0)
+    return queries
+
+def continuous(robot, controller, rng, args):
+    queries = 0
+    last_query = None
+    while not robot.captured and robot.time < args.timeout:
+        if last_query is None or controller.target is None or \
+                robot.time - last_query >= args.query_period:
+            target_rel = robot.observe(rng, args.rho_noise, args.phi_noise)
+            queries += 1
+            last_query = robot.time
+            # the request blocks the loop, the robot keeps its last command
+            robot.run(args.latency)
+            controller.pop_deltas()
+            controller.set_target(*target_rel)
+        speeds = controller.step()
+        robot.speeds = (0, 0) if speeds is None else speeds
+        robot.run(controller.period)
+    return queries
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    results = {"point_and_shoot": [], "continuous": []}
+    for _ in range(args.n_balls):
+        distance = rng.uniform(args.min_distance, args.max_distance)
+        bearing = rng.uniform(-np.pi, np.pi)
+        ball = (distance*np.cos(bearing), distance*np.sin(bearing))
+        gains = 1 + rng.normal(0, args.gain_error, 2)
+        for name, drive, controller in (
+                ("point_and_shoot", point_and_shoot,
+                 PointAndShootController(buffer_distance=args.buffer_distance)),
+                ("continuous", continuous,
+                 UnicycleController(buffer_distance=args.buffer_distance,
+                                    rate=args.rate))):
+            robot = SimulatedRobot(ball, gains, controller.turn_scaling,
+                                   controller.forward_scaling, args.capture_radius)
+            episode_rng = np.random.default_rng(rng.integers(1 << 32))
+            queries = drive(robot, controller, episode_rng, args)
+            results[name].append((robot.captured, robot.time, queries))
+    for name, episodes in results.items():
+        captured = np.array([episode[0] for episode in episodes])
+        times = np.array([episode[1] for episode in episodes])[captured]
+        queries = np.array([episode[2] for episode in episodes])[captured]
+        print("%-16s captured %3d/%3d  time-to-capture mean %5.2f s  p90 %5.2f s  "
+              "queries/ball mean %5.1f" %
+              (name, captured.sum(), len(episodes),
+               times.mean() if len(times) else np.nan,
+               np.percentile(times, 90) if len(times) else np.nan,
+               queries.mean() if len(queries) else np.nan))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--balls", dest="n_balls", default=200, type=int,
+                        help="Episodes to run. Defaults to 200.")
+    parser.add_argument("--min_distance", dest="min_distance", default=2.0,
+                        type=float, help="Closest ball in feet. Defaults to 2.")
+    parser.add_argument("--max_distance", dest="max_distance", default=12.0,
+                        type=float, help="Furthest ball in feet. Defaults to 12.")
+    parser.add_argument("--buffer_distance", dest="buffer_distance", default=0.5,
+                        type=float, help="Controller buffer distance. Defaults to 0.5.")
+    parser.add_argument("--capture_radius", dest="capture_radius", default=0.3,
+                        type=float, help="Capture radius in feet. Defaults to 0.3.")
+    parser.add_argument("--latency", dest="latency", default=.1, type=float,
+                        help="Seconds per tracker query. Defaults to 0.1.")
+    parser.add_argument("--query_period", dest="query_period", default=.2,
+                        type=float, help="""Seconds between queries for the
+                        continuous controller. Defaults to 0.2.""")
+    parser.add_argument("--rate", dest="rate", default=50, type=float,
+                        help="Continuous controller rate. Defaults to 50 Hz.")
+    parser.add_argument("--gain_error", dest="gain_error", default=.05, type=float,
+                        help="Standard deviation of the wheel gain error. Defaults to 0.05.")
+    parser.add_argument("--rho_noise", dest="rho_noise", default=.05, type=float,
+                        help="Distance noise in feet. Defaults to 0.05.")
+    parser.add_argument("--phi_noise", dest="phi_noise", default=.02, type=float,
+                        help="Bearing noise in radians. Defaults to 0.02.")
+    parser.add_argument("--timeout", dest="timeout", default=60.0, type=float,
+                        help="Seconds before an episode is abandoned. Defaults to 60.")
+    parser.add_argument("--seed", dest="seed", default=0, type=int,
+                        help="Random seed. Defaults to 0.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+Detection loop cost of the debug visualization.
+
+Runs watch_offboard over synthetic frames with:
+  off          no visualization
+  imwrite      what '--show' used to do: copy every frame, draw on it and
+               write analysis_feed.jpg (to a temporary directory)
+  stream idle  a DebugStream nobody is watching
+  stream view  a DebugStream with an MJPEG viewer connected
+and reports the best ms per frame of --repeats runs and, for the viewer,
+the frames it received.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.request import urlopen
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.debug import DebugStream
+from tbc_backend.vision.localization import (make_agent_locator, make_target_locator,
+                                             watch_offboard)
+
+from bench_parallel_vision import MemoryCamera, synthetic_frames
+
+class ImwriteDebug(object):
+    """The old per-frame show path."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "analysis_feed.jpg")
+        self.viewers = 1
+
+    def publish(self, image, overlay):
+        from tbc_backend.vision.debug import render
+        cv2.imwrite(self.path, render(image.copy(), overlay))
+
+def measure(frames, debug, repeats=1):
+    return min(measure_once(frames, debug) for _ in range(repeats))
+
+def measure_once(frames, debug):
+    watch = watch_offboard(MemoryCamera(frames), make_target_locator(),
+                           make_agent_locator(), debug)
+    start = time.perf_counter()
+    try:
+        for _ in watch:
+            pass
+    except EOFError:
+        pass
+    return 1000*(time.perf_counter() - start)/len(frames)
+
+def view(port, received, stop):
+    response = urlopen("http://127.0.0.1:%d/" % port)
+    while not stop.is_set():
+        line = response.readline()
+        if line.startswith(b"Content-Length"):
+            length = int(line.split(b":")[1])
+            response.readline()
+            response.read(length)
+            received.append(length)
+
+def main(args):
+    frames = synthetic_frames(args.n_frames, 10)
+    measure(frames[:10], None) # warm up
+    print("off          %6.2f ms/frame" % measure(frames, None, args.repeats))
+    with tempfile.TemporaryDirectory() as directory:
+        print("imwrite      %6.2f ms/frame" % measure(frames, ImwriteDebug(directory),
+                                                         args.repeats))
+    stream = DebugStream(args.port, max_fps=args.max_fps)
+    print("stream idle  %6.2f ms/frame" % measure(frames, stream, args.repeats))
+    received, stop = [], threading.Event()
+    viewer = threading.Thread(target=view, args=(args.port, received, stop), daemon=True)
+    viewer.start()
+    while not stream.viewers:
+        time.sleep(.01)
+    print("stream view  %6.2f ms/frame, %d frames rendered, %d received" %
+          (measure(frames, stream, args.repeats), stream.rendered, len(received)))
+    stop.set()
+    stream.close()
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--frames", dest="n_frames", default=300, type=int,
+                        help="Synthetic frames to locate. Defaults to 300.")
+    parser.add_argument("--repeats", dest="repeats", default=3, type=int,
+                        help="Runs per configuration, the best is kept. Defaults to 3.")
+    parser.add_argument("--max_fps", dest="max_fps", default=5, type=float,
+                        help="Stream frame rate limit. Defaults to 5.")
+    parser.add_argument("--port", dest="port", default=8766, type=int,
+                        help="Local port for the stream. Defaults to 8766.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""
+Memory and throughput check for the request deduplication cache.
+
+Feeds millions of unique (sender, sequence) keys, with a retry every so
+often, and prints traced memory at regular checkpoints. The resident size
+of the cache should stop growing once the window is full.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.common.dedup import DedupCache
+
+def main(args):
+    cache = DedupCache(args.max_entries, args.max_age)
+    senders = [int.from_bytes(os.urandom(8), "little") for _ in range(args.n_senders)]
+    checkpoint = args.n_messages//10
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    for i in range(args.n_messages):
+        key = (senders[i % args.n_senders], i//args.n_senders)
+        cache.seen(key)
+        if not i % args.retry_every:
+            cache.seen(key) # simulated REQ retry, must be a hit
+        if not (i + 1) % checkpoint:
+            current, _ = tracemalloc.get_traced_memory()
+            print("%9d messages: %8.1f KiB traced, %s" %
+                  (i + 1, (current - baseline)/1024., cache.stats()))
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    print("%.2f us/message (with tracing)" % (1e6*elapsed/args.n_messages))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--messages", dest="n_messages", default=2000000, type=int,
+                        help="Number of messages to feed. Defaults to 2000000.")
+    parser.add_argument("--senders", dest="n_senders", default=3, type=int,
+                        help="Number of distinct senders. Defaults to 3.")
+    parser.add_argument("--entries", dest="max_entries", default=4096, type=int,
+                        help="Window size in entries. Defaults to 4096.")
+    parser.add_argument("--age", dest="max_age", default=None, type=float,
+                        help="Optional window size in seconds.")
+    parser.add_argument("--retry_every", dest="retry_every", default=100, type=int,
+                        help="Duplicate one message in this many. Defaults to 100.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+Cost of the stage instrumentation and of logging in place of print.
+
+Times a bare loop, a loop with a disabled INSTRUMENTS.time() stage, the
+same stage enabled, a disabled logger.debug call and the print calls it
+replaced (written to a null device). Then runs watch_offboard over
+synthetic frames with the instruments on and prints the per-stage
+breakdown and the JSON a StatsServer serves.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import json
+import logging
+import os
+import sys
+import time
+from urllib.request import urlopen
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.common.instruments import INSTRUMENTS, StatsServer
+from tbc_backend.vision.localization import (make_agent_locator, make_target_locator,
+                                             watch_offboard)
+
+from bench_parallel_vision import MemoryCamera, synthetic_frames
+
+def per_call(function, n_calls):
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        function()
+    return 1e9*(time.perf_counter() - start)/n_calls
+
+def main(args):
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.WARNING)
+    delta = np.random.RandomState(0).uniform(-8, 8, (10, 2))
+    null = open(os.devnull, "w")
+
+    def bare():
+        pass
+
+    def timed():
+        with INSTRUMENTS.time("bench"):
+            pass
+
+    def debug():
+        logger.debug("target deltas %s", delta)
+
+    def printed():
+        print(delta, file=null)
+
+    print("bare loop                %8.0f ns/call" % per_call(bare, args.n_calls))
+    print("instruments disabled     %8.0f ns/call" % per_call(timed, args.n_calls))
+    INSTRUMENTS.enable()
+    print("instruments enabled      %8.0f ns/call" % per_call(timed, args.n_calls))
+    print("logger.debug disabled    %8.0f ns/call" % per_call(debug, args.n_calls))
+    print("print(delta) to devnull  %8.0f ns/call" % per_call(printed, args.n_calls // 10))
+    INSTRUMENTS.reset()
+
+    frames = synthetic_frames(args.n_frames, 10)
+    watch = watch_offboard(MemoryCamera(frames), make_target_locator(), make_agent_locator())
+    try:
+        for _ in watch:
+            pass
+    except EOFError:
+        pass
+    print(INSTRUMENTS.format())
+    server = StatsServer(INSTRUMENTS, args.port)
+    stats = json.loads(urlopen("http://127.0.0.1:%d/" % args.port).read())
+    server.close()
+    print("served stages: %s" % ", ".join(sorted(stats["stages"])))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--calls", dest="n_calls", default=200000, type=int,
+                        help="Calls per overhead measurement. Defaults to 200000.")
+    parser.add_argument("--frames", dest="n_frames", default=200, type=int,
+                        help="Synthetic frames to locate. Defaults to 200.")
+    parser.add_argument("--port", dest="port", default=8765, type=int,
+                        help="Local port for the stats server. Defaults to 8765.")
+    args = parser.parse_args()
+
+    main(args)
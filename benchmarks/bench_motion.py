@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Command-to-wire latency and control-loop rate against a fake serial device.
+
+A pseudo-terminal stands in for the Arduino: the robot opens the slave end
+as its serial port and a reader thread timestamps every line arriving on
+the master end. The blocking ArduinoRobot and the ScheduledArduinoRobot
+are both driven with a stream of distinct moves. The scheduled robot is
+given a new, preempting move every period seconds; commands that are
+preempted before the Arduino's minimum write interval has passed never
+reach the wire. Both robots are built with warmup=0, since the pty has no
+bootloader to wait for.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import threading
+import time
+import tty
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.control import ArduinoRobot, ScheduledArduinoRobot
+
+class FakeArduino(object):
+    """Reads lines written to a pty and timestamps their arrival."""
+
+    def __init__(self):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self.arrivals = []
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        buffer = b""
+        while True:
+            buffer += os.read(self.master, 1024)
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                self.arrivals.append((time.perf_counter(), line.strip()))
+
+def drive(robot, n_commands, move_time, period, scheduled):
+    sent = {}
+    start = time.perf_counter()
+    for i in range(n_commands):
+        speed = 10 + i % 80 # unique consecutive commands, none skipped as redundant
+        sent[b"%d %d" % (speed, speed)] = time.perf_counter()
+        if scheduled:
+            robot.command(speed, speed, move_time, preempt=True)
+            time.sleep(period)
+        else:
+            robot.command(speed, speed, move_time)
+    return sent, time.perf_counter() - start
+
+def report(name, fake, sent, elapsed):
+    latencies = [arrival - sent[line] for arrival, line in fake.arrivals if line in sent]
+    print("%-9s loop %6.1f Hz  %3d/%3d commands reached the wire  "
+          "command-to-wire p50 %6.2f ms  max %6.2f ms" %
+          (name, len(sent)/elapsed, len(latencies), len(sent),
+           1000*np.median(latencies), 1000*np.max(latencies)))
+
+def main(args):
+    fake = FakeArduino()
+    robot = ArduinoRobot(fake.port, 38400, warmup=0)
+    sent, elapsed = drive(robot, args.n_commands, args.move_time, args.period, False)
+    time.sleep(.2)
+    report("blocking", fake, sent, elapsed)
+
+    fake = FakeArduino()
+    robot = ScheduledArduinoRobot(fake.port, 38400, warmup=0)
+    sent, elapsed = drive(robot, args.n_commands, args.move_time, args.period, True)
+    robot.wait()
+    time.sleep(.2)
+    report("scheduled", fake, sent, elapsed)
+    robot.close()
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--commands", dest="n_commands", default=20, type=int,
+                        help="Commands to send. Defaults to 20.")
+    parser.add_argument("--move_time", dest="move_time", default=.2, type=float,
+                        help="Duration of each move in seconds. Defaults to 0.2.")
+    parser.add_argument("--period", dest="period", default=.02, type=float,
+                        help="""Seconds between commands for the scheduled robot.
+                        Defaults to 0.02 (50 Hz).""")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Offboard frame rate of watch_offboard against watch_offboard_parallel.
+
+Frames are synthetic: a court colored background with drifting balls and
+the robot's ArUco marker. They are served from memory, so the numbers are
+the location throughput alone, without any camera limit. The parallel runs
+use 1 to --workers worker processes and are checked to return the same
+results, in the same order, as the serial run.
+
+Worker processes only pay off with spare cores, check nproc before reading
+the numbers.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from functools import partial
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.localization import (make_agent_locator, make_target_locator,
+                                             watch_offboard, watch_offboard_parallel)
+
+class MemoryCamera(object):
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = 0
+
+    def capture_single(self):
+        if self.position >= len(self.frames):
+            raise EOFError("End of frames.")
+        self.position += 1
+        return self.frames[self.position - 1]
+
+class NoAgentLocator(object):
+    """Stands in for AgentLocator with --targets_only."""
+
+    def locate(self, image, display_image=None):
+        return (None, None, None), display_image
+
+def no_agent_locator():
+    return NoAgentLocator()
+
+def synthetic_frames(n_frames, n_balls, width=640, height=480):
+    rng = np.random.RandomState(0)
+    marker = cv2.aruco.generateImageMarker(
+        cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_6X6_50), 0, 60)
+    positions = rng.uniform((30, 30), (width - 30, height - 30), (n_balls, 2))
+    velocities = rng.uniform(-2, 2, (n_balls, 2))
+    frames = []
+    for i in range(n_frames):
+        positions = np.clip(positions + velocities, 20, (width - 20, height - 20))
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = (120, 80, 40)
+        for x, y in positions:
+            cv2.circle(frame, (int(x), int(y)), 8, (40, 220, 200), -1)
+        x = 100 + i % 300
+        frame[200:260, x:x + 60] = marker[:, :, None]
+        frames.append(frame)
+    return frames
+
+def measure(watch, n_frames):
+    start = time.perf_counter()
+    results = []
+    try:
+        for result in watch:
+            results.append(result)
+    except EOFError:
+        pass
+    elapsed = time.perf_counter() - start
+    return results, n_frames/elapsed
+
+def same(first, second):
+    for (targets_a, agent_a), (targets_b, agent_b) in zip(first, second):
+        if not np.allclose(np.reshape(targets_a, (-1, 2)), np.reshape(targets_b, (-1, 2))):
+            return False
+        if not all(a == b or np.isclose(a, b) for a, b in zip(agent_a, agent_b)):
+            return False
+    return len(first) == len(second)
+
+def main(args):
+    frames = synthetic_frames(args.n_frames, args.n_balls)
+    agent_factory = no_agent_locator if args.targets_only else make_agent_locator
+    print("%d frames, %d balls, %d cores" % (len(frames), args.n_balls, os.cpu_count()))
+    serial, fps = measure(watch_offboard(MemoryCamera(frames), make_target_locator(),
+                                         agent_factory()), len(frames))
+    print("serial       %7.1f fps" % fps)
+    for n_workers in range(1, args.workers + 1):
+        watch = watch_offboard_parallel(MemoryCamera(frames), n_workers,
+                                        partial(make_target_locator), agent_factory)
+        # the first frame also pays for starting the workers, leave it out
+        first = next(watch)
+        results, fps = measure(watch, len(frames) - 1)
+        print("%d worker%s    %7.1f fps  results match serial: %s" %
+              (n_workers, " " if n_workers == 1 else "s", fps,
+               same(serial, [first] + results)))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--frames", dest="n_frames", default=300, type=int,
+                        help="Frames to process. Defaults to 300.")
+    parser.add_argument("--balls", dest="n_balls", default=10, type=int,
+                        help="Balls per frame. Defaults to 10.")
+    parser.add_argument("--workers", dest="workers", default=os.cpu_count(), type=int,
+                        help="Largest worker count to try. Defaults to the core count.")
+    parser.add_argument("--targets_only", dest="targets_only", action="store_true",
+                        help="Skip ArUco agent location.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""
+Route length, turning and planning time for the route planner.
+
+Balls are scattered uniformly over a tennis court and the robot starts at
+one corner facing along the baseline. The greedy route is what
+MemorylessTracker drives today: always the nearest remaining ball. The
+planned routes are nearest neighbour with turn cost and the same after
+2-opt. The incremental row times RoutePlanner.update after the first ball
+is collected and one new ball appears, against planning that target set
+from scratch.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.tracking import RoutePlanner
+
+COURT = (78.0, 36.0)
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def report(name, planner, start, heading, route, seconds):
+    length, turning = planner.cost(start, heading, route)
+    print("  %-12s length %8.1f ft  turning %7.1f rad  cost %8.1f  time %9.2f ms" %
+          (name, length, turning, length + planner.turn_weight*turning,
+           1000*seconds))
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    start, heading = np.zeros(2), 0.0
+    for n_balls in args.n_balls:
+        targets = rng.uniform((0, 0), COURT, (n_balls, 2))
+        print("%d balls" % n_balls)
+        greedy = RoutePlanner(turn_weight=0.0)
+        route, seconds = timed(greedy.nearest_neighbour, start, heading, targets)
+        planner = RoutePlanner(turn_weight=args.turn_weight)
+        report("greedy", planner, start, heading, route, seconds)
+        route, seconds = timed(planner.nearest_neighbour, start, heading, targets)
+        report("nn", planner, start, heading, route, seconds)
+        route, seconds = timed(planner.plan, start, heading, targets)
+        report("nn+2-opt", planner, start, heading, route, seconds)
+
+        # the robot collects the first ball and a new one rolls in
+        start = route[0]
+        heading = np.arctan2(*(route[0] - np.zeros(2))[::-1])
+        jitter = rng.normal(0, .05, (n_balls - 1, 2))
+        targets = np.vstack((route[1:] + jitter, rng.uniform((0, 0), COURT, (1, 2))))
+        targets = targets[rng.permutation(len(targets))]
+        route, seconds = timed(planner.update, start, heading, targets)
+        report("incremental", planner, start, heading, route, seconds)
+        route, seconds = timed(RoutePlanner(turn_weight=args.turn_weight).plan,
+                               start, heading, targets)
+        report("replan", planner, start, heading, route, seconds)
+        start, heading = np.zeros(2), 0.0
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--balls", dest="n_balls", default=[10, 100, 1000], type=int,
+                        nargs="+", help="Ball counts to plan for. Defaults to 10 100 1000.")
+    parser.add_argument("--turn_weight", dest="turn_weight", default=0.5, type=float,
+                        help="Feet per radian of turning. Defaults to 0.5.")
+    parser.add_argument("--seed", dest="seed", default=0, type=int,
+                        help="Random seed. Defaults to 0.")
+    args = parser.parse_args()
+
+    main(args)
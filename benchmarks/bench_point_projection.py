@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Accuracy and throughput of point-level undistortion against full-frame remap.
+
+The remap path undistorts the whole frame, detects balls and projects them
+with RANSACProjector. The point path detects balls on the raw frame and
+projects only those points with LensProjector. Frames come from a recorded
+raw (not undistorted) video given with --video, or are synthesized by
+drawing balls on a plain background.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.cameras import make_undistort_maps
+from tbc_backend.vision.localization import (CALIBRATION_FILE, LensProjector,
+                                             RANSACProjector, TargetDetector)
+
+def synthetic_frames(n_frames, n_balls, width=640, height=480):
+    rng = np.random.RandomState(0)
+    for _ in range(n_frames):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = (120, 80, 40)
+        for x, y in rng.uniform((30, 30), (width - 30, height - 30), (n_balls, 2)):
+            cv2.circle(frame, (int(x), int(y)), 8, (40, 220, 200), -1)
+        yield frame
+
+def video_frames(path):
+    video = cv2.VideoCapture(path)
+    while True:
+        ret, frame = video.read()
+        if not ret:
+            return
+        yield frame
+
+def main(args):
+    calibration = dict(np.load(CALIBRATION_FILE))
+    map_1, map_2 = make_undistort_maps(calibration)
+    detector = TargetDetector()
+    ransac = RANSACProjector()
+    lens = LensProjector()
+    if args.video:
+        frames = list(video_frames(args.video))
+    else:
+        frames = list(synthetic_frames(args.n_frames, args.n_balls))
+    remapped = np.empty_like(frames[0])
+    errors = []
+    found = {"remap": 0, "points": 0}
+    elapsed = {"remap": 0.0, "points": 0.0}
+    for frame in frames:
+        start = time.perf_counter()
+        cv2.remap(frame, map_1, map_2, cv2.INTER_LINEAR, dst=remapped)
+        image_points, _ = detector.detect(remapped)
+        remap_world = ransac.project(image_points, 1/12.)
+        elapsed["remap"] += time.perf_counter() - start
+        start = time.perf_counter()
+        image_points, _ = detector.detect(frame)
+        point_world = lens.project(image_points, 1/12.)
+        elapsed["points"] += time.perf_counter() - start
+        found["remap"] += len(remap_world)
+        found["points"] += len(point_world)
+        if len(remap_world) and len(point_world):
+            distance = np.linalg.norm(remap_world[:, None, :] - point_world[None, :, :],
+                                      axis=2)
+            errors.extend(distance.min(axis=1))
+    errors = 12*np.array(errors) # feet to inches
+    for path in ("remap", "points"):
+        print("%-6s %7.1f frames/s  %5d detections" %
+              (path, len(frames)/elapsed[path], found[path]))
+    print("world-frame difference: mean %.3f in  p95 %.3f in  max %.3f in" %
+          (errors.mean(), np.percentile(errors, 95), errors.max()))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--video", dest="video", default=None, type=str,
+                        help="Recorded raw 480p video from the offboard camera.")
+    parser.add_argument("--frames", dest="n_frames", default=100, type=int,
+                        help="Synthetic frames to generate. Defaults to 100.")
+    parser.add_argument("--balls", dest="n_balls", default=10, type=int,
+                        help="Balls per synthetic frame. Defaults to 10.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Pose accuracy and update cost for PoseEstimator on synthetic trajectories.
+
+The robot drives a random smooth trajectory. The controller reports
+(rho, phi) moves at the control rate with a per-run scale error and noise.
+The offboard camera takes a noisy ArUco fix every fix_period seconds and
+some frames miss the marker. Each fix is delivered latency seconds (plus
+jitter) after its frame was taken, so it arrives after moves that happened
+later.
+
+The served pose is scored against the truth at every control tick for:
+  dead reckoning   moves only
+  overwrite        what the trackers do today: fixes overwrite the pose on
+                   arrival, moves accumulate on top
+  ekf (arrival)    PoseEstimator with every input stamped on arrival
+  ekf (stamped)    PoseEstimator with fixes stamped at capture time and
+                   replayed into place
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.tracking.estimators import PoseEstimator, wrap_angle
+
+def trajectory(rng, args):
+    """Returns tick times, true poses and true (rho, phi) moves per tick."""
+    times = np.arange(0, args.duration, 1.0/args.rate)
+    speed = np.clip(0.5 + 0.3*np.sin(times/3.0 + rng.uniform(0, 6)), 0, None)
+    turn = 0.6*np.sin(times/2.0 + rng.uniform(0, 6)) + 0.3*np.sin(times/0.7)
+    rho = speed/args.rate
+    phi = turn/args.rate
+    headings = np.cumsum(phi)
+    x = np.cumsum(rho*np.cos(headings))
+    y = np.cumsum(rho*np.sin(headings))
+    return times, np.stack((x, y, headings), axis=1), rho, phi
+
+def events(rng, times, poses, rho, phi, args):
+    """Returns (arrival, kind, data, timestamp) in arrival order."""
+    scale = 1 + rng.normal(0, args.odometry_bias, 2)
+    moves = [(t, "move", (r*scale[0]*(1 + rng.normal(0, .02)),
+                          p*scale[1] + rng.normal(0, .002)), t)
+             for t, r, p in zip(times, rho, phi)]
+    fixes = []
+    step = int(round(args.fix_period*args.rate))
+    for i in range(0, len(times), step):
+        if rng.random() < args.miss_rate:
+            continue
+        x, y, heading = poses[i]
+        fix = (x + rng.normal(0, .15), y + rng.normal(0, .15),
+               wrap_angle(heading + rng.normal(0, .05)))
+        arrival = times[i] + args.latency + abs(rng.normal(0, args.jitter))
+        fixes.append((arrival, "fix", fix, times[i]))
+    return sorted(moves + fixes, key=lambda event: event[0])
+
+class Overwrite(object):
+
+    def __init__(self):
+        self.state = np.zeros(3)
+
+    def predict(self, rho, phi, timestamp=None):
+        self.state[2] += phi
+        self.state[:2] += rho*np.cos(self.state[2]), rho*np.sin(self.state[2])
+
+    def correct(self, x, y, phi, timestamp=None):
+        self.state[:] = x, y, phi
+
+    def pose(self):
+        return tuple(self.state)
+
+class DeadReckoning(Overwrite):
+
+    def correct(self, x, y, phi, timestamp=None):
+        pass
+
+def run(name, estimator, stream, times, poses, stamped):
+    index = {t: i for i, t in enumerate(times)}
+    errors, move_times, fix_times = [], [], []
+    for arrival, kind, data, timestamp in stream:
+        stamp = timestamp if stamped else arrival
+        start = time.perf_counter()
+        if kind == "move":
+            estimator.predict(*data, timestamp=stamp)
+            move_times.append(time.perf_counter() - start)
+            # the pose the controller would be served at this tick
+            x, y, heading = estimator.pose()
+            true_x, true_y, true_heading = poses[index[timestamp]]
+            errors.append((np.hypot(x - true_x, y - true_y),
+                           abs(wrap_angle(heading - true_heading))))
+        else:
+            estimator.correct(*data, timestamp=stamp)
+            fix_times.append(time.perf_counter() - start)
+    errors = np.array(errors)
+    print("%-16s position rms %6.3f ft  p95 %6.3f ft  heading rms %6.3f rad  "
+          "move %6.1f us  fix %6.1f us" %
+          (name, np.sqrt(np.mean(errors[:, 0]**2)), np.percentile(errors[:, 0], 95),
+           np.sqrt(np.mean(errors[:, 1]**2)), 1e6*np.mean(move_times),
+           1e6*np.mean(fix_times) if fix_times else 0.0))
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    times, poses, rho, phi = trajectory(rng, args)
+    stream = events(rng, times, poses, rho, phi, args)
+    print("%.0f s trajectory, %d moves at %g Hz, %d fixes, fix latency %.2f s" %
+          (args.duration, len(times), args.rate,
+           sum(kind == "fix" for _, kind, _, _ in stream), args.latency))
+    run("dead reckoning", DeadReckoning(), stream, times, poses, False)
+    run("overwrite", Overwrite(), stream, times, poses, False)
+    run("ekf (arrival)", PoseEstimator(), stream, times, poses, False)
+    estimator = PoseEstimator()
+    run("ekf (stamped)", estimator, stream, times, poses, True)
+    print("stamped estimator replayed %.1f moves per fix" %
+          (estimator.replayed/max(1, sum(kind == "fix" for _, kind, _, _ in stream))))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--duration", dest="duration", default=60.0, type=float,
+                        help="Trajectory length in seconds. Defaults to 60.")
+    parser.add_argument("--rate", dest="rate", default=50.0, type=float,
+                        help="Controller move rate in Hz. Defaults to 50.")
+    parser.add_argument("--fix_period", dest="fix_period", default=.1, type=float,
+                        help="Seconds between ArUco frames. Defaults to 0.1.")
+    parser.add_argument("--latency", dest="latency", default=.15, type=float,
+                        help="Seconds from frame to fix arrival. Defaults to 0.15.")
+    parser.add_argument("--jitter", dest="jitter", default=.03, type=float,
+                        help="Standard deviation of the extra delay. Defaults to 0.03.")
+    parser.add_argument("--miss_rate", dest="miss_rate", default=.2, type=float,
+                        help="Chance a frame misses the marker. Defaults to 0.2.")
+    parser.add_argument("--odometry_bias", dest="odometry_bias", default=.05,
+                        type=float, help="""Standard deviation of the move scale
+                        error. Defaults to 0.05.""")
+    parser.add_argument("--seed", dest="seed", default=0, type=int,
+                        help="Random seed. Defaults to 0.")
+    args = parser.parse_args()
+
+    main(args)
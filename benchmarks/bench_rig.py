@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Aggregate frame rate and duplicate suppression of a multi-camera CameraRig.
+
+Every camera replays its own synthetic feed from memory: drifting balls and
+the robot's ArUco marker over a court colored background. The rig is run
+with 1 to --cameras cameras and reports rounds per second (one frame from
+every camera) and aggregate frames per second across all cameras.
+
+Duplicate suppression is scored separately on world-frame detections: the
+court is split between the cameras with overlapping strips, each camera
+reports the balls in its part with its own noise, and the merged count is
+compared with the true number of balls.
+
+The cameras run on threads, OpenCV releases the GIL while detecting, so
+aggregate fps only grows with spare cores, check nproc before reading the
+numbers.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.localization import make_agent_locator, make_target_locator
+from tbc_backend.vision.rig import CameraRig, merge_targets
+
+from bench_parallel_vision import MemoryCamera, synthetic_frames
+
+def measure(n_cameras, frames, n_rounds):
+    views = [(MemoryCamera(frames), make_target_locator(), make_agent_locator(), None)
+             for _ in range(n_cameras)]
+    rig = CameraRig(views)
+    rig.locate() # warm up the threads
+    start = time.perf_counter()
+    for _ in range(n_rounds):
+        rig.locate()
+    elapsed = time.perf_counter() - start
+    rig.close()
+    return n_rounds/elapsed, n_rounds*n_cameras/elapsed
+
+def duplicates(rng, n_cameras, n_balls, overlap, noise, merge_distance):
+    """Returns extra targets after merging, extra detections before, and the
+    largest position error."""
+    balls = rng.uniform(0, 8, (n_balls, 2))
+    edges = np.linspace(0, 8, n_cameras + 1)
+    detections = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        seen = balls[(balls[:, 0] > low - overlap) & (balls[:, 0] < high + overlap)]
+        detections.append(seen + rng.normal(0, noise, seen.shape))
+    merged = np.array(merge_targets(detections, merge_distance)).reshape(-1, 2)
+    error = np.sqrt(np.sum((merged[:, None] - balls[None])**2, axis=2)).min(axis=1).max()
+    return len(merged) - n_balls, sum(map(len, detections)) - n_balls, error
+
+def main(args):
+    frames = synthetic_frames(args.n_rounds + 1, args.n_balls)
+    print("%d rounds, %d balls per frame, %d cores" %
+          (args.n_rounds, args.n_balls, os.cpu_count()))
+    for n_cameras in range(1, args.cameras + 1):
+        rounds, aggregate = measure(n_cameras, frames, args.n_rounds)
+        print("%d camera%s  %7.1f rounds/s  %7.1f aggregate fps" %
+              (n_cameras, " " if n_cameras == 1 else "s", rounds, aggregate))
+    rng = np.random.RandomState(0)
+    for n_cameras in range(2, args.cameras + 1):
+        extra, raw, error = zip(*[duplicates(rng, n_cameras, args.court_balls, args.overlap,
+                                             args.noise, args.merge_distance)
+                                  for _ in range(args.trials)])
+        print("%d cameras  %5.1f raw duplicates  %+5.2f after merge  "
+              "worst error %.2f ft" % (n_cameras, np.mean(raw), np.mean(extra), max(error)))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--cameras", dest="cameras", default=4, type=int,
+                        help="Largest camera count to try. Defaults to 4.")
+    parser.add_argument("--rounds", dest="n_rounds", default=100, type=int,
+                        help="Frames per camera to time. Defaults to 100.")
+    parser.add_argument("--balls", dest="n_balls", default=10, type=int,
+                        help="Balls per synthetic frame. Defaults to 10.")
+    parser.add_argument("--court_balls", dest="court_balls", default=30, type=int,
+                        help="Balls on the court for the merge check. Defaults to 30.")
+    parser.add_argument("--overlap", dest="overlap", default=1.0, type=float,
+                        help="Feet each camera sees past its share. Defaults to 1.")
+    parser.add_argument("--noise", dest="noise", default=.1, type=float,
+                        help="Per camera position noise in feet. Defaults to 0.1.")
+    parser.add_argument("--merge_distance", dest="merge_distance", default=.5,
+                        type=float, help="Merge distance in feet. Defaults to 0.5.")
+    parser.add_argument("--trials", dest="trials", default=50, type=int,
+                        help="Random courts for the merge check. Defaults to 50.")
+    args = parser.parse_args()
+
+    main(args)
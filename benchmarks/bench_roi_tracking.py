@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+CPU time per frame and recall of ROI-tracking ball detection.
+
+Runs the full-frame TargetDetector and the roi_tracking one over the same
+sequence and counts a full-frame detection as recalled when the ROI
+detector reports a point within 3 pixels of it. Frames come from a recorded
+video given with --video, or a synthetic sequence of slowly drifting balls.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.vision.localization import TargetDetector
+
+def synthetic_frames(n_frames, n_balls, width=640, height=480):
+    rng = np.random.RandomState(0)
+    positions = rng.uniform((30, 30), (width - 30, height - 30), (n_balls, 2))
+    velocities = rng.uniform(-2, 2, (n_balls, 2))
+    for i in range(n_frames):
+        if i and not i % 50:
+            # a new ball rolls into view now and then
+            positions = np.vstack((positions, rng.uniform((30, 30), (width - 30, height - 30))))
+            velocities = np.vstack((velocities, rng.uniform(-2, 2, (1, 2))))
+        positions = np.clip(positions + velocities, 20, (width - 20, height - 20))
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = (120, 80, 40)
+        for x, y in positions:
+            cv2.circle(frame, (int(x), int(y)), 8, (40, 220, 200), -1)
+        yield frame
+
+def video_frames(path):
+    video = cv2.VideoCapture(path)
+    while True:
+        ret, frame = video.read()
+        if not ret:
+            return
+        yield frame
+
+def main(args):
+    if args.video:
+        frames = list(video_frames(args.video))
+    else:
+        frames = list(synthetic_frames(args.n_frames, args.n_balls))
+    detectors = {"full": TargetDetector(),
+                 "roi": TargetDetector(roi_tracking=True,
+                                       sweep_interval=args.sweep_interval)}
+    cpu_time = {name: 0.0 for name in detectors}
+    detections = {name: [] for name in detectors}
+    for frame in frames:
+        for name, detector in detectors.items():
+            start = time.process_time()
+            image_points, _ = detector.detect(frame)
+            cpu_time[name] += time.process_time() - start
+            detections[name].append(np.reshape(image_points, (-1, 2)))
+    recalled = total = 0
+    for full, roi in zip(detections["full"], detections["roi"]):
+        total += len(full)
+        if len(full) and len(roi):
+            distance = np.linalg.norm(full[:, None, :] - roi[None, :, :], axis=2)
+            recalled += np.sum(distance.min(axis=1) <= 3)
+    for name in detectors:
+        print("%-4s %6.3f ms CPU/frame" % (name, 1000*cpu_time[name]/len(frames)))
+    print("recall of roi against full frame: %.4f (%d/%d)" %
+          (recalled/float(max(total, 1)), recalled, total))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--video", dest="video", default=None, type=str,
+                        help="Recorded video to run both detectors on.")
+    parser.add_argument("--frames", dest="n_frames", default=300, type=int,
+                        help="Synthetic frames to generate. Defaults to 300.")
+    parser.add_argument("--balls", dest="n_balls", default=8, type=int,
+                        help="Balls in the first synthetic frame. Defaults to 8.")
+    parser.add_argument("--sweep_interval", dest="sweep_interval", default=10,
+                        type=int, help="Frames between full sweeps. Defaults to 10.")
+    args = parser.parse_args()
+
+    main(args)
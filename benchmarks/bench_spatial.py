@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Target query cost with and without the grid index.
+
+For each target count, targets are scattered uniformly over the court and
+queried from random agent positions. The brute force column is what
+MemorylessTracker.get_target_rel does: distances to every target and the
+exclusion box as full-array masks. The grid columns use GridIndex for the
+same nearest-outside-the-box query, for the 5 nearest targets, for a 3 ft
+radius and for one insert plus one removal, the cost of a ball appearing
+and being collected.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.tracking.spatial import GridIndex
+
+COURT = (78.0, 36.0)
+
+def brute_force(targets, agent, exclude):
+    delta = targets - agent
+    excluded = np.logical_and(np.abs(delta[:, 0]) < exclude,
+                              np.abs(delta[:, 1]) < exclude)
+    delta = delta[~excluded]
+    dist = np.sqrt(np.sum(np.power(delta, 2), axis=1))
+    return np.argmin(dist)
+
+def per_call(function, queries):
+    start = time.perf_counter()
+    for query in queries:
+        function(query)
+    return 1e6*(time.perf_counter() - start)/len(queries)
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    print("%7s %12s %12s %12s %12s %14s %10s" %
+          ("targets", "brute us", "grid us", "grid k=5 us", "radius us",
+           "insert+rm us", "build ms"))
+    for n_targets in args.n_targets:
+        targets = rng.uniform((0, 0), COURT, (n_targets, 2))
+        queries = rng.uniform((0, 0), COURT, (args.n_queries, 2))
+        start = time.perf_counter()
+        index = GridIndex(args.cell_size)
+        for i, (x, y) in enumerate(targets):
+            index.insert(i, x, y)
+        build = time.perf_counter() - start
+
+        # both must agree on the nearest target outside the box
+        for agent in queries[:20]:
+            expected = np.sort(np.hypot(*(targets - agent).T)[
+                ~np.all(np.abs(targets - agent) < args.exclude, axis=1)])[0]
+            assert np.isclose(index.nearest(*agent, exclude=args.exclude)[0][0], expected)
+
+        brute = per_call(lambda agent: brute_force(targets, agent, args.exclude), queries)
+        grid = per_call(lambda agent: index.nearest(*agent, exclude=args.exclude), queries)
+        nearest_k = per_call(lambda agent: index.nearest(*agent, k=5), queries)
+        radius = per_call(lambda agent: index.radius(*agent, 3.0), queries)
+        extra = iter(range(n_targets, n_targets + len(queries)))
+        def churn(agent):
+            point_id = next(extra)
+            index.insert(point_id, *agent)
+            index.remove(point_id)
+        churned = per_call(churn, queries)
+        print("%7d %12.1f %12.1f %12.1f %12.1f %14.1f %10.2f" %
+              (n_targets, brute, grid, nearest_k, radius, churned, 1000*build))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--targets", dest="n_targets", default=[10, 100, 1000, 10000],
+                        type=int, nargs="+", help="Target counts. Defaults to 10 100 1000 10000.")
+    parser.add_argument("--queries", dest="n_queries", default=2000, type=int,
+                        help="Queries per measurement. Defaults to 2000.")
+    parser.add_argument("--cell_size", dest="cell_size", default=2.0, type=float,
+                        help="Grid cell size in feet. Defaults to 2.")
+    parser.add_argument("--exclude", dest="exclude", default=1.0, type=float,
+                        help="Exclusion box half-width in feet. Defaults to 1.")
+    parser.add_argument("--seed", dest="seed", default=0, type=int,
+                        help="Random seed. Defaults to 0.")
+    args = parser.parse_args()
+
+    main(args)
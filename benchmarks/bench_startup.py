@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""
+Startup time of every entry point.
+
+Times, each in fresh interpreters and as the median of several runs:
+
+  imports    the whole process for 'import <entry point>' and the import
+             itself, optionally against a baseline revision checked out
+             into a temporary git worktree
+  artifacts  loading the calibration with its remap tables and both
+             projectors with the cache off, cold (an empty cache) and warm,
+             for the runtime calibration and a scaled 1920x1080 copy
+  warmup     ArduinoRobot on a pseudo terminal: time until the first command
+             is written when the 2 s boot is slept in the constructor, as it
+             used to be, and when it overlaps connecting to the tracker and
+             the first queries; and the time vision.py spends setting up
+             after making the camera, which now overlaps its warmup
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from tbc_backend.common import Client, Publisher, Server
+from tbc_backend.control import ArduinoRobot, PointAndShootController
+from tbc_backend.tracking import TrackingService
+from tbc_backend.vision import (AgentDetector, AgentLocator, LensProjector, TargetDetector,
+                                TargetLocator)
+from tbc_backend.vision.cameras import LOG_CALIBRATION_FILE, LOG_PROJECTION_FILE
+
+ENTRY_POINTS = ["tracking", "control", "vision", "simulate", "tune"]
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import %s
+print(time.perf_counter() - start)
+"""
+
+ARTIFACT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+from tbc_backend.vision.cameras import load_calibration
+from tbc_backend.vision.localization import LensProjector, RANSACProjector
+imported = time.perf_counter()
+cache_dir = {"off": False}.get(sys.argv[3], sys.argv[3])
+calibration = load_calibration(sys.argv[1], cache_dir)
+RANSACProjector(sys.argv[2], cache_dir=cache_dir)
+LensProjector(sys.argv[2], sys.argv[1], cache_dir=cache_dir)
+print(time.perf_counter() - imported)
+"""
+
+def run_python(script, cwd, *argv):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", script, *argv], cwd=cwd, check=True,
+                            capture_output=True, text=True).stdout
+    return time.perf_counter() - start, float(output.split()[-1])
+
+def time_imports(root, repeats):
+    results = {}
+    for entry in ENTRY_POINTS:
+        runs = [run_python(IMPORT_SCRIPT % entry, root) for _ in range(repeats)]
+        results[entry] = np.median(runs, axis=0)
+    return results
+
+def scaled_calibration(directory, width, height):
+    """Writes a copy of the runtime calibration scaled to width x height."""
+    calibration = dict(np.load(LOG_CALIBRATION_FILE))
+    scale = np.diag([width/float(calibration["width"]), height/float(calibration["height"]), 1])
+    calibration["camera_matrix"] = scale.dot(calibration["camera_matrix"])
+    calibration["new_camera_matrix"] = scale.dot(calibration["new_camera_matrix"])
+    calibration["width"], calibration["height"] = np.array(width), np.array(height)
+    path = os.path.join(directory, "calibration_%dx%d.npz" % (width, height))
+    np.savez(path, **calibration)
+    return path
+
+def time_artifacts(calibration_file, directory, repeats):
+    cache_dir = os.path.join(directory, "cache")
+    off = np.median([run_python(ARTIFACT_SCRIPT, ROOT, calibration_file,
+                                LOG_PROJECTION_FILE, "off")[1] for _ in range(repeats)])
+    cold = []
+    for _ in range(repeats):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cold.append(run_python(ARTIFACT_SCRIPT, ROOT, calibration_file,
+                               LOG_PROJECTION_FILE, cache_dir)[1])
+    warm = np.median([run_python(ARTIFACT_SCRIPT, ROOT, calibration_file,
+                                 LOG_PROJECTION_FILE, cache_dir)[1] for _ in range(repeats)])
+    return off, np.median(cold), warm
+
+def first_command(overlap, warmup, port):
+    """Seconds from opening the port to the first command being written."""
+    master, slave = os.openpty()
+    try:
+        start = time.perf_counter()
+        if overlap:
+            robot = ArduinoRobot(os.ttyname(slave), 9600, warmup=warmup)
+        else:
+            time.sleep(warmup)
+            robot = ArduinoRobot(os.ttyname(slave), 9600, warmup=0)
+        # what control.py does between making the robot and its first move
+        client = Client(port)
+        controller = PointAndShootController()
+        client.request("get_agent_abs")
+        client.request("get_target_rel")
+        left, right = controller.control(1, 0, False)[0][:2]
+        robot.command(left, right)
+        os.read(master, 64)
+        return time.perf_counter() - start
+    finally:
+        robot.serial.close()
+        os.close(master)
+        os.close(slave)
+
+def time_warmup(warmup, port):
+    service = TrackingService()
+    server = Server(port)
+
+    def serve():
+        for message_type, message in server.listen():
+            server.reply(service.handle(message_type, message))
+
+    threading.Thread(target=serve, daemon=True).start()
+    return first_command(False, warmup, port), first_command(True, warmup, port)
+
+def time_vision_setup():
+    """Seconds vision.py spends making locators and a publisher after the
+    camera, all of which now overlaps the camera's warmup."""
+    start = time.perf_counter()
+    projector = LensProjector(LOG_PROJECTION_FILE, LOG_CALIBRATION_FILE)
+    TargetLocator(projector, TargetDetector())
+    AgentLocator(projector, AgentDetector())
+    Publisher(5598)
+    return time.perf_counter() - start
+
+def main(args):
+    print("imports (median of %d, seconds)" % args.repeats)
+    current = time_imports(ROOT, args.repeats)
+    baseline = None
+    if args.baseline:
+        worktree = tempfile.mkdtemp()
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, args.baseline],
+                       cwd=ROOT, check=True, capture_output=True)
+        try:
+            baseline = time_imports(worktree, args.repeats)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=ROOT,
+                           check=True, capture_output=True)
+    for entry in ENTRY_POINTS:
+        line = "  %-9s process %.3f  import %.3f" % (entry, *current[entry])
+        if baseline is not None:
+            line += "    %s: process %.3f  import %.3f" % (args.baseline, *baseline[entry])
+        print(line)
+
+    print("artifacts (median of %d, seconds after imports)" % args.repeats)
+    with tempfile.TemporaryDirectory() as directory:
+        for calibration_file in (LOG_CALIBRATION_FILE,
+                                 scaled_calibration(directory, 1920, 1080)):
+            calibration = np.load(calibration_file)
+            off, cold, warm = time_artifacts(calibration_file, directory, args.repeats)
+            print("  %4dx%-4d  no cache %.4f  cold %.4f  warm %.4f" %
+                  (calibration["width"], calibration["height"], off, cold, warm))
+
+    print("warmup (%.1f s boot)" % args.warmup)
+    sleeping, overlapped = time_warmup(args.warmup, args.port)
+    print("  first command after %.3f s sleeping in the constructor, %.3f s overlapped" %
+          (sleeping, overlapped))
+    print("  vision.py setup overlapping the camera warmup: %.3f s" % time_vision_setup())
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--repeats", dest="repeats", default=7, type=int,
+                        help="Runs per measurement. Defaults to 7.")
+    parser.add_argument("--baseline", dest="baseline", default=None, type=str,
+                        help="""Git revision to compare import times against,
+                        e.g. HEAD. Defaults to none.""")
+    parser.add_argument("--warmup", dest="warmup", default=2.0, type=float,
+                        help="Arduino boot time. Defaults to 2.")
+    parser.add_argument("--port", dest="port", default=5599, type=int,
+                        help="Port for the tracker. Defaults to 5599.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+End-to-end frame-to-tracker latency for streamed and request/reply producers.
+
+A stand-in producer thread sends target lists at a fixed frame rate while a
+stand-in tracker thread consumes them with a fixed amount of work per
+message, all inside one process over loopback TCP. Latency is measured from
+the header timestamp to the moment the tracker sees the message; producer
+cost is the time spent inside send().
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.common import Client, Publisher, Server
+
+def run(mode, fps, port, args):
+    server = Server(port, stream_port=port + 1)
+    latencies = []
+
+    def track():
+        for message_type, message in server.listen():
+            server.reply(True)
+            latencies.append(time.time() - server.last_header.timestamp)
+            time.sleep(args.work_ms/1000.)
+
+    threading.Thread(target=track, daemon=True).start()
+    if mode == "stream":
+        producer = Publisher(port + 1)
+        time.sleep(.2) # let the subscription propagate
+    else:
+        producer = Client(port)
+    targets = list(map(tuple, np.random.uniform(0, 8, (args.n_targets, 2))))
+    send_times = []
+    period = 1./fps
+    next_frame = time.perf_counter()
+    for _ in range(int(args.duration*fps)):
+        start = time.perf_counter()
+        producer.send("offboard_targets", targets)
+        send_times.append(time.perf_counter() - start)
+        next_frame += period
+        time.sleep(max(0, next_frame - time.perf_counter()))
+    time.sleep(.2)
+    latencies = 1000*np.array(latencies)
+    print("%-6s %3d fps: delivered %4d/%4d  latency p50 %7.2f ms  p99 %7.2f ms  "
+          "send %6.3f ms" % (mode, fps, len(latencies), len(send_times),
+                             np.percentile(latencies, 50),
+                             np.percentile(latencies, 99),
+                             1000*np.mean(send_times)))
+
+def main(args):
+    port = args.port
+    for fps in (5, 20, 60):
+        for mode in ("stream", "reqrep"):
+            run(mode, fps, port, args)
+            port += 2
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--duration", dest="duration", default=3.0, type=float,
+                        help="Seconds per measurement. Defaults to 3.")
+    parser.add_argument("--targets", dest="n_targets", default=10, type=int,
+                        help="Targets per frame. Defaults to 10.")
+    parser.add_argument("--work_ms", dest="work_ms", default=25.0, type=float,
+                        help="""Simulated tracker work per message in ms.
+                        Defaults to 25.""")
+    parser.add_argument("--port", dest="port", default=5700, type=int,
+                        help="First loopback port to use. Defaults to 5700.")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Batched color mask evaluation against one TargetDetector per candidate.
+
+Writes a synthetic labelled recording: a blue court with white lines,
+yellow-green balls under uneven lighting and yellowish clutter (leaves,
+a bench) that a loose mask picks up. Times evaluate_masks, which shares
+the blur and HSV conversion between candidates with the same ksize,
+against running TargetDetector.detect for every candidate and frame, checks
+both give the same counts, then runs 'tune.py mask' on the recording and
+prints its result.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from argparse import Namespace
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tbc_backend.common import FrameRecorder, FrameReader
+from tbc_backend.vision.localization import COLORMASK_FILE, TargetDetector
+from tbc_backend.vision.tuning import (evaluate_masks, mask_candidates, match_points,
+                                       read_labels)
+
+import tune
+
+def hsv_color(hue, saturation, value):
+    pixel = np.uint8([[[hue, saturation, value]]])
+    return tuple(int(c) for c in cv2.cvtColor(pixel, cv2.COLOR_HSV2BGR)[0, 0])
+
+def write_recording(directory, n_frames, n_balls, width=640, height=480):
+    rng = np.random.RandomState(0)
+    recorder = FrameRecorder(os.path.join(directory, "frames"))
+    labels = {}
+    shading = np.linspace(0.7, 1.1, width)[None, :, None]
+    for i in range(n_frames):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = hsv_color(105, 150, 140)
+        cv2.line(frame, (0, 120), (width, 120), (235, 235, 235), 6)
+        cv2.line(frame, (320, 0), (320, height), (235, 235, 235), 6)
+        for _ in range(4):
+            # clutter close to the ball color
+            x, y = rng.randint(0, width), rng.randint(0, height)
+            cv2.ellipse(frame, (x, y), (rng.randint(6, 20), rng.randint(3, 8)),
+                        rng.randint(0, 180), 0, 360,
+                        hsv_color(rng.randint(14, 22), rng.randint(90, 200), 180), -1)
+        points = []
+        for _ in range(n_balls):
+            x, y = rng.randint(20, width - 20), rng.randint(20, height - 20)
+            cv2.circle(frame, (x, y), rng.randint(5, 9),
+                       hsv_color(rng.randint(28, 36), rng.randint(120, 220), 230), -1)
+            points.append([x, y])
+        frame = np.clip(frame*shading + rng.normal(0, 6, frame.shape), 0, 255)
+        recorder.write(frame.astype(np.uint8))
+        labels[i] = points
+    recorder.close()
+    labels_file = os.path.join(directory, "frames", "labels.json")
+    with open(labels_file, "w") as f:
+        f.write(json.dumps(labels))
+    return os.path.join(directory, "frames"), labels_file
+
+def per_detector(frames, labels, candidates, radius):
+    counts = np.zeros((len(candidates), 3), dtype=int)
+    for k, candidate in enumerate(candidates):
+        detector = TargetDetector(config=candidate)
+        for index, truth in labels.items():
+            detected = np.reshape(detector.detect(frames[index])[0], (-1, 2))
+            matched = match_points(detected, truth, radius)
+            counts[k] += matched, len(detected) - matched, len(truth) - matched
+    return counts
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        recording, labels_file = write_recording(directory, args.n_frames, args.n_balls)
+        frames, labels = FrameReader(recording), read_labels(labels_file)
+        with open(COLORMASK_FILE) as f:
+            candidates = mask_candidates(json.loads(f.read()), args.candidates)
+        start = time.perf_counter()
+        batched = evaluate_masks(frames, labels, candidates)
+        batched_time = time.perf_counter() - start
+        start = time.perf_counter()
+        single = per_detector(frames, labels, candidates, 8)
+        single_time = time.perf_counter() - start
+        print("%d candidates x %d frames: batched %.2f s, one detector each %.2f s, "
+              "same counts: %s" % (len(candidates), len(labels), batched_time, single_time,
+                                   np.array_equal(batched, single)))
+        output = os.path.join(directory, "mask.json")
+        tune.tune_mask(Namespace(recording=recording, labels=labels_file,
+                                 config=COLORMASK_FILE, candidates=args.candidates,
+                                 radius=8.0, seed=0, blobs="simple", output=output, report=None,
+                                 workers=args.workers))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--frames", dest="n_frames", default=20, type=int,
+                        help="Labelled frames. Defaults to 20.")
+    parser.add_argument("--balls", dest="n_balls", default=8, type=int,
+                        help="Balls per frame. Defaults to 8.")
+    parser.add_argument("--candidates", dest="candidates", default=60, type=int,
+                        help="Mask settings to try. Defaults to 60.")
+    parser.add_argument("--workers", dest="workers", default=os.cpu_count(), type=int,
+                        help="Processes for 'tune.py mask'. Defaults to the core count.")
+    args = parser.parse_args()
+
+    main(args)
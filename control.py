@@ -7,46 +7,135 @@ Control frontend for tennis ball collector.
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
-from tbc_backend.common import Client
+import json
+import os
+import time
+
+import numpy as np
+
+from tbc_backend.common import Client, MessageRecorder, CODECS, INSTRUMENTS
+from tbc_backend.common.instruments import add_arguments, configure
 from tbc_backend.control import *
 
+def run(client, robot, controller):
+    """query the tracker and drive toward the target until interrupted"""
+    for target_rel in client.listen("get_target_rel"):
+        try:
+            if target_rel is None:
+                robot.command(0, 0, .5)
+                continue
+            else:
+                with INSTRUMENTS.time("control.decision"):
+                    move, delta = controller.control(*target_rel)
+                if move:
+                    robot.command(*move)
+                    client.send("update_agent_rel", delta)
+                else:
+                    robot.command(0, 0, .5)
+        except (KeyboardInterrupt, SystemExit, EOFError):
+            break
+    else:
+        robot.command(0, 0)
+
+def run_scheduled(client, robot, controller, period=.2):
+    """query the tracker every period seconds and preempt the running move
+    with a fresh one; robot must be a ScheduledArduinoRobot"""
+    while True:
+        try:
+            started = time.monotonic()
+            for delta in robot.executed_deltas():
+                client.send("update_agent_rel", delta)
+            target_rel = client.request("get_target_rel")
+            if target_rel is None:
+                robot.command(0, 0, preempt=True)
+            else:
+                with INSTRUMENTS.time("control.decision"):
+                    move, delta = controller.control(*target_rel)
+                if move:
+                    robot.command(*move, preempt=True, delta=delta)
+                else:
+                    robot.command(0, 0, preempt=True)
+            time.sleep(max(0, period - (time.monotonic() - started)))
+        except (KeyboardInterrupt, SystemExit, EOFError):
+            break
+    robot.close()
+
+def run_continuous(client, robot, controller, query_period=.2):
+    """send wheel speeds every controller period and refresh the target from
+    the tracker every query_period seconds, or as soon as it is reached"""
+    last_query = None
+    while True:
+        try:
+            started = time.monotonic()
+            if last_query is None or controller.target is None or \
+                    started - last_query >= query_period:
+                for delta in controller.pop_deltas():
+                    client.send("update_agent_rel", delta)
+                target_rel = client.request("get_target_rel")
+                last_query = started
+                if target_rel is None:
+                    controller.clear_target()
+                else:
+                    controller.set_target(*target_rel)
+            with INSTRUMENTS.time("control.decision"):
+                speeds = controller.step()
+            if speeds is None:
+                robot.command(0, 0, preempt=True)
+            else:
+                robot.command(*speeds, preempt=True)
+            time.sleep(max(0, controller.period - (time.monotonic() - started)))
+        except (KeyboardInterrupt, SystemExit, EOFError):
+            break
+    robot.close()
+
 def main(args):
     """main function for controller"""
-    client = Client(args.port, args.host)
-    robot = ArduinoRobot(args.device, args.baud)
+    configure(args.log_level, args.stats_port, args.stats_every)
+    recorder = MessageRecorder(args.record) if args.record else None
+    client = Client(args.port, args.host, codec=args.codec, recorder=recorder)
     controller = PointAndShootController(turn_scaling=args.turn_scaling,
                                          forward_scaling=args.forward_scaling,
                                          max_turn_time=args.max_turn_time,
                                          max_forward_time=args.max_forward_time,
                                          buffer_distance=args.buffer_distance)
+    # calibration moves always go out on a blocking robot, since a scheduled
+    # one only queues them and main would return before they are written.
+    # They skip control(), whose buffer_distance and turn limits would
+    # change the distance covered
     if args.calibrate_turn:
-        move, delta = controller.control((0, np.pi))
+        robot = ArduinoRobot(args.device, args.baud)
+        move, delta = controller.turn_command(2*np.pi)
         robot.command(*move)
         robot.command(0, 0, 1)
         return
 
     if args.calibrate_forward:
-        move, delta = controller.control((4, 0))
+        robot = ArduinoRobot(args.device, args.baud)
+        move, delta = controller.forward_command(4)
         robot.command(*move)
         robot.command(0, 0, 1)
         return
 
-    for target_rel in client.listen("get_target_rel"):
-        try:
-            if target_rel is None:
-                robot.command(0, 0, .5)
-                continue
-            else:
-                move, delta = controller.control(*target_rel)
-                if move:
-                    robot.command(*move)
-                    client.send("update_agent_rel", delta)
-                else:
-                    robot.command(0, 0, .5)
-        except (KeyboardInterrupt, SystemExit):
-            break
+    if args.continuous:
+        robot = ScheduledArduinoRobot(args.device, args.baud,
+                                      min_interval=1.0/args.rate)
+    elif args.scheduled:
+        robot = ScheduledArduinoRobot(args.device, args.baud)
     else:
-        robot.command(0, 0)
+        robot = ArduinoRobot(args.device, args.baud)
+        if args.log_moves:
+            robot = MoveLogger(robot, client, args.log_moves)
+
+    if args.continuous:
+        controller = UnicycleController(turn_scaling=args.turn_scaling,
+                                        forward_scaling=args.forward_scaling,
+                                        buffer_distance=args.buffer_distance,
+                                        rate=args.rate)
+        run_continuous(client, robot, controller, args.period)
+    elif args.scheduled:
+        run_scheduled(client, robot, controller, args.period)
+    else:
+        run(client, robot, controller)
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
@@ -72,15 +161,47 @@ if __name__ == "__main__":
                         type=float, help="""Maximum time to move forward without
                         checking the vision system. Defaults to 1.00 second.""")
     parser.add_argument("--turn_scaling", dest="turn_scaling", default=98,
-                        type=int, help="""Scaling constant for turn time relative
+                        type=float, help="""Scaling constant for turn time relative
                         to desired angle.""")
     parser.add_argument("--forward_scaling", dest="forward_scaling", default=115,
-                        type=int, help="""Scaling constant for forward move time
+                        type=float, help="""Scaling constant for forward move time
                         relative to desired distance.""")
     parser.add_argument("--turn", dest="calibrate_turn", action="store_true",
                         help="Turn 360 degrees to test 'turn_scaling'.")
     parser.add_argument("--forward", dest="calibrate_forward", action="store_true",
                         help="Move 4 feet forward to test 'forward_scaling'.")
+    parser.add_argument("--codec", dest="codec", default="binary",
+                        choices=sorted(CODECS), help="""Wire format for
+                        messages. Defaults to 'binary'.""")
+    parser.add_argument("--scheduled", dest="scheduled", action="store_true",
+                        help="""Run moves on a background writer thread and
+                        replace the running move after every tracker query.""")
+    parser.add_argument("--period", dest="period", default=.2, type=float,
+                        help="""Seconds between tracker queries with '--scheduled'
+                        or '--continuous'. Defaults to 0.2.""")
+    parser.add_argument("--continuous", dest="continuous", action="store_true",
+                        help="""Steer with the closed-loop unicycle controller,
+                        sending wheel speeds at '--rate'.""")
+    parser.add_argument("--rate", dest="rate", default=50, type=float,
+                        help="""Wheel speed updates per second with
+                        '--continuous'. The Arduino must accept messages this
+                        often; 10 keeps the 0.10 s pause of the other modes.
+                        Defaults to 50.""")
+    parser.add_argument("--record", dest="record", default=None, type=str,
+                        help="Append every message exchanged to this file.")
+    add_arguments(parser)
+    parser.add_argument("--log_moves", dest="log_moves", default=None, type=str,
+                        help="""Append every timed move with the agent pose
+                        before and after it to this file, for 'tune.py
+                        motion'. Ignored with '--scheduled' or '--continuous'.""")
+    parser.add_argument("--config", dest="config", default=CONTROLLER_FILE, type=str,
+                        help="""JSON file of tuned defaults for the scaling,
+                        buffer and move time options, as written by 'tune.py'.
+                        Options given on the command line override it.""")
+    config_args, _ = parser.parse_known_args()
+    if os.path.exists(config_args.config):
+        with open(config_args.config) as f:
+            parser.set_defaults(**json.loads(f.read()))
     args = parser.parse_args()
 
     main(args)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""
+Replay harness for tennis ball collector.
+
+Drives the vision, tracking and control frontends from a recording made
+with 'vision.py --record', all in one process over an in-process transport
+and against a fake robot, as fast as the pipeline allows.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import threading
+import time
+
+from tbc_backend.common import (LocalTransport, LocalServer, LocalClient, LocalPublisher,
+                                FrameReader, read_messages)
+from tbc_backend.control import FakeArduinoRobot, PointAndShootController
+from tbc_backend.tracking import TrackingService
+
+import control
+import tracking
+
+def replay_frames(reader, publisher, onboard):
+    """run the vision frontend over recorded frames"""
+    import vision
+    from tbc_backend.vision import TargetLocator, AgentLocator, LensProjector
+    # frames the camera left distorted are projected point by point
+    projector = LensProjector(calibration_file=reader.calibration_file) \
+        if reader.undistort_points else None
+    agent_locator = None if onboard else AgentLocator(projector)
+    vision.run(reader, TargetLocator(projector), agent_locator, publisher)
+
+def replay_messages(path, publisher):
+    """republish recorded producer messages in order"""
+    for _, direction, message_type, message in read_messages(path):
+        if direction in ("publish", "send") and message_type != "get_target_rel":
+            publisher.send(message_type, message)
+
+def main(args):
+    transport = LocalTransport()
+    service = TrackingService()
+    robot = FakeArduinoRobot(args.time_scale)
+    server_thread = threading.Thread(target=tracking.serve,
+                                     args=(LocalServer(transport), service))
+    control_thread = threading.Thread(target=control.run,
+                                      args=(LocalClient(transport), robot,
+                                            PointAndShootController()))
+    server_thread.start()
+    control_thread.start()
+    start = time.perf_counter()
+    publisher = LocalPublisher(transport)
+    if args.messages_only:
+        replay_messages(os.path.join(args.recording, "messages.jsonl"), publisher)
+        recorded = None
+    else:
+        reader = FrameReader(os.path.join(args.recording, "frames"))
+        replay_frames(reader, publisher, args.onboard)
+        recorded = reader.timestamps[-1] - reader.timestamps[0] if len(reader) else 0
+        print("replayed %d frames" % len(reader))
+    transport.wait_published()
+    transport.close()
+    server_thread.join()
+    control_thread.join()
+    elapsed = time.perf_counter() - start
+    print("%d robot commands, %.1f simulated seconds of motion" %
+          (len(robot.commands), robot.clock))
+    if recorded:
+        print("%.2f s wall time for %.2f s of recording (%.1fx real time)" %
+              (elapsed, recorded, recorded/elapsed))
+    else:
+        print("%.2f s wall time" % elapsed)
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("recording", type=str,
+                        help="Directory written by 'vision.py --record'.")
+    parser.add_argument("--onboard", dest="onboard", action="store_true",
+                        help="Replay frames from the onboard camera.")
+    parser.add_argument("--messages", dest="messages_only", action="store_true",
+                        help="""Skip vision and republish the recorded messages
+                        straight to the tracker.""")
+    parser.add_argument("--time_scale", dest="time_scale", default=0.0, type=float,
+                        help="""Fraction of each robot move time to actually
+                        sleep. Defaults to 0 (no sleeping).""")
+    args = parser.parse_args()
+
+    main(args)
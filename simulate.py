@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+Simulation harness for tennis ball collector.
+
+Runs the unmodified control.run loop with PointAndShootController against
+a SimulatedRobot and a SimulatedClient, which answers from the same
+TrackingService that tracking.py serves. Episodes for every combination of
+the swept settings and seeds run across a process pool, and each
+combination is summarised by the fraction of balls collected, the time to
+collect them and the simulated seconds run per wall second.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from itertools import product
+from multiprocessing import Pool
+import os
+import time
+
+import numpy as np
+
+from tbc_backend.control import MoveLogger, PointAndShootController
+from tbc_backend.simulation import SimulatedClient, SimulatedRobot, SimulatedWorld
+from tbc_backend.tracking import TrackingService
+
+import control
+
+def run_episode(settings):
+    """Runs one episode from a dict of settings and returns its results."""
+    world = SimulatedWorld(n_balls=settings["n_balls"], seed=settings["seed"],
+                           turn_scaling=settings["world_turn_scaling"],
+                           forward_scaling=settings["world_forward_scaling"],
+                           gain_error=settings["gain_error"],
+                           time_limit=settings["time_limit"],
+                           miss_rate=settings["miss_rate"])
+    service = TrackingService(plan=settings["tracker"] == "planned",
+                              persistent=settings["tracker"] == "persistent")
+    client = SimulatedClient(world, service, latency=settings["latency"],
+                             offboard_period=settings["offboard_period"],
+                             onboard_period=settings["onboard_period"],
+                             codec=settings["codec"])
+    robot = SimulatedRobot(world)
+    if settings["log_moves"]:
+        robot = MoveLogger(robot, client, settings["log_moves"], settle=0)
+    controller = PointAndShootController(turn_scaling=settings["turn_scaling"],
+                                         forward_scaling=settings["forward_scaling"],
+                                         buffer_distance=settings["buffer_distance"],
+                                         max_turn_time=settings["max_turn_time"],
+                                         max_forward_time=settings["max_forward_time"])
+    start = time.perf_counter()
+    control.run(client, robot, controller)
+    elapsed = time.perf_counter() - start
+    if settings["log_moves"]:
+        robot.close()
+    collected = world.collected.mean() if len(world.collected) else 1.0
+    return {"collected": collected, "time": world.time,
+            "last_capture": np.nanmax(world.capture_times) if collected else np.nan,
+            "distance": world.distance, "commands": robot.commands,
+            "requests": client.requests, "wall": elapsed}
+
+def sweep(args):
+    """Returns a list of (swept values, settings) for every episode."""
+    swept = {"tracker": args.trackers, "buffer_distance": args.buffer_distances,
+             "max_turn_time": args.max_turn_times,
+             "max_forward_time": args.max_forward_times}
+    names = sorted(swept)
+    episodes = []
+    for values in product(*(swept[name] for name in names)):
+        for seed in range(args.seed, args.seed + args.episodes):
+            settings = {"n_balls": args.n_balls, "seed": seed,
+                        "gain_error": args.gain_error, "time_limit": args.time_limit,
+                        "miss_rate": args.miss_rate, "latency": args.latency,
+                        "offboard_period": args.offboard_period,
+                        "onboard_period": args.onboard_period or None,
+                        "codec": args.codec, "turn_scaling": args.turn_scaling,
+                        "forward_scaling": args.forward_scaling,
+                        "world_turn_scaling": args.world_turn_scaling or args.turn_scaling,
+                        "world_forward_scaling": args.world_forward_scaling or
+                        args.forward_scaling, "log_moves": args.log_moves}
+            settings.update(zip(names, values))
+            episodes.append((tuple(zip(names, values)), settings))
+    return episodes
+
+def main(args):
+    episodes = sweep(args)
+    start = time.perf_counter()
+    if args.workers > 1:
+        with Pool(args.workers) as pool:
+            results = pool.map(run_episode, [settings for _, settings in episodes])
+    else:
+        results = list(map(run_episode, [settings for _, settings in episodes]))
+    elapsed = time.perf_counter() - start
+    grouped = {}
+    for (key, _), result in zip(episodes, results):
+        grouped.setdefault(key, []).append(result)
+    for key, group in grouped.items():
+        print("%-60s collected %5.1f%%  all in %6.1f s  %5.0f commands  "
+              "%6.1f ft" % (" ".join("%s=%s" % item for item in key),
+                            100*np.mean([r["collected"] for r in group]),
+                            np.mean([r["time"] for r in group if r["collected"] == 1] or
+                                    [np.nan]),
+                            np.mean([r["commands"] for r in group]),
+                            np.mean([r["distance"] for r in group])))
+    simulated = sum(result["time"] for result in results)
+    print("%d episodes, %.0f simulated s in %.2f wall s on %d worker%s "
+          "(%.0f simulated s per wall s)" %
+          (len(results), simulated, elapsed, args.workers,
+           "" if args.workers == 1 else "s", simulated/elapsed))
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--episodes", dest="episodes", default=10, type=int,
+                        help="Seeds to run for every setting. Defaults to 10.")
+    parser.add_argument("--seed", dest="seed", default=0, type=int,
+                        help="First seed. Defaults to 0.")
+    parser.add_argument("--workers", dest="workers", default=os.cpu_count(), type=int,
+                        help="Processes to run episodes on. Defaults to the core count.")
+    parser.add_argument("--balls", dest="n_balls", default=20, type=int,
+                        help="Balls on the court. Defaults to 20.")
+    parser.add_argument("--time_limit", dest="time_limit", default=600.0, type=float,
+                        help="Simulated seconds before an episode ends. Defaults to 600.")
+    parser.add_argument("--gain_error", dest="gain_error", default=.05, type=float,
+                        help="""Standard deviation of the wheel speed gains.
+                        Defaults to 0.05.""")
+    parser.add_argument("--miss_rate", dest="miss_rate", default=.1, type=float,
+                        help="""Chance the offboard camera misses the marker.
+                        Defaults to 0.1.""")
+    parser.add_argument("--latency", dest="latency", default=.02, type=float,
+                        help="Seconds per tracker round trip. Defaults to 0.02.")
+    parser.add_argument("--offboard_period", dest="offboard_period", default=.1,
+                        type=float, help="""Seconds between offboard frames.
+                        Defaults to 0.1.""")
+    parser.add_argument("--onboard_period", dest="onboard_period", default=0, type=float,
+                        help="""Seconds between onboard frames. Defaults to 0, no
+                        onboard camera.""")
+    parser.add_argument("--codec", dest="codec", default=None, choices=["string", "binary"],
+                        help="""Pass every message through this wire format.
+                        Defaults to none.""")
+    parser.add_argument("--trackers", dest="trackers", default=["memoryless"], nargs="+",
+                        choices=["memoryless", "planned", "persistent"],
+                        help="Tracker setups to sweep. Defaults to 'memoryless'.")
+    parser.add_argument("--buffer_distance", dest="buffer_distances", default=[1.5],
+                        nargs="+", type=float, help="""Controller buffer distances to
+                        sweep. Defaults to 1.5.""")
+    parser.add_argument("--max_turn_time", dest="max_turn_times", default=[0.5],
+                        nargs="+", type=float, help="""Controller turn move limits
+                        to sweep. Defaults to 0.5.""")
+    parser.add_argument("--turn_scaling", dest="turn_scaling", default=98, type=float,
+                        help="Controller turn scaling. Defaults to 98.")
+    parser.add_argument("--forward_scaling", dest="forward_scaling", default=115,
+                        type=float, help="Controller forward scaling. Defaults to 115.")
+    parser.add_argument("--world_turn_scaling", dest="world_turn_scaling", default=None,
+                        type=float, help="""The simulated robot's true turn
+                        scaling. Defaults to '--turn_scaling'.""")
+    parser.add_argument("--world_forward_scaling", dest="world_forward_scaling",
+                        default=None, type=float, help="""The simulated robot's
+                        true forward scaling. Defaults to '--forward_scaling'.""")
+    parser.add_argument("--log_moves", dest="log_moves", default=None, type=str,
+                        help="""Append every timed move with the simulated
+                        tracker's pose before and after it to this file.""")
+    parser.add_argument("--max_forward_time", dest="max_forward_times", default=[1.0],
+                        nargs="+", type=float, help="""Controller forward move
+                        limits to sweep. Defaults to 1.0.""")
+    args = parser.parse_args()
+
+    main(args)
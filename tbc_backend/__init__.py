@@ -1,3 +1,15 @@
-from . import common
-from . import tracking
+"""
+Tennis ball collector backend.
 
+Subpackages are imported on first use, so tracking.py and control.py never
+pay for OpenCV and vision.py never pays for the trackers.
+"""
+
+import importlib
+
+_SUBPACKAGES = ("common", "control", "simulation", "tracking", "vision")
+
+def __getattr__(name):
+    if name in _SUBPACKAGES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
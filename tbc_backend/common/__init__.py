@@ -1 +1,33 @@
-from .communication import Client, Server
+"""
+Shared communication, recording and instrumentation code.
+
+Names are imported from their modules on first use, so a process only
+loads what it touches: control.py never imports asyncio or the HTTP
+server, for instance.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "Client": "communication", "Server": "communication",
+    "Publisher": "communication", "AsyncServer": "communication",
+    "StringCodec": "codecs", "BinaryCodec": "codecs", "CODECS": "codecs",
+    "INSTRUMENTS": "instruments", "StatsServer": "instruments",
+    "PeriodicDump": "instruments",
+    "LocalTransport": "local", "LocalServer": "local", "LocalClient": "local",
+    "LocalPublisher": "local",
+    "FrameRecorder": "recording", "FrameReader": "recording",
+    "MessageRecorder": "recording", "read_messages": "recording",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module("." + _EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
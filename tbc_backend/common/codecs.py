@@ -0,0 +1,158 @@
+"""
+Wire codecs for tennis ball collector communication.
+
+A codec turns a (message_type, message) pair into a list of ZMQ frames and
+back again. Requests carry a message type plus the sender id and sequence
+number used for deduplication, replies do not.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import ast
+from collections import namedtuple
+import struct
+import time
+
+import numpy as np
+
+# message types known to the binary codec, the index is the type id on the wire
+MESSAGE_TYPES = ("get_target_rel",
+                 "offboard_targets",
+                 "onboard_targets",
+                 "agent_rel",
+                 "agent_abs",
+                 "update_agent_rel",
+                 "reply",
+                 "get_agent_abs")
+MESSAGE_IDS = {message_type: i for i, message_type in enumerate(MESSAGE_TYPES)}
+
+Header = namedtuple("Header", ["timestamp", "sender", "sequence"])
+
+# payload kinds for the binary codec
+KIND_NONE = 0
+KIND_BOOL = 1
+KIND_VECTOR = 2
+KIND_MATRIX = 3
+
+def _builtin(message):
+    """Numpy values as plain Python ones, whose repr literal_eval can read
+    back (numpy 2 writes scalars as 'np.float64(...)')."""
+    if isinstance(message, (np.generic, np.ndarray)):
+        return message.tolist()
+    if isinstance(message, (list, tuple)):
+        return type(message)(_builtin(value) for value in message)
+    return message
+
+class StringCodec(object):
+    """Original space separated string format parsed with ast.literal_eval.
+
+    Kept as a fallback for peers that have not been updated. Their legacy
+    'timestamp type message' requests are still read, with None for the
+    sender and sequence, so the server never deduplicates them.
+    """
+
+    def encode_request(self, message_type, message=None, sender=0, sequence=0):
+        string = "%s %d %d %s %s" % (time.time(), sender, sequence,
+                                     message_type, _builtin(message))
+        return [string.encode()]
+
+    def decode_request(self, frames):
+        string = bytes(frames[0]).decode()
+        fields = string.split(" ", 4)
+        try:
+            sender, sequence = int(fields[1]), int(fields[2])
+            timestamp, message_type, message_data = fields[0], fields[3], fields[4]
+        except (ValueError, IndexError):
+            # legacy request without a sender and sequence
+            timestamp, message_type, message_data = string.split(" ", 2)
+            sender = sequence = None
+        try:
+            message = ast.literal_eval(message_data)
+        except (ValueError, SyntaxError):
+            message = message_data
+        header = Header(float(timestamp), sender, sequence)
+        return header, message_type, message
+
+    def encode_reply(self, message):
+        string = "%s %s" % (time.time(), _builtin(message))
+        return [string.encode()]
+
+    def decode_reply(self, frames):
+        string = bytes(frames[0]).decode()
+        timestamp, data = string.split(" ", 1)
+        return float(timestamp), ast.literal_eval(data)
+
+class BinaryCodec(object):
+    """Packed header frame followed by an optional raw float64 payload frame.
+
+    The header holds the message type id, the send timestamp, the sender id,
+    the sequence number, the payload kind and the payload shape. Target
+    lists travel as an (n, 2) array and poses as a flat vector, with None
+    encoded as NaN. Payload frames are sent without copying and decoded with
+    np.frombuffer, so large target lists are never turned into Python
+    objects on the way through.
+    """
+
+    header = struct.Struct("<HdQQBII")
+
+    def _encode(self, type_id, message, sender=0, sequence=0):
+        prefix = (type_id, time.time(), sender, sequence)
+        if message is None:
+            return [self.header.pack(*prefix, KIND_NONE, 0, 0)]
+        if isinstance(message, (bool, np.bool_)):
+            return [self.header.pack(*prefix, KIND_BOOL, int(message), 0)]
+        if isinstance(message, tuple):
+            # poses and relative targets, None marks a missing fix
+            message = [np.nan if value is None else value for value in message]
+            payload = np.array(message, dtype=np.float64)
+        elif isinstance(message, list):
+            # target lists of (x, y) points
+            payload = np.array(message, dtype=np.float64).reshape(-1, 2)
+        else:
+            payload = np.ascontiguousarray(message, dtype=np.float64)
+        if payload.ndim == 1:
+            header = self.header.pack(*prefix, KIND_VECTOR, payload.shape[0], 0)
+        else:
+            header = self.header.pack(*prefix, KIND_MATRIX, *payload.shape)
+        return [header, payload]
+
+    def _decode(self, frames):
+        type_id, timestamp, sender, sequence, kind, rows, cols = \
+            self.header.unpack(frames[0])
+        if kind == KIND_NONE:
+            message = None
+        elif kind == KIND_BOOL:
+            message = bool(rows)
+        elif kind == KIND_VECTOR:
+            payload = np.frombuffer(frames[1], dtype=np.float64, count=rows)
+            message = tuple(None if np.isnan(value) else float(value)
+                            for value in payload)
+        else:
+            message = np.frombuffer(frames[1], dtype=np.float64,
+                                    count=rows*cols).reshape(rows, cols)
+        return type_id, Header(timestamp, sender, sequence), message
+
+    def encode_request(self, message_type, message=None, sender=0, sequence=0):
+        return self._encode(MESSAGE_IDS[message_type], message, sender, sequence)
+
+    def decode_request(self, frames):
+        type_id, header, message = self._decode(frames)
+        return header, MESSAGE_TYPES[type_id], message
+
+    def encode_reply(self, message):
+        return self._encode(MESSAGE_IDS["reply"], message)
+
+    def decode_reply(self, frames):
+        _, header, message = self._decode(frames)
+        return header.timestamp, message
+
+CODECS = {"string": StringCodec, "binary": BinaryCodec}
+
+def get_codec(codec):
+    """Returns a codec instance from a codec, a codec name or None."""
+    if codec is None:
+        return BinaryCodec()
+    if isinstance(codec, str):
+        return CODECS[codec]()
+    return codec
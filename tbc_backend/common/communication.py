@@ -1,61 +1,131 @@
 """
 Communication backend for tennis ball collector.
+
+Queries such as 'get_target_rel' use a REQ/REP pair (Client and Server).
+Camera producers stream their results with a Publisher instead, which never
+waits on the tracker. The Server binds a SUB socket for the stream when
+given a stream port and conflates it, so only the newest message of each
+type is handed to the caller.
+
+AsyncServer is the asyncio alternative to Server: one ROUTER endpoint per
+peer, each served by its own task, so a busy producer cannot hold up the
+controller's queries.
 """
 
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
-import ast
-import time
+from collections import OrderedDict
+import itertools
+import os
 
 import zmq
 
+from .codecs import get_codec
+from .dedup import DedupCache
+from .instruments import INSTRUMENTS
+
+def _duplicate(dedup, header):
+    # legacy string requests have no key to deduplicate on
+    return header.sender is not None and \
+        dedup.seen((header.sender, header.sequence))
+
 class Server(object):
 
-    def __init__(self, port):
+    def __init__(self, port, codec=None, dedup_entries=4096, dedup_age=None,
+                 stream_port=None, recorder=None):
+        self.codec = get_codec(codec)
+        self.recorder = recorder
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.REP)
         self.address = "tcp://*:%s" % port
         self.socket.bind(self.address)
-        self.strings_seen = set()
+        self.dedup = DedupCache(dedup_entries, dedup_age)
+        self.awaiting_reply = False
+        self.last_header = None
+        self.conflated = 0
+        self.stream = None
+        if stream_port is not None:
+            self.stream = self.context.socket(zmq.SUB)
+            self.stream.setsockopt(zmq.SUBSCRIBE, b"")
+            self.stream_address = "tcp://*:%s" % stream_port
+            self.stream.bind(self.stream_address)
+            self.poller = zmq.Poller()
+            self.poller.register(self.socket, zmq.POLLIN)
+            self.poller.register(self.stream, zmq.POLLIN)
+
+    def _drain_stream(self):
+        latest = OrderedDict()
+        while True:
+            try:
+                frames = self.stream.recv_multipart(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return latest
+            header, message_type, message = self.codec.decode_request(frames)
+            if message_type in latest:
+                self.conflated += 1
+                INSTRUMENTS.count("comm.conflated")
+                del latest[message_type]
+            latest[message_type] = (header, message)
 
     def listen(self, autoreply=False):
         while True:
             try:
-                string = self.socket.recv_string()
-                if string in self.strings_seen:
-                    self.reply(False)
-                    continue
-                self.strings_seen.add(string)
-                _, message_type, message_data = string.split(" ", 2)
-                try:
-                    message = ast.literal_eval(message_data)
-                except ValueError:
-                    message = message_data
-                if autoreply:
-                    self.reply(True)
-                yield message_type, message
+                ready = dict(self.poller.poll()) if self.stream is not None else {}
+                if self.stream is None or self.socket in ready:
+                    frames = self.socket.recv_multipart(copy=False)
+                    header, message_type, message = self.codec.decode_request(frames)
+                    self.awaiting_reply = True
+                    if _duplicate(self.dedup, header):
+                        # nothing to yield, but the stream may still be ready
+                        self.reply(False)
+                    else:
+                        if autoreply:
+                            self.reply(True)
+                        self.last_header = header
+                        if self.recorder is not None:
+                            self.recorder.record("recv", message_type, message)
+                        yield message_type, message
+                if self.stream in ready:
+                    for message_type, (header, message) in self._drain_stream().items():
+                        self.last_header = header
+                        if self.recorder is not None:
+                            self.recorder.record("recv", message_type, message)
+                        yield message_type, message
             except (KeyboardInterrupt, SystemExit):
                 return
 
     def reply(self, message):
-        string = "%s %s" % (time.time(), message)
-        self.socket.send_string(string)
+        # streamed messages have no requester waiting on them
+        if not self.awaiting_reply:
+            return
+        self.socket.send_multipart(self.codec.encode_reply(message), copy=False)
+        self.awaiting_reply = False
+        if self.recorder is not None:
+            self.recorder.record("reply", None, message)
 
 class Client(object):
 
-    def __init__(self, port, host="localhost"):
+    def __init__(self, port, host="localhost", codec=None, recorder=None):
+        self.codec = get_codec(codec)
+        self.recorder = recorder
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.REQ)
         self.address = "tcp://%s:%s" % (host, port)
+        self.socket.connect(self.address)
+        self.sender = int.from_bytes(os.urandom(8), "little")
+        self.sequence = itertools.count()
 
     def request(self, message_type, req_message=None):
-        self.socket.connect(self.address)
-        req_string = "%s %s %s" % (time.time(), message_type, req_message)
-        self.socket.send_string(req_string)
-        rep_string = self.socket.recv_string()
-        _, data = rep_string.split(" ", 1)
-        message = ast.literal_eval(data)
+        with INSTRUMENTS.time("comm.request"):
+            frames = self.codec.encode_request(message_type, req_message,
+                                               self.sender, next(self.sequence))
+            self.socket.send_multipart(frames, copy=False)
+            rep_frames = self.socket.recv_multipart(copy=False)
+            _, message = self.codec.decode_reply(rep_frames)
+        if self.recorder is not None:
+            self.recorder.record("send", message_type, req_message)
+            self.recorder.record("reply", message_type, message)
         return message
 
     def send(self, message_type, req_message=None):
@@ -67,3 +137,93 @@ class Client(object):
                 yield self.request(message_type)
             except (KeyboardInterrupt, SystemExit):
                 return
+
+class Publisher(object):
+    """Fire-and-forget producer for the server's stream port.
+
+    send() never blocks: when the tracker falls behind, the small send
+    queue fills and newer messages are dropped by ZMQ rather than queued.
+    PUB sockets drop silently, so drops cannot be counted here. The server's
+    conflated count shows how far behind the tracker is.
+    """
+
+    def __init__(self, port, host="localhost", codec=None, queue_size=4, recorder=None):
+        self.codec = get_codec(codec)
+        self.recorder = recorder
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, queue_size)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.address = "tcp://%s:%s" % (host, port)
+        self.socket.connect(self.address)
+        self.sender = int.from_bytes(os.urandom(8), "little")
+        self.sequence = itertools.count()
+
+    def send(self, message_type, message=None):
+        with INSTRUMENTS.time("comm.publish"):
+            frames = self.codec.encode_request(message_type, message,
+                                               self.sender, next(self.sequence))
+            self.socket.send_multipart(frames, zmq.NOBLOCK, copy=False)
+        if self.recorder is not None:
+            self.recorder.record("publish", message_type, message)
+
+class AsyncServer(object):
+    """Serves several named ROUTER endpoints concurrently with asyncio.
+
+    Peers connect with a plain Client (REQ). Every endpoint runs its own
+    receive loop and calls handler(endpoint, message_type, message), whose
+    return value is sent back as the reply. last_header holds the header of
+    the message being handled. Handlers run on the event loop
+    thread, so they must be quick and must not block.
+
+    asyncio and zmq.asyncio are imported when an AsyncServer is made, so
+    processes that only use Client, Server or Publisher never load them.
+    """
+
+    def __init__(self, ports, codec=None, dedup_entries=4096, dedup_age=None,
+                 recorder=None):
+        self.codec = get_codec(codec)
+        self.recorder = recorder
+        import zmq.asyncio
+        self.context = zmq.asyncio.Context()
+        self.sockets = {}
+        for endpoint, port in ports.items():
+            socket = self.context.socket(zmq.ROUTER)
+            socket.bind("tcp://*:%s" % port)
+            self.sockets[endpoint] = socket
+        self.dedup = DedupCache(dedup_entries, dedup_age)
+        self.last_header = None
+
+    async def _serve_endpoint(self, endpoint, handler):
+        import asyncio
+        socket = self.sockets[endpoint]
+        while True:
+            frames = await socket.recv_multipart(copy=False)
+            # REQ peers prefix their message with an empty delimiter frame
+            delimiter = next(i for i, frame in enumerate(frames) if not len(frame))
+            envelope, frames = frames[:delimiter + 1], frames[delimiter + 1:]
+            header, message_type, message = self.codec.decode_request(frames)
+            if _duplicate(self.dedup, header):
+                reply = False
+            else:
+                self.last_header = header
+                reply = handler(endpoint, message_type, message)
+                if self.recorder is not None:
+                    self.recorder.record("recv", message_type, message)
+                    self.recorder.record("reply", message_type, reply)
+            await socket.send_multipart(envelope + self.codec.encode_reply(reply),
+                                        copy=False)
+            # give the other endpoints a turn even when this one is saturated
+            await asyncio.sleep(0)
+
+    async def serve(self, handler):
+        import asyncio
+        await asyncio.gather(*(self._serve_endpoint(endpoint, handler)
+                               for endpoint in self.sockets))
+
+    def run(self, handler):
+        import asyncio
+        try:
+            asyncio.run(self.serve(handler))
+        except (KeyboardInterrupt, SystemExit):
+            return
@@ -0,0 +1,58 @@
+"""
+Bounded request deduplication for tennis ball collector communication.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from collections import OrderedDict
+import time
+
+class DedupCache(object):
+    """LRU window of recently seen (sender, sequence) keys.
+
+    The window is bounded by entry count and, optionally, by age in seconds,
+    so memory stays flat no matter how long the server runs. Counters for
+    hits (duplicates), misses (new keys) and evictions are kept as plain
+    attributes.
+    """
+
+    def __init__(self, max_entries=4096, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _evict(self, now):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        if self.max_age is None:
+            return
+        while self.entries:
+            key, last_seen = next(iter(self.entries.items()))
+            if now - last_seen <= self.max_age:
+                break
+            del self.entries[key]
+            self.evictions += 1
+
+    def seen(self, key, now=None):
+        """Records key and returns True if it was already in the window."""
+        if now is None:
+            now = time.monotonic()
+        if key in self.entries:
+            self.hits += 1
+            self.entries[key] = now
+            self.entries.move_to_end(key)
+            return True
+        self.misses += 1
+        self.entries[key] = now
+        self._evict(now)
+        return False
+
+    def stats(self):
+        return {"size": len(self.entries), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,227 @@
+"""
+Per-stage latency instrumentation for tennis ball collector.
+
+INSTRUMENTS is shared by the vision, tracking and control code. Stages are
+timed with
+
+    with INSTRUMENTS.time("vision.mask"):
+        ...
+
+and events counted with INSTRUMENTS.count(name). Both do nothing until
+INSTRUMENTS.enable() is called, so instrumented code costs one method call
+per stage when it is off.
+
+Every stage keeps its latest timings in a fixed size ring buffer. Writers
+store a value and bump a counter without taking a lock; readers copy the
+ring, so a reader never holds up the hot path. Two threads timing the same
+stage at once can overwrite one another's sample, which loses a sample and
+nothing else.
+
+summary() turns the rings into counts, percentiles and log spaced
+histograms. StatsServer serves it as JSON over HTTP and PeriodicDump logs
+it every few seconds.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from array import array
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+# histogram bucket edges in milliseconds
+HISTOGRAM_EDGES = (0, .01, .02, .05, .1, .2, .5, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+                   1000, 2000, 5000, np.inf)
+
+class RingBuffer(object):
+    """The last capacity float samples written to it."""
+
+    def __init__(self, capacity=1024):
+        self.values = array("d", bytes(8*capacity))
+        self.capacity = capacity
+        self.written = 0
+
+    def append(self, value):
+        self.values[self.written % self.capacity] = value
+        self.written += 1
+
+    def snapshot(self):
+        return np.frombuffer(self.values, dtype=np.float64)[:min(self.written,
+                                                                 self.capacity)].copy()
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class _Timer(object):
+    __slots__ = ("ring", "start")
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.ring.append(time.perf_counter() - self.start)
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Instruments(object):
+    """Stage timers and event counters, off until enable() is called."""
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.enabled = False
+        self.stages = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def enable(self, capacity=None):
+        if capacity is not None:
+            self.capacity = capacity
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def _ring(self, stage):
+        ring = self.stages.get(stage)
+        if ring is None:
+            ring = self.stages.setdefault(stage, RingBuffer(self.capacity))
+        return ring
+
+    def time(self, stage):
+        """Context manager timing one pass through stage."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self._ring(stage))
+
+    def record(self, stage, seconds):
+        if self.enabled:
+            self._ring(stage).append(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        """Returns {"stages": {stage: statistics}, "counters": {...}} with
+        times in milliseconds over each stage's ring."""
+        stages = {}
+        for stage, ring in list(self.stages.items()):
+            samples = 1000*ring.snapshot()
+            if not samples.size:
+                continue
+            histogram, _ = np.histogram(samples, HISTOGRAM_EDGES)
+            p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+            stages[stage] = {"count": ring.written, "mean_ms": float(samples.mean()),
+                             "p50_ms": float(p50), "p95_ms": float(p95),
+                             "p99_ms": float(p99), "max_ms": float(samples.max()),
+                             "histogram": histogram.tolist()}
+        return {"uptime": time.time() - self.started, "stages": stages,
+                "counters": dict(self.counters),
+                "histogram_edges_ms": [float(edge) for edge in HISTOGRAM_EDGES]}
+
+    def format(self):
+        summary = self.summary()
+        lines = ["%-28s %8d  mean %8.3f  p50 %8.3f  p95 %8.3f  p99 %8.3f  max %8.3f ms" %
+                 (stage, stats["count"], stats["mean_ms"], stats["p50_ms"],
+                  stats["p95_ms"], stats["p99_ms"], stats["max_ms"])
+                 for stage, stats in sorted(summary["stages"].items())]
+        lines.extend("%-28s %8d" % item for item in sorted(summary["counters"].items()))
+        return "\n".join(lines)
+
+INSTRUMENTS = Instruments()
+
+class StatsServer(object):
+    """Serves instruments.summary() as JSON on http://host:port/ from a
+    daemon thread."""
+
+    def __init__(self, instruments=INSTRUMENTS, port=8000, host="127.0.0.1"):
+        # imported here, the HTTP stack is most of this module's import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = json.dumps(instruments.summary()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class PeriodicDump(object):
+    """Logs instruments.format() every period seconds from a daemon thread."""
+
+    def __init__(self, instruments=INSTRUMENTS, period=10.0, logger=None):
+        self.instruments = instruments
+        self.period = period
+        self.logger = logger or logging.getLogger(__name__)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while not self.stopped.wait(self.period):
+            self.logger.info("stage timings\n%s", self.instruments.format())
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+def add_arguments(parser):
+    """Adds the '--log_level', '--stats_port' and '--stats_every' options
+    that configure() takes to a frontend's ArgumentParser."""
+    parser.add_argument("--log_level", dest="log_level", default="WARNING",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Logging level. Defaults to 'WARNING'.")
+    parser.add_argument("--stats_port", dest="stats_port", default=None, type=int,
+                        help="""Time every stage and serve the timings as JSON on
+                        this local HTTP port.""")
+    parser.add_argument("--stats_every", dest="stats_every", default=None,
+                        type=float, help="""Time every stage and log the timings
+                        every this many seconds.""")
+
+def configure(log_level="WARNING", stats_port=None, stats_every=None):
+    """Sets up logging for a frontend and turns INSTRUMENTS on when its
+    stats are served on stats_port or logged every stats_every seconds."""
+    logging.basicConfig(level=getattr(logging, log_level.upper()),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if stats_port is None and not stats_every:
+        return None, None
+    INSTRUMENTS.enable()
+    server = StatsServer(INSTRUMENTS, stats_port) if stats_port is not None else None
+    dump = None
+    if stats_every:
+        if logging.getLogger(__name__).getEffectiveLevel() > logging.INFO:
+            logging.getLogger(__name__).setLevel(logging.INFO)
+        dump = PeriodicDump(INSTRUMENTS, stats_every)
+    return server, dump
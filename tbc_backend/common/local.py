@@ -0,0 +1,103 @@
+"""
+In-process transport for tennis ball collector.
+
+Stand-ins for Server, Client and Publisher that pass Python objects through
+queues inside one process, for replay and simulation without ZMQ.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import queue
+import threading
+import time
+
+from .codecs import Header
+
+class LocalTransport(object):
+
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.closed = threading.Event()
+        self.condition = threading.Condition()
+        self.unhandled = 0 # published messages not yet handled by the server
+
+    def _published(self, count):
+        with self.condition:
+            self.unhandled += count
+            self.condition.notify_all()
+
+    def wait_published(self):
+        """Blocks until the server has handled every published message."""
+        with self.condition:
+            while self.unhandled:
+                self.condition.wait()
+
+    def close(self):
+        self.closed.set()
+
+class LocalServer(object):
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.reply_queue = None
+        self.last_header = None
+
+    def listen(self, autoreply=False):
+        while not self.transport.closed.is_set():
+            try:
+                message_type, message, reply_queue, timestamp = \
+                    self.transport.requests.get(timeout=.05)
+            except queue.Empty:
+                continue
+            self.reply_queue = reply_queue
+            self.last_header = Header(timestamp, 0, 0)
+            if autoreply:
+                self.reply(True)
+            yield message_type, message
+            if reply_queue is None:
+                self.transport._published(-1)
+
+    def reply(self, message):
+        # published messages have no requester waiting on them
+        if self.reply_queue is None:
+            return
+        self.reply_queue.put(message)
+        self.reply_queue = None
+
+class LocalClient(object):
+    """Raises EOFError from request once the transport is closed."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.reply_queue = queue.Queue(1)
+
+    def request(self, message_type, req_message=None):
+        self.transport.requests.put((message_type, req_message, self.reply_queue,
+                                     time.time()))
+        while True:
+            if self.transport.closed.is_set():
+                raise EOFError("Transport closed.")
+            try:
+                return self.reply_queue.get(timeout=.05)
+            except queue.Empty:
+                continue
+
+    def send(self, message_type, req_message=None):
+        self.request(message_type, req_message)
+
+    def listen(self, message_type):
+        while True:
+            try:
+                yield self.request(message_type)
+            except EOFError:
+                return
+
+class LocalPublisher(object):
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def send(self, message_type, message=None):
+        self.transport._published(1)
+        self.transport.requests.put((message_type, message, None, time.time()))
@@ -0,0 +1,188 @@
+"""
+Recording and replay of camera frames and messages for tennis ball collector.
+
+Frames are written to fixed-size chunk files of raw pixels through
+np.memmap, so recording costs one memcpy per frame and replay maps the
+chunks back without decoding. Messages are written as one JSON object per
+line.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+FRAME_MANIFEST = "frames.json"
+FRAME_CHUNK = "frames_%05d.raw"
+
+class FrameRecorder(object):
+    """Writes the raw frames a camera reads into chunk files.
+
+    A camera given a recorder calls describe() with how it averages,
+    undistorts and calibrates its frames, so replay can process them the
+    same way. The manifest is rewritten whenever a chunk is finished and on
+    close, so a recording cut short still replays up to its last full
+    chunk.
+    """
+
+    def __init__(self, directory, chunk_frames=256):
+        self.directory = directory
+        self.chunk_frames = chunk_frames
+        os.makedirs(directory, exist_ok=True)
+        self.shape = self.dtype = self.chunk = None
+        self.timestamps = []
+        self.metadata = {}
+
+    def describe(self, **metadata):
+        self.metadata.update(metadata)
+
+    def _open_chunk(self):
+        path = os.path.join(self.directory, FRAME_CHUNK % (len(self.timestamps)//self.chunk_frames))
+        self.chunk = np.memmap(path, dtype=self.dtype, mode="w+",
+                               shape=(self.chunk_frames,) + self.shape)
+
+    def _write_manifest(self):
+        manifest = dict(self.metadata,
+                        shape=list(self.shape or ()),
+                        dtype=str(np.dtype(self.dtype or np.uint8)),
+                        chunk_frames=self.chunk_frames,
+                        timestamps=self.timestamps)
+        path = os.path.join(self.directory, FRAME_MANIFEST)
+        # replace in one step so a reader never sees a partial manifest
+        with open(path + ".tmp", "w") as f:
+            f.write(json.dumps(manifest))
+        os.replace(path + ".tmp", path)
+
+    def write(self, frame, timestamp=None):
+        if self.shape is None:
+            self.shape, self.dtype = frame.shape, frame.dtype
+        if not len(self.timestamps) % self.chunk_frames:
+            if self.chunk is not None:
+                self.chunk.flush()
+                self._write_manifest()
+            self._open_chunk()
+        self.chunk[len(self.timestamps) % self.chunk_frames] = frame
+        self.timestamps.append(time.time() if timestamp is None else timestamp)
+
+    def close(self):
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.chunk = None
+        self._write_manifest()
+
+class FrameReader(object):
+    """Replays a FrameRecorder directory through the camera interface.
+
+    capture_single averages and undistorts the raw frames as the recording
+    camera did. undistort_points is set when that camera left its frames
+    distorted, in which case the detected points need a LensProjector with
+    calibration_file. Recordings without a calibration_file hold frames
+    that were already undistorted.
+
+    capture_single raises EOFError once every frame has been returned.
+    """
+
+    def __init__(self, directory, cache_dir=None):
+        with open(os.path.join(directory, FRAME_MANIFEST)) as f:
+            manifest = json.loads(f.read())
+        self.shape = tuple(manifest["shape"])
+        self.height, self.width = self.shape[:2]
+        self.chunk_frames = manifest["chunk_frames"]
+        self.timestamps = np.array(manifest["timestamps"])
+        self.n_frames = manifest.get("n_frames", 1)
+        self.calibration_file = manifest.get("calibration_file")
+        self.undistort_frame = manifest.get("undistort_frame", False)
+        self.undistort_points = self.calibration_file is not None and \
+            not self.undistort_frame
+        self.maps = None
+        if self.undistort_frame:
+            from ..vision.cameras import load_calibration
+            calibration = load_calibration(self.calibration_file, cache_dir)
+            self.maps = calibration["map_1"], calibration["map_2"]
+        n_chunks = -(-len(self.timestamps)//self.chunk_frames)
+        self.chunks = [np.memmap(os.path.join(directory, FRAME_CHUNK % i),
+                                 dtype=manifest["dtype"], mode="r",
+                                 shape=(self.chunk_frames,) + self.shape)
+                       for i in range(n_chunks)]
+        self.position = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, i):
+        return self.chunks[i//self.chunk_frames][i % self.chunk_frames]
+
+    def read_raw(self):
+        if self.position >= len(self):
+            raise EOFError("End of recording.")
+        self.position += 1
+        return self[self.position - 1]
+
+    def undistort(self, image, dst=None):
+        from ..vision.cameras import undistort_image
+        return undistort_image(image, self.maps, dst)
+
+    def capture_single(self):
+        if self.n_frames == 1:
+            return self.undistort(self.read_raw())
+        total = self.read_raw().astype(np.float32)
+        for _ in range(self.n_frames - 1):
+            total += self.read_raw()
+        # rounded like the camera's convertScaleAbs
+        return self.undistort(np.rint(total/self.n_frames).astype(np.uint8))
+
+    def capture(self):
+        while self.position + self.n_frames <= len(self):
+            yield self.capture_single()
+
+def _to_json(message):
+    if isinstance(message, np.ndarray):
+        return message.tolist()
+    if isinstance(message, (tuple, list)):
+        return [_to_json(value) for value in message]
+    if isinstance(message, np.generic):
+        return message.item()
+    return message
+
+class MessageRecorder(object):
+    """Appends (timestamp, direction, message type, message) records.
+
+    Directions are 'send' and 'reply' for REQ/REP traffic seen by a Client,
+    'recv' and 'reply' for a Server and 'publish' for a Publisher.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+
+    def record(self, direction, message_type, message):
+        line = json.dumps({"t": time.time(), "direction": direction,
+                           "type": message_type, "message": _to_json(message)})
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def read_messages(path):
+    """Yields (timestamp, direction, message type, message) records.
+
+    Lists of pairs come back as lists of tuples and flat lists as tuples,
+    matching what the producers originally sent.
+    """
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            message = record["message"]
+            if isinstance(message, list):
+                if message and isinstance(message[0], list):
+                    message = [tuple(value) for value in message]
+                elif record["type"] not in ("offboard_targets", "onboard_targets"):
+                    message = tuple(message)
+            yield record["t"], record["direction"], record["type"], message
@@ -1,2 +1,2 @@
-from .devices import ArduinoRobot
-from .controllers import PointAndShootController
+from .devices import ArduinoRobot, ScheduledArduinoRobot, FakeArduinoRobot, MoveLogger
+from .controllers import PointAndShootController, UnicycleController, CONTROLLER_FILE
@@ -6,8 +6,14 @@ Trajectory control system for tennis ball collector.
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
+import os
+
 import numpy as np
 
+CURRDIR = os.path.dirname(__file__)
+
+CONTROLLER_FILE = os.path.join(CURRDIR, "runtime/controller.json")
+
 class PointAndShootController(object):
     """Computes left and right speed given the desired heading
         Point and shoot first executes a turn and then drives forward.
@@ -62,6 +68,16 @@ class PointAndShootController(object):
         delta = (disp_rho, 0)
         return move, delta
 
+    def turn_command(self, disp_phi):
+        """Returns the move and delta for a full turn by disp_phi at half
+        speed, without the buffer distance or turn limits of control()."""
+        return self._compute_turn(disp_phi, self.max_speed/2)
+
+    def forward_command(self, disp_rho):
+        """Returns the move and delta for driving disp_rho at full speed,
+        without the buffer distance of control()."""
+        return self._compute_forward(disp_rho, self.max_speed)
+
     def control(self, rho, phi, finish, tol=1e-1):
         if phi > np.pi:
             phi = 2*np.pi - phi
@@ -94,3 +110,95 @@ class PointAndShootController(object):
                                                     self.max_speed,
                                                     finish)
         return move, delta
+
+class UnicycleController(object):
+    """Closed-loop controller that outputs wheel speeds at a fixed rate.
+
+    The target is set from each tracker query and then carried along in the
+    robot frame by dead reckoning on the wheel speeds the controller itself
+    commands, so it can keep steering between queries. The feedback law is
+    the usual unicycle one: forward speed proportional to the remaining
+    distance (scaled down while the target is off to the side) and turn rate
+    proportional to the bearing.
+
+    Wheel speeds are in ArduinoRobot units and relate to ft/s and rad/s
+    through forward_scaling and turn_scaling, the same constants
+    PointAndShootController uses for its move times.
+    """
+
+    def __init__(self, turn_scaling=98, forward_scaling=115, min_speed=15,
+                 max_speed=70, buffer_distance=0.5, k_rho=1.5, k_phi=3.0,
+                 tolerance=0.1, rate=50):
+        self.turn_scaling = turn_scaling
+        self.forward_scaling = forward_scaling
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.buffer_distance = buffer_distance
+        self.k_rho = k_rho
+        self.k_phi = k_phi
+        self.tolerance = tolerance
+        self.period = 1.0/rate
+        self.target = None # (x, y) in the robot frame, x forward and y left
+        self.moved = np.zeros(2) # displacement since the last pop, in that frame
+        self.turned = 0.0
+
+    def set_target(self, rho, phi, finish=True):
+        # aim past the ball by buffer_distance so it ends up collected
+        rho += self.buffer_distance
+        self.target = np.array([rho*np.cos(phi), rho*np.sin(phi)])
+
+    def clear_target(self):
+        self.target = None
+
+    def _wheel_speeds(self, forward, turn):
+        left = forward*self.forward_scaling - turn*self.turn_scaling
+        right = forward*self.forward_scaling + turn*self.turn_scaling
+        peak = max(abs(left), abs(right))
+        if peak > self.max_speed:
+            left, right = left*self.max_speed/peak, right*self.max_speed/peak
+        return left, right
+
+    def _advance(self, left, right, dt):
+        forward = (left + right)/2.0/self.forward_scaling*dt
+        turn = (right - left)/2.0/self.turn_scaling*dt
+        # chord of the arc driven this step, in the frame at the start of it
+        step = forward*np.array([np.cos(turn/2), np.sin(turn/2)])
+        rotation = np.array([[np.cos(turn), np.sin(turn)],
+                             [-np.sin(turn), np.cos(turn)]])
+        self.target = rotation.dot(self.target - step)
+        heading = self.turned
+        self.moved += step.dot([[np.cos(heading), np.sin(heading)],
+                                [-np.sin(heading), np.cos(heading)]])
+        self.turned += turn
+
+    def step(self, dt=None):
+        """Returns (left_speed, right_speed) for the next period, or None
+        once the target has been reached (or there is none)."""
+        dt = self.period if dt is None else dt
+        if self.target is None:
+            return None
+        rho = np.hypot(*self.target)
+        phi = np.arctan2(self.target[1], self.target[0])
+        if rho < self.tolerance:
+            self.target = None
+            return None
+        # never crawl in slower than the motors can reliably drive
+        forward = max(self.k_rho*rho, self.min_speed/self.forward_scaling)
+        forward *= max(0.0, np.cos(phi))
+        turn = self.k_phi*phi
+        left, right = self._wheel_speeds(forward, turn)
+        # the Arduino only takes integer speeds, dead reckon on what it runs
+        left, right = int(round(left)), int(round(right))
+        self._advance(left, right, dt)
+        return left, right
+
+    def pop_deltas(self):
+        """Returns the motion since the last call as (rho, phi) deltas for
+        the tracker's update_agent_rel: a turn toward the displacement and a
+        move along it, then the remaining turn."""
+        rho = np.hypot(*self.moved)
+        bearing = np.arctan2(self.moved[1], self.moved[0]) if rho else 0.0
+        deltas = [(rho, bearing), (0.0, self.turned - bearing)]
+        self.moved = np.zeros(2)
+        self.turned = 0.0
+        return [delta for delta in deltas if delta[0] or delta[1]]
@@ -6,26 +6,44 @@ Motor controller commanders for tennis ball collector.
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
+from collections import deque
+import json
+import logging
+import threading
 import time
 
 from serial import Serial
 
+logger = logging.getLogger(__name__)
 
 class ArduinoRobot(object):
+    """Blocking serial commander.
 
-    def __init__(self, port, baud):
+    Opening the port resets the Arduino, which then needs warmup seconds to
+    boot. The constructor returns at once and the first write waits out the
+    rest, so the boot overlaps with connecting to the tracker and the first
+    query.
+    """
+
+    def __init__(self, port, baud, warmup=2.0):
         self.port = port
         self.baud = baud
         self.serial = Serial(self.port, self.baud, timeout=None)
-        time.sleep(2)
+        self.ready_at = time.monotonic() + warmup
         self.last_message = None
 
+    def _wait_ready(self):
+        if self.ready_at is not None:
+            time.sleep(max(0.0, self.ready_at - time.monotonic()))
+            self.ready_at = None
+
     def _send(self, left_speed, right_speed):
         left_speed, right_speed = int(left_speed), int(right_speed)
         message = "%d %d\r\n" % (left_speed, right_speed)
         if message == self.last_message:
             # sending this message is redundant
             return
+        self._wait_ready()
         self.serial.flush()
         self.serial.write(message.encode())
         self.last_message = message
@@ -38,11 +56,238 @@ class ArduinoRobot(object):
         if stop:
             self._send(0, 0)
 
+class Segment(object):
+    """One timed motion queued on a ScheduledArduinoRobot.
+
+    delta is the (rho, phi) displacement the controller expects from the
+    whole segment. It is scaled by the fraction of move_time that actually
+    ran before the segment finished or was preempted.
+    """
+
+    def __init__(self, left_speed, right_speed, move_time=None, stop=False, delta=None):
+        self.left_speed = left_speed
+        self.right_speed = right_speed
+        self.move_time = move_time
+        self.stop = stop
+        self.delta = delta
+        self.started = None
+        self.fraction = 0.0
+        self.reported = 0.0
+        self.interrupted = False
+        self.done = threading.Event()
+
+    def progress(self, now):
+        if self.started is None:
+            return 0.0
+        if not self.move_time:
+            return 1.0
+        return min(1.0, (now - self.started)/self.move_time)
+
+class ScheduledArduinoRobot(object):
+    """Non-blocking variant of ArduinoRobot.
+
+    A single writer thread owns the serial port and runs queued Segments
+    back to back. command() returns immediately. With preempt=True it
+    cancels the running and queued segments in favour of the new one, so
+    the controller can react to fresh tracking data mid-move. Writes are
+    spaced at least min_interval apart without ever blocking the caller.
+    The default of 0.10 s is the pause ArduinoRobot leaves after every
+    message. control.py --continuous lowers it to 1/--rate, which relies on
+    the firmware taking each line as it arrives; use a rate of 10 where it
+    needs the full pause. Nothing is written until the warmup after opening
+    the port has passed.
+    """
+
+    def __init__(self, port, baud, min_interval=.10, serial=None, warmup=2.0):
+        self.port = port
+        self.baud = baud
+        self.min_interval = min_interval
+        self.ready_at = None
+        if serial is None:
+            serial = Serial(self.port, self.baud, timeout=None)
+            self.ready_at = time.monotonic() + warmup
+        self.serial = serial
+        self.last_message = None
+        self.last_write = 0.0
+        self.condition = threading.Condition()
+        self.queue = deque()
+        self.current = None
+        self.deltas = []
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _send(self, left_speed, right_speed):
+        left_speed, right_speed = int(left_speed), int(right_speed)
+        message = "%d %d\r\n" % (left_speed, right_speed)
+        if message == self.last_message:
+            # sending this message is redundant
+            return
+        wait = self.last_write + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.serial.write(message.encode())
+        self.last_write = time.monotonic()
+        self.last_message = message
+
+    def _scaled_delta(self, segment, fraction):
+        if segment.delta is None or fraction <= segment.reported:
+            return None
+        rho, phi = segment.delta
+        scale = fraction - segment.reported
+        segment.reported = fraction
+        return rho*scale, phi*scale
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                # hold off until the Arduino has booted and can take another
+                # message, then run whatever is newest by then
+                while self.running:
+                    wait = max(self.last_write + self.min_interval,
+                               self.ready_at or 0.0) - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                if not self.running:
+                    break
+                segment = self.current = self.queue.popleft()
+            self._send(segment.left_speed, segment.right_speed)
+            with self.condition:
+                segment.started = time.monotonic()
+                if segment.move_time is not None:
+                    end = segment.started + segment.move_time
+                    while not segment.interrupted and time.monotonic() < end:
+                        self.condition.wait(end - time.monotonic())
+                segment.fraction = segment.progress(time.monotonic())
+                delta = self._scaled_delta(segment, segment.fraction)
+                if delta is not None:
+                    self.deltas.append(delta)
+                self.current = None
+                follow_up = bool(self.queue)
+                self.condition.notify_all()
+            if segment.stop and not (segment.interrupted and follow_up):
+                self._send(0, 0)
+            segment.done.set()
+        self._send(0, 0)
+
+    def command(self, left_speed, right_speed, move_time=None, stop=False, preempt=False,
+                delta=None):
+        segment = Segment(left_speed, right_speed, move_time, stop, delta)
+        with self.condition:
+            if preempt:
+                self._cancel()
+            self.queue.append(segment)
+            self.condition.notify_all()
+        return segment
+
+    def _cancel(self):
+        for queued in self.queue:
+            queued.interrupted = True
+            queued.done.set()
+        self.queue.clear()
+        if self.current is not None:
+            self.current.interrupted = True
+
+    def cancel(self):
+        """Stops the running segment, drops queued ones and halts the motors."""
+        self.command(0, 0, preempt=True)
+
+    def executed_deltas(self):
+        """Returns the displacement executed since the last call, including
+        the part of the running segment already completed."""
+        with self.condition:
+            deltas, self.deltas = self.deltas, []
+            if self.current is not None:
+                delta = self._scaled_delta(self.current,
+                                           self.current.progress(time.monotonic()))
+                if delta is not None:
+                    deltas.append(delta)
+        return deltas
+
+    def wait(self, timeout=None):
+        """Blocks until every queued segment has finished."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.queue or self.current is not None:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self):
+        with self.condition:
+            self._cancel()
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+
+class FakeArduinoRobot(object):
+    """Stand-in for ArduinoRobot that logs commands instead of writing them.
+
+    Each timed command advances a simulated clock by its move time. With
+    time_scale > 0 it also sleeps for that fraction of the move time.
+    """
+
+    def __init__(self, time_scale=0.0):
+        self.time_scale = time_scale
+        self.clock = 0.0
+        self.commands = []
+
+    def command(self, left_speed, right_speed, move_time=None, stop=False):
+        self.commands.append((self.clock, left_speed, right_speed, move_time, stop))
+        if move_time is not None:
+            self.clock += move_time
+            if self.time_scale:
+                time.sleep(move_time*self.time_scale)
+
+class MoveLogger(object):
+    """Wraps a robot and logs every timed command with the agent pose the
+    tracker reports before and after it, one JSON object per line, for
+    fitting the motion constants with 'tune.py motion'.
+
+    The after pose is queried settle seconds after the command returns, so
+    the offboard camera has seen the robot at rest.
+    """
+
+    def __init__(self, robot, client, path, settle=.3):
+        self.robot = robot
+        self.client = client
+        self.file = open(path, "a")
+        self.settle = settle
+
+    def __getattr__(self, name):
+        return getattr(self.robot, name)
+
+    def command(self, left_speed, right_speed, move_time=None, stop=False, **kwargs):
+        if move_time is None:
+            return self.robot.command(left_speed, right_speed, move_time, stop, **kwargs)
+        before = self.client.request("get_agent_abs")
+        self.robot.command(left_speed, right_speed, move_time, stop, **kwargs)
+        if self.settle:
+            time.sleep(self.settle)
+        after = self.client.request("get_agent_abs")
+        if None in before or None in after:
+            return
+        self.file.write(json.dumps({"left": left_speed, "right": right_speed,
+                                    "move_time": float(move_time), "stop": bool(stop),
+                                    "before": [float(value) for value in before],
+                                    "after": [float(value) for value in after]}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        if hasattr(self.robot, "close"):
+            self.robot.close()
+
 class DummyCommander(object):
 
     def __init__(self):
         pass
 
     def command(self, left_speed, right_speed, move_time=None, stop=False):
-        print("command:", left_speed, right_speed, move_time, stop)
+        logger.info("command: %s %s %s %s", left_speed, right_speed, move_time, stop)
         time.sleep(move_time)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Motion constant tuning for tennis ball collector.
+
+Fits turn_scaling and forward_scaling to logged moves: the wheel speeds
+and move time of each command with the agent pose the tracker reported
+before and after it, as written by MoveLogger. Every candidate pair on a
+grid predicts every move's end pose at once and is scored by its position
+and heading error.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import json
+
+import numpy as np
+
+def read_moves(path, stopped_only=True):
+    """Returns (speeds, move_times, before, after) arrays from a MoveLogger
+    file. Moves that did not stop are left out with stopped_only, as the
+    robot was still running when their after pose was taken."""
+    moves = []
+    with open(path) as f:
+        for line in f:
+            move = json.loads(line)
+            if stopped_only and not move["stop"]:
+                continue
+            moves.append(move)
+    speeds = np.array([(move["left"], move["right"]) for move in moves], dtype=np.float64)
+    move_times = np.array([move["move_time"] for move in moves], dtype=np.float64)
+    before = np.array([move["before"] for move in moves], dtype=np.float64).reshape(-1, 3)
+    after = np.array([move["after"] for move in moves], dtype=np.float64).reshape(-1, 3)
+    return speeds, move_times, before, after
+
+def predict_poses(speeds, move_times, before, turn_scaling, forward_scaling, send_delay=.10):
+    """Returns end poses, shape (candidates, moves, 3), for arrays of
+    candidate turn_scaling and forward_scaling. Each move runs for
+    move_time plus the send_delay ArduinoRobot waits after sending it."""
+    turn_scaling = np.reshape(turn_scaling, (-1, 1))
+    forward_scaling = np.reshape(forward_scaling, (-1, 1))
+    left, right = speeds[:, 0], speeds[:, 1]
+    seconds = move_times + send_delay
+    forward = (left + right)/2.0/forward_scaling*seconds
+    turn = (right - left)/2.0/turn_scaling*seconds
+    x, y, heading = before[:, 0], before[:, 1], before[:, 2]
+    end_heading = heading + turn
+    straight = np.abs(turn) < 1e-9
+    safe_turn = np.where(straight, 1.0, turn)
+    end_x = x + np.where(straight, forward*np.cos(heading),
+                         forward/safe_turn*(np.sin(end_heading) - np.sin(heading)))
+    end_y = y + np.where(straight, forward*np.sin(heading),
+                         -forward/safe_turn*(np.cos(end_heading) - np.cos(heading)))
+    return np.stack((end_x, end_y, end_heading), axis=2)
+
+def pose_errors(moves, turn_scaling, forward_scaling, send_delay=.10):
+    """Returns (position rms, heading rms) per candidate."""
+    speeds, move_times, before, after = moves
+    predicted = predict_poses(speeds, move_times, before, turn_scaling, forward_scaling,
+                              send_delay)
+    position = np.sqrt(np.mean(np.sum((predicted[..., :2] - after[:, :2])**2, axis=2),
+                               axis=1))
+    heading = (predicted[..., 2] - after[:, 2] + np.pi) % (2*np.pi) - np.pi
+    return position, np.sqrt(np.mean(heading**2, axis=1))
+
+def fit_scaling(moves, turn_scalings, forward_scalings, send_delay=.10, heading_weight=1.0):
+    """Scores every (turn_scaling, forward_scaling) pair of the two grids.
+
+    Returns the candidates as an (n, 2) array with their position and
+    heading errors, and the index of the best one by position error plus
+    heading_weight feet per radian of heading error.
+    """
+    turn, forward = np.meshgrid(turn_scalings, forward_scalings, indexing="ij")
+    candidates = np.stack((turn.ravel(), forward.ravel()), axis=1)
+    position, heading = pose_errors(moves, candidates[:, 0], candidates[:, 1], send_delay)
+    best = int(np.argmin(position + heading_weight*heading))
+    return candidates, position, heading, best
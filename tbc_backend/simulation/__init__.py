@@ -0,0 +1,2 @@
+from .world import SimulatedWorld
+from .interfaces import SimulatedRobot, SimulatedClient
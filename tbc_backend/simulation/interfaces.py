@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Robot and tracking client stand-ins backed by a SimulatedWorld.
+
+SimulatedRobot has ArduinoRobot's command() and SimulatedClient has
+Client's request(), send() and listen(), so the control.py loops run
+against a simulation unmodified. Nothing sleeps: every move and every
+round trip advances the world's clock instead.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from ..common.codecs import get_codec
+
+class SimulatedRobot(object):
+    """ArduinoRobot.command semantics on a SimulatedWorld.
+
+    Speeds are sent as integers and a repeated message is skipped. Every
+    message sent costs send_delay seconds, the pause ArduinoRobot takes to
+    let the arduino time out, during which the robot already runs the new
+    speeds.
+    """
+
+    def __init__(self, world, send_delay=.10):
+        self.world = world
+        self.send_delay = send_delay
+        self.last_message = None
+        self.commands = 0
+
+    def _send(self, left_speed, right_speed):
+        message = (int(left_speed), int(right_speed))
+        if message == self.last_message:
+            return
+        self.world.set_speeds(*message)
+        self.last_message = message
+        self.world.advance(self.send_delay)
+
+    def command(self, left_speed, right_speed, move_time=None, stop=False):
+        self.commands += 1
+        self._send(left_speed, right_speed)
+        if move_time is not None:
+            self.world.advance(move_time)
+        if stop:
+            self._send(0, 0)
+
+class SimulatedClient(object):
+    """Client for a TrackingService fed by the world's simulated cameras.
+
+    Before each request, the newest frame of every camera that captured
+    one since the last request is handed to the service as the
+    'offboard_targets', 'agent_abs' and 'onboard_targets' messages the
+    vision frontends send. The tracking server conflates its stream the
+    same way. Each request takes latency seconds of world time. With a
+    codec, every message also makes the round trip through its wire
+    format. listen() stops once the world is done.
+    """
+
+    def __init__(self, world, service, latency=.02, offboard_period=.1,
+                 onboard_period=None, codec=None):
+        self.world = world
+        self.service = service
+        self.latency = latency
+        self.periods = {"offboard": offboard_period, "onboard": onboard_period}
+        self.next_frame = {"offboard": 0.0, "onboard": 0.0}
+        self.codec = None if codec is None else get_codec(codec)
+        self.requests = 0
+
+    def _deliver(self, message_type, message):
+        if self.codec is not None:
+            _, message_type, message = self.codec.decode_request(
+                self.codec.encode_request(message_type, message))
+        return self.service.handle(message_type, message, self.world.time)
+
+    def _deliver_frames(self):
+        now = self.world.time
+        for camera, period in self.periods.items():
+            if period is None or now < self.next_frame[camera]:
+                continue
+            self.next_frame[camera] = now + period
+            if camera == "offboard":
+                targets, agent = self.world.offboard_view()
+                self._deliver("agent_abs", agent)
+                self._deliver("offboard_targets", targets)
+            else:
+                self._deliver("onboard_targets", self.world.onboard_view())
+
+    def request(self, message_type, req_message=None):
+        self.requests += 1
+        self._deliver_frames()
+        reply = self._deliver(message_type, req_message)
+        if self.codec is not None:
+            _, reply = self.codec.decode_reply(self.codec.encode_reply(reply))
+        self.world.advance(self.latency)
+        return reply
+
+    def send(self, message_type, req_message=None):
+        self.request(message_type, req_message)
+
+    def listen(self, message_type):
+        while not self.world.done():
+            yield self.request(message_type)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Court, ball field and differential drive simulation for tennis ball
+collector.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import numpy as np
+
+class SimulatedWorld(object):
+    """A court scattered with balls and a differential drive robot.
+
+    Wheel speeds are in the controller's units: a robot driving both wheels
+    at speed covers speed/forward_scaling feet a second and one spinning
+    them at -speed and speed turns speed/turn_scaling radians a second.
+    Each wheel runs at its commanded speed times a gain drawn once per world
+    from gain_error, so open-loop moves drift the way the real robot does.
+
+    Motion under constant wheel speeds is an exact arc, so advance() moves
+    the robot in one step however long the interval. The collector, nose
+    feet ahead of the pose, is sampled along the arc every sample_spacing
+    feet and a ball is collected when a sample lands within capture_radius
+    of it, all balls and samples at once.
+
+    pose is the point the offboard camera's ArUco fix reports and the
+    robot's heading. The offboard camera sees every ball left on the court
+    and the pose, with noise, missing the marker at miss_rate. The onboard
+    camera sees the balls within onboard_range feet and onboard_half_angle
+    radians of the heading, in its own frame (x to the right, y forward).
+    """
+
+    def __init__(self, n_balls=20, seed=None, court=(0, 0, 8, 8), pose=None,
+                 turn_scaling=98, forward_scaling=115, gain_error=0.0, nose=0.5,
+                 capture_radius=.25, sample_spacing=.05, time_limit=600.0,
+                 offboard_noise=.1, heading_noise=.05, miss_rate=0.0,
+                 onboard_noise=.05, onboard_range=6.0, onboard_half_angle=.5):
+        self.rng = np.random.default_rng(seed)
+        x_min, y_min, x_max, y_max = court
+        self.court = court
+        self.balls = self.rng.uniform((x_min, y_min), (x_max, y_max), (n_balls, 2))
+        self.collected = np.zeros(n_balls, dtype=bool)
+        self.capture_times = np.full(n_balls, np.nan)
+        if pose is None:
+            pose = ((x_min + x_max)/2.0, y_min, np.pi/2)
+        self.pose = np.array(pose, dtype=np.float64)
+        self.turn_scaling = turn_scaling
+        self.forward_scaling = forward_scaling
+        self.gains = 1 + self.rng.normal(0, gain_error, 2)
+        self.nose = nose
+        self.capture_radius = capture_radius
+        self.sample_spacing = sample_spacing
+        self.time_limit = time_limit
+        self.offboard_noise = offboard_noise
+        self.heading_noise = heading_noise
+        self.miss_rate = miss_rate
+        self.onboard_noise = onboard_noise
+        self.onboard_range = onboard_range
+        self.onboard_half_angle = onboard_half_angle
+        self.speeds = (0, 0)
+        self.time = 0.0
+        self.distance = 0.0
+
+    def set_speeds(self, left_speed, right_speed):
+        self.speeds = (left_speed, right_speed)
+
+    def velocities(self):
+        """Returns the forward (ft/s) and turn (rad/s) rates of the robot."""
+        left = self.speeds[0]*self.gains[0]
+        right = self.speeds[1]*self.gains[1]
+        return (left + right)/2.0/self.forward_scaling, \
+            (right - left)/2.0/self.turn_scaling
+
+    def advance(self, seconds):
+        """Runs the current wheel speeds for seconds, collecting every ball
+        the collector passes over."""
+        if seconds <= 0:
+            return
+        forward, turn = self.velocities()
+        x, y, heading = self.pose
+        if not forward and not turn:
+            self.time += seconds
+            return
+        path = (abs(forward) + abs(turn)*self.nose)*seconds
+        n_samples = max(1, int(np.ceil(path/self.sample_spacing)))
+        times = np.linspace(0, seconds, n_samples + 1)[1:]
+        headings = heading + turn*times
+        if abs(turn) > 1e-9:
+            radius = forward/turn
+            xs = x + radius*(np.sin(headings) - np.sin(heading))
+            ys = y - radius*(np.cos(headings) - np.cos(heading))
+        else:
+            xs = x + forward*times*np.cos(heading)
+            ys = y + forward*times*np.sin(heading)
+        remaining = np.flatnonzero(~self.collected)
+        if len(remaining):
+            front_x = xs + self.nose*np.cos(headings)
+            front_y = ys + self.nose*np.sin(headings)
+            d_x = front_x[:, None] - self.balls[remaining, 0]
+            d_y = front_y[:, None] - self.balls[remaining, 1]
+            hits = d_x*d_x + d_y*d_y < self.capture_radius**2
+            captured = hits.any(axis=0)
+            if captured.any():
+                first = np.argmax(hits[:, captured], axis=0)
+                self.collected[remaining[captured]] = True
+                self.capture_times[remaining[captured]] = self.time + times[first]
+        self.pose[:] = xs[-1], ys[-1], (headings[-1] + np.pi) % (2*np.pi) - np.pi
+        self.time += seconds
+        self.distance += abs(forward)*seconds
+
+    def remaining(self):
+        return int(np.count_nonzero(~self.collected))
+
+    def done(self):
+        return self.time >= self.time_limit or self.collected.all()
+
+    def offboard_view(self):
+        """Returns what the offboard camera reports: (targets, agent)."""
+        balls = self.balls[~self.collected]
+        balls = balls + self.rng.normal(0, self.offboard_noise, balls.shape)
+        x_min, y_min, x_max, y_max = self.court
+        balls = balls[(balls[:, 0] > x_min) & (balls[:, 0] < x_max) &
+                      (balls[:, 1] > y_min) & (balls[:, 1] < y_max)]
+        if self.rng.random() < self.miss_rate:
+            agent = (None, None, None)
+        else:
+            x, y = self.pose[:2] + self.rng.normal(0, self.offboard_noise, 2)
+            phi = self.pose[2] + self.rng.normal(0, self.heading_noise)
+            agent = (float(x), float(y), float((phi + np.pi) % (2*np.pi) - np.pi))
+        return list(map(tuple, balls.tolist())), agent
+
+    def onboard_view(self):
+        """Returns the targets the onboard camera reports in its own frame."""
+        x, y, heading = self.pose
+        delta = self.balls[~self.collected] - (x, y)
+        rho = np.hypot(delta[:, 0], delta[:, 1])
+        bearing = (np.arctan2(delta[:, 1], delta[:, 0]) - heading + np.pi) % (2*np.pi) - np.pi
+        seen = (rho < self.onboard_range) & (np.abs(bearing) < self.onboard_half_angle)
+        rho, bearing = rho[seen], bearing[seen]
+        targets = np.stack((-rho*np.sin(bearing), rho*np.cos(bearing)), axis=1)
+        targets += self.rng.normal(0, self.onboard_noise, targets.shape)
+        return list(map(tuple, targets.tolist()))
@@ -1 +1,3 @@
 from .trackers import *
+from .planners import RoutePlanner
+from .service import TrackingService
@@ -0,0 +1,115 @@
+"""
+Agent pose estimation for tennis ball collector.
+
+Fuses the controller's dead-reckoned moves with the offboard camera's
+ArUco fixes in an extended Kalman filter over (x, y, phi).
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import bisect
+import time
+
+import numpy as np
+
+def wrap_angle(phi):
+    return (phi + np.pi) % (2*np.pi) - np.pi
+
+class PoseEstimator(object):
+    """EKF over the agent pose with timestamped, possibly late, inputs.
+
+    predict() takes the (rho, phi) moves the controller reports through
+    'update_agent_rel': turn by phi, then drive rho. Their noise grows with
+    the size of the move. correct() takes an absolute (x, y, phi) fix.
+
+    Every input carries the time it describes. Fixes reach the estimator
+    after the camera has processed the frame, so they are usually older
+    than the newest move. Inputs are kept for history seconds; a late one
+    is slotted in at its time and the inputs after it are replayed, so the
+    result is the same as if everything had arrived in order. Inputs older
+    than that are ignored.
+    """
+
+    def __init__(self, pose=(0, 0, 0), rho_noise=0.1, phi_noise=0.1,
+                 drift_noise=0.02, position_noise=0.15, heading_noise=0.05,
+                 history=2.0):
+        self.rho_noise = rho_noise           # fraction of each move
+        self.phi_noise = phi_noise           # fraction of each turn
+        self.drift_noise = drift_noise       # rad of heading drift per ft
+        self.fix_noise = np.diag([position_noise**2, position_noise**2,
+                                  heading_noise**2])
+        self.history = history
+        self.state = np.array(pose, dtype=np.float64)
+        self.covariance = np.diag([1.0, 1.0, np.pi**2])
+        self.time = None
+        self.events = []   # (timestamp, kind, data) in time order
+        self.snapshots = [] # (state, covariance) before each event
+        self.replayed = 0
+
+    def _predict(self, rho, phi):
+        x, y, heading = self.state
+        heading = heading + phi
+        cos, sin = np.cos(heading), np.sin(heading)
+        self.state = np.array([x + rho*cos, y + rho*sin, wrap_angle(heading)])
+        jacobian = np.array([[1, 0, -rho*sin],
+                             [0, 1, rho*cos],
+                             [0, 0, 1]])
+        # noise on the move in (rho, phi), mapped into the pose
+        control = np.array([[cos, -rho*sin],
+                            [sin, rho*cos],
+                            [0, 1]])
+        noise = np.diag([(self.rho_noise*rho)**2,
+                         (self.phi_noise*phi)**2 + (self.drift_noise*abs(rho))**2])
+        self.covariance = jacobian.dot(self.covariance).dot(jacobian.T) + \
+            control.dot(noise).dot(control.T)
+
+    def _correct(self, x, y, phi):
+        residual = np.array([x, y, phi]) - self.state
+        residual[2] = wrap_angle(residual[2])
+        innovation = self.covariance + self.fix_noise
+        gain = self.covariance.dot(np.linalg.inv(innovation))
+        self.state = self.state + gain.dot(residual)
+        self.state[2] = wrap_angle(self.state[2])
+        self.covariance = (np.eye(3) - gain).dot(self.covariance)
+
+    def _apply(self, kind, data):
+        if kind == "move":
+            self._predict(*data)
+        else:
+            self._correct(*data)
+
+    def _add(self, timestamp, kind, data):
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.time is not None and timestamp < self.time - self.history:
+            return False
+        position = bisect.bisect_right([event[0] for event in self.events], timestamp)
+        if position < len(self.events):
+            # late input: rewind to its time and replay what came after
+            self.state, self.covariance = self.snapshots[position]
+            self.replayed += len(self.events) - position
+        self.events.insert(position, (timestamp, kind, data))
+        self.snapshots.insert(position, (self.state.copy(), self.covariance.copy()))
+        self._apply(kind, data)
+        for i in range(position + 1, len(self.events)):
+            self.snapshots[i] = (self.state.copy(), self.covariance.copy())
+            self._apply(*self.events[i][1:])
+        self.time = self.events[-1][0]
+        expired = bisect.bisect_left([event[0] for event in self.events],
+                                     self.time - self.history)
+        del self.events[:expired], self.snapshots[:expired]
+        return True
+
+    def predict(self, rho, phi, timestamp=None):
+        return self._add(timestamp, "move", (rho, phi))
+
+    def correct(self, x, y, phi, timestamp=None):
+        """Returns False when the fix is older than the history kept."""
+        return self._add(timestamp, "fix", (x, y, phi))
+
+    def pose(self):
+        return tuple(float(value) for value in self.state)
+
+    def uncertainty(self):
+        """Returns the standard deviations of x, y and phi."""
+        return tuple(np.sqrt(np.diag(self.covariance)))
@@ -0,0 +1,166 @@
+"""
+Route planning for tennis ball collector.
+
+Orders the absolute target set into a collection route instead of always
+heading for the nearest ball. A route is scored by its length plus
+turn_weight feet for every radian the robot has to turn along it, starting
+from the robot's position and heading.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import numpy as np
+
+def turn_angles(incoming, outgoing):
+    """Unsigned angles between direction vectors, zero for degenerate ones."""
+    cross = incoming[..., 0]*outgoing[..., 1] - incoming[..., 1]*outgoing[..., 0]
+    dot = np.sum(incoming*outgoing, axis=-1)
+    return np.nan_to_num(np.abs(np.arctan2(cross, dot)))
+
+def _lengths(vectors):
+    return np.nan_to_num(np.sqrt(np.sum(vectors**2, axis=-1)))
+
+class RoutePlanner(object):
+    """Nearest-neighbour route improved with 2-opt, updated incrementally.
+
+    update() is meant to be called with every new target set. Targets within
+    match_distance of a planned one are treated as the same ball and keep
+    their place in the route, vanished ones are dropped and new ones are
+    inserted where they add the least cost. 2-opt is then only run around
+    the places the route changed. When more than replan_fraction of the
+    targets changed, the route is planned from scratch.
+    """
+
+    def __init__(self, turn_weight=0.5, match_distance=0.5, window=8,
+                 replan_fraction=0.5, max_passes=50):
+        self.turn_weight = turn_weight
+        self.match_distance = match_distance
+        self.window = window
+        self.replan_fraction = replan_fraction
+        self.max_passes = max_passes
+        self.route = np.empty((0, 2))
+
+    def _points(self, start, heading, route):
+        # the heading is stored as a phantom point behind the start so the
+        # first turn is scored like every other, two NaN rows close the route
+        start = np.asarray(start, dtype=np.float64)
+        behind = start - (np.cos(heading), np.sin(heading))
+        pad = np.full((2, 2), np.nan)
+        return np.vstack((behind, start, route, pad))
+
+    def cost(self, start, heading, route=None):
+        """Returns (length, turning) for a route, the current one by default."""
+        route = self.route if route is None else route
+        points = self._points(start, heading, route)[:len(route) + 2]
+        legs = np.diff(points, axis=0)
+        return _lengths(legs[1:]).sum(), turn_angles(legs[:-1], legs[1:]).sum()
+
+    def nearest_neighbour(self, start, heading, targets):
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        remaining = np.ones(len(targets), dtype=bool)
+        order = []
+        position = np.asarray(start, dtype=np.float64)
+        direction = np.array([np.cos(heading), np.sin(heading)])
+        for _ in range(len(targets)):
+            candidates = np.flatnonzero(remaining)
+            legs = targets[candidates] - position
+            cost = _lengths(legs) + self.turn_weight*turn_angles(direction, legs)
+            best = candidates[np.argmin(cost)]
+            remaining[best] = False
+            order.append(best)
+            direction = targets[best] - position
+            position = targets[best]
+        return targets[order]
+
+    def _two_opt(self, start, heading, route, positions=None):
+        """Reverses route segments while that lowers the cost. positions
+        limits the segment starts tried to the given route indices."""
+        n = len(route)
+        if n < 2:
+            return route
+        points = self._points(start, heading, route)
+        # route index k is points index k + 2
+        starts = np.arange(n - 1) if positions is None else \
+            np.unique(np.clip(positions, 0, n - 2))
+        w = self.turn_weight
+        for _ in range(self.max_passes):
+            improved = False
+            for i in starts:
+                i += 2
+                j = np.arange(i + 1, n + 2)
+                a, b, c, d = points[i - 2], points[i - 1], points[i], points[i + 1]
+                pj, pj_prev, pj_next, pj_next2 = points[j], points[j - 1], points[j + 1], \
+                    points[np.minimum(j + 2, n + 3)]
+                before = (_lengths(c - b) + _lengths(pj_next - pj)
+                          + w*(turn_angles(b - a, c - b)
+                               + turn_angles(c - b, d - c)
+                               + turn_angles(pj - pj_prev, pj_next - pj)
+                               + turn_angles(pj_next - pj, pj_next2 - pj_next)))
+                after = (_lengths(pj - b) + _lengths(pj_next - c)
+                         + w*(turn_angles(b - a, pj - b)
+                              + turn_angles(pj - b, pj_prev - pj)
+                              + turn_angles(c - d, pj_next - c)
+                              + turn_angles(pj_next - c, pj_next2 - pj_next)))
+                gain = before - after
+                best = np.argmax(gain)
+                if gain[best] > 1e-9:
+                    points[i:j[best] + 1] = points[i:j[best] + 1][::-1].copy()
+                    improved = True
+            if not improved:
+                break
+        return points[2:n + 2]
+
+    def plan(self, start, heading, targets):
+        """Plans a route for targets from scratch."""
+        route = self.nearest_neighbour(start, heading, targets)
+        self.route = self._two_opt(start, heading, route)
+        return self.route
+
+    def _insert(self, start, heading, route, target):
+        points = self._points(start, heading, route)[:len(route) + 3]
+        # insertion between points k and k + 1 for k = 1 (the start) onward
+        prev, here, after = points[:-2], points[1:-1], points[2:]
+        after_next = np.vstack((points[3:], np.full((1, 2), np.nan)))
+        w = self.turn_weight
+        before = (_lengths(after - here)
+                  + w*(turn_angles(here - prev, after - here)
+                       + turn_angles(after - here, after_next - after)))
+        inserted = (_lengths(target - here) + _lengths(after - target)
+                    + w*(turn_angles(here - prev, target - here)
+                         + turn_angles(target - here, after - target)
+                         + turn_angles(after - target, after_next - after)))
+        k = np.argmin(inserted - before)
+        return np.insert(route, k, target, axis=0), k
+
+    def update(self, start, heading, targets):
+        """Brings the route in line with a new target set and returns it."""
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        if not len(self.route) or not len(targets):
+            return self.plan(start, heading, targets)
+        distance = _lengths(self.route[:, None, :] - targets[None, :, :])
+        nearest = np.argmin(distance, axis=1)
+        kept = distance[np.arange(len(self.route)), nearest] < self.match_distance
+        # two planned targets may claim the same detection, keep the first
+        _, first = np.unique(nearest[kept], return_index=True)
+        keep = np.flatnonzero(kept)[np.sort(first)]
+        new = np.ones(len(targets), dtype=bool)
+        new[nearest[keep]] = False
+        changed = len(self.route) - len(keep) + np.count_nonzero(new)
+        if changed > self.replan_fraction*len(targets):
+            return self.plan(start, heading, targets)
+        # removed targets leave a gap where their neighbours now meet
+        removed = np.flatnonzero(np.diff(np.concatenate(([-1], keep))) > 1)
+        positions = list(removed)
+        if keep[-1] < len(self.route) - 1:
+            positions.append(len(keep))
+        route = targets[nearest[keep]]
+        for target in targets[new]:
+            route, k = self._insert(start, heading, route, target)
+            positions = [p + (p >= k) for p in positions] + [k]
+        if positions:
+            window = np.arange(-self.window, self.window + 1)
+            positions = (np.array(positions)[:, None] + window).ravel()
+            route = self._two_opt(start, heading, route, positions)
+        self.route = route
+        return self.route
@@ -0,0 +1,104 @@
+"""
+Message handling for the tennis ball collector tracking server.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from ..common.instruments import INSTRUMENTS
+from .estimators import PoseEstimator
+from .planners import RoutePlanner
+from .trackers import MemorylessTracker, PersistentTracker
+
+class TrackingService(object):
+    """Routes tracking server messages to the onboard and offboard trackers.
+
+    Queries for 'get_target_rel' prefer the onboard camera. When it sees
+    nothing, every other miss falls back to the offboard camera. With plan
+    set, offboard targets are visited in RoutePlanner order instead of
+    nearest first.
+
+    With persistent set, both cameras feed a single PersistentTracker and
+    queries are answered from its fused map.
+
+    With estimate_pose set, 'agent_abs' fixes and the controller's
+    'agent_rel'/'update_agent_rel' moves go through a PoseEstimator and the
+    trackers are given its estimate. Messages are placed in time by their
+    send timestamps, less fix_latency for fixes, which were taken that long
+    before they were sent. The timestamps come from each sender's clock, so
+    the machines involved need synchronised clocks.
+    """
+
+    def __init__(self, plan=False, turn_weight=0.5, persistent=False,
+                 estimate_pose=False, fix_latency=0.0):
+        planner = RoutePlanner(turn_weight=turn_weight) if plan else None
+        if persistent:
+            self.onboard_tracker = self.offboard_tracker = \
+                PersistentTracker(planner=planner)
+        else:
+            self.onboard_tracker = MemorylessTracker(in_view=False)
+            self.offboard_tracker = MemorylessTracker(in_view=True, planner=planner)
+        self.persistent = persistent
+        self.estimator = PoseEstimator() if estimate_pose else None
+        self.fix_latency = fix_latency
+        self.misses = 0
+
+    def get_target_rel(self):
+        if self.persistent:
+            return self.offboard_tracker.get_target_rel()
+        target = self.onboard_tracker.get_target_rel()
+        if not target:
+            if not self.misses % 2:
+                target = None
+            else:
+                target = self.offboard_tracker.get_target_rel()
+            self.misses += 1
+        return target
+
+    def get_agent_abs(self):
+        if self.estimator is not None:
+            return self.estimator.pose()
+        tracker = self.offboard_tracker
+        return tracker.curr_x, tracker.curr_y, tracker.curr_phi
+
+    def _update_pose(self, message_type, message, timestamp):
+        if message_type == "agent_abs":
+            if None in message:
+                # the agent's marker was not found in this frame
+                return
+            timestamp = None if timestamp is None else timestamp - self.fix_latency
+            self.estimator.correct(*message, timestamp=timestamp)
+        else:
+            self.estimator.predict(*message, timestamp=timestamp)
+        self.offboard_tracker.update_agent_abs(*self.estimator.pose())
+        if not self.persistent:
+            self.onboard_tracker.update_agent_abs(*self.estimator.pose())
+
+    def handle(self, message_type, message, timestamp=None):
+        """Applies one message and returns the reply for it. timestamp is
+        the time the message was sent, used to order pose updates."""
+        with INSTRUMENTS.time("tracking." + message_type):
+            return self._dispatch(message_type, message, timestamp)
+
+    def _dispatch(self, message_type, message, timestamp):
+        if message_type == "get_target_rel":
+            return self.get_target_rel()
+        if message_type == "get_agent_abs":
+            return self.get_agent_abs()
+        if message_type == "offboard_targets":
+            self.offboard_tracker.update_target_abs(message)
+        elif message_type == "onboard_targets":
+            self.onboard_tracker.update_target_rel(message)
+        elif message_type in ("agent_rel", "update_agent_rel", "agent_abs") and \
+                self.estimator is not None:
+            self._update_pose(message_type, message, timestamp)
+        elif message_type in ("agent_rel", "agent_abs") and self.persistent:
+            update = getattr(self.offboard_tracker, "update_" + message_type)
+            update(*message)
+        elif message_type == "agent_rel":
+            self.onboard_tracker.update_agent_rel(*message)
+            self.offboard_tracker.update_agent_rel(*message)
+        elif message_type == "agent_abs":
+            self.onboard_tracker.update_agent_abs(*message)
+            self.offboard_tracker.update_agent_abs(*message)
+        return True
@@ -0,0 +1,144 @@
+"""
+Spatial index for tennis ball collector targets.
+
+A uniform grid of square cells over the court. Points are kept by id, so a
+collected ball can be removed and a re-estimated one moved without
+rebuilding anything. Queries only visit the cells that can hold an answer.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import heapq
+import math
+
+class GridIndex(object):
+    """Uniform grid of 2-D points keyed by id.
+
+    cell_size should be on the order of the typical spacing between
+    targets: much smaller and queries walk many empty cells, much larger and
+    they test many points.
+    """
+
+    def __init__(self, cell_size=2.0):
+        self.cell_size = float(cell_size)
+        self.points = {} # id -> (x, y)
+        self.cells = {}  # (column, row) -> {id: (x, y)}
+        self.bounds = None # occupied cells are never outside these
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, point_id):
+        return point_id in self.points
+
+    def _cell(self, x, y):
+        return (math.floor(x/self.cell_size), math.floor(y/self.cell_size))
+
+    def insert(self, point_id, x, y):
+        if point_id in self.points:
+            self.remove(point_id)
+        x, y = float(x), float(y)
+        cell = self._cell(x, y)
+        self.points[point_id] = (x, y)
+        self.cells.setdefault(cell, {})[point_id] = (x, y)
+        if self.bounds is None:
+            self.bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self.bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), min(bounds[1], cell[1])
+            bounds[2], bounds[3] = max(bounds[2], cell[0]), max(bounds[3], cell[1])
+
+    def remove(self, point_id):
+        x, y = self.points.pop(point_id)
+        cell = self._cell(x, y)
+        members = self.cells[cell]
+        del members[point_id]
+        if not members:
+            del self.cells[cell]
+
+    def move(self, point_id, x, y):
+        old = self.points[point_id]
+        x, y = float(x), float(y)
+        if self._cell(*old) == self._cell(x, y):
+            self.points[point_id] = self.cells[self._cell(x, y)][point_id] = (x, y)
+        else:
+            self.insert(point_id, x, y)
+
+    def clear(self):
+        self.points.clear()
+        self.cells.clear()
+        self.bounds = None
+
+    def _ring(self, column, row, radius):
+        # cells at Chebyshev distance radius from (column, row)
+        if not radius:
+            yield column, row
+            return
+        for i in range(-radius, radius + 1):
+            yield column + i, row - radius
+            yield column + i, row + radius
+        for j in range(-radius + 1, radius):
+            yield column - radius, row + j
+            yield column + radius, row + j
+
+    def _max_ring(self, column, row):
+        if self.bounds is None:
+            return -1
+        min_column, min_row, max_column, max_row = self.bounds
+        return max(column - min_column, max_column - column,
+                   row - min_row, max_row - row)
+
+    def nearest(self, x, y, k=1, exclude=None, skip=()):
+        """Returns up to k (distance, id) pairs in order of distance.
+
+        Points within the square of half-width exclude around (x, y) and ids
+        in skip are passed over.
+        """
+        column, row = self._cell(x, y)
+        best = [] # max-heap of (-distance, id)
+        for radius in range(self._max_ring(column, row) + 1):
+            # every point outside this ring is at least this far away
+            if len(best) == k and -best[0][0] <= (radius - 1)*self.cell_size:
+                break
+            for cell in self._ring(column, row, radius):
+                members = self.cells.get(cell)
+                if not members:
+                    continue
+                for point_id, (p_x, p_y) in members.items():
+                    dx, dy = p_x - x, p_y - y
+                    if exclude is not None and abs(dx) < exclude and abs(dy) < exclude:
+                        continue
+                    if point_id in skip:
+                        continue
+                    distance = math.hypot(dx, dy)
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, point_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, point_id))
+        return sorted((-distance, point_id) for distance, point_id in best)
+
+    def radius(self, x, y, radius):
+        """Returns the ids within radius of (x, y)."""
+        column, row = self._cell(x, y)
+        reach = int(math.ceil(radius/self.cell_size))
+        found = []
+        for i in range(column - reach, column + reach + 1):
+            for j in range(row - reach, row + reach + 1):
+                for point_id, (p_x, p_y) in self.cells.get((i, j), {}).items():
+                    if (p_x - x)**2 + (p_y - y)**2 <= radius**2:
+                        found.append(point_id)
+        return found
+
+    def box(self, x, y, half_width, half_height=None):
+        """Returns the ids strictly inside the box centred on (x, y)."""
+        half_height = half_width if half_height is None else half_height
+        min_column, min_row = self._cell(x - half_width, y - half_height)
+        max_column, max_row = self._cell(x + half_width, y + half_height)
+        found = []
+        for i in range(min_column, max_column + 1):
+            for j in range(min_row, max_row + 1):
+                for point_id, (p_x, p_y) in self.cells.get((i, j), {}).items():
+                    if abs(p_x - x) < half_width and abs(p_y - y) < half_height:
+                        found.append(point_id)
+        return found
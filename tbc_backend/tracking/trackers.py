@@ -5,8 +5,19 @@ Target tracking for tennis ball collector.
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
+import logging
+
 import numpy as np
 
+from .spatial import GridIndex
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+logger = logging.getLogger(__name__)
+
 def cart2pol(x, y):
     rho = np.sqrt(x**2 + y**2)
     phi = np.arctan2(y, x) - np.pi/2
@@ -17,12 +28,23 @@ def pol2cart(rho, phi):
     y = rho * np.sin(phi)
     return(x, y)
 
+def rel2abs(targets, x, y, phi):
+    """Onboard camera targets to absolute coordinates for an agent pose."""
+    rel_targets_x = np.array([t_x for t_x, _ in targets])
+    rel_targets_y = np.array([t_y for _, t_y in targets])
+    targets_rho, targets_phi = cart2pol(rel_targets_x, rel_targets_y)
+    abs_targets_x = targets_rho*np.cos((targets_phi + phi)) + x
+    abs_targets_y = targets_rho*np.sin(targets_phi + phi) + y
+    return np.vstack((abs_targets_x, abs_targets_y)).T
+
 class MemorylessTracker(object):
 
-    def __init__(self, in_view=True, buffer_distance=0):
+    def __init__(self, in_view=True, buffer_distance=0, planner=None):
         self.targets = np.empty((2, 0), dtype=np.float32)
         self.buffer_distance = buffer_distance
         self.in_view = in_view
+        self.planner = planner
+        self.planned = False # whether self.targets is in collection order
         self.curr_x = self.curr_y = self.curr_phi = 0
 
     def get_target_rel(self):
@@ -30,18 +52,18 @@ class MemorylessTracker(object):
             return None
         self.agent = np.array([self.curr_x, self.curr_y])
         delta = self.targets - self.agent
-        print(delta)
         if self.in_view:
             exclude = np.logical_and(np.abs(delta[:, 0]) < 1,
                                      np.abs(delta[:, 1]) < 1)
-            print(exclude)
+            logger.debug("excluded %d targets in view", np.count_nonzero(exclude))
             delta = delta[~exclude]
         if not delta.size:
             return None
-        print(delta)
+        logger.debug("target deltas %s", delta)
         dist = np.sqrt(np.sum(np.power(delta, 2), axis=1))
         angle = -(self.curr_phi - np.arctan2(delta[:, 1], delta[:, 0]))
-        target_idx = np.argmin(dist)
+        # planned targets are already in collection order
+        target_idx = 0 if self.planned else np.argmin(dist)
         rho = dist[target_idx]
         phi = angle[target_idx]
         if phi > np.pi:
@@ -54,7 +76,13 @@ class MemorylessTracker(object):
         self.curr_y += disp_rho*np.sin(self.curr_phi)
 
     def update_target_abs(self, targets):
-        if targets:
+        # without a pose fix there is nowhere to plan the route from
+        self.planned = (len(targets) > 0 and self.planner is not None and
+                        self.curr_x is not None)
+        if self.planned:
+            self.targets = self.planner.update((self.curr_x, self.curr_y),
+                                               self.curr_phi, targets)
+        elif len(targets):
             self.targets = np.array(targets)
         else:
             self.targets = np.empty((2, 0), dtype=np.float32)
@@ -64,16 +92,235 @@ class MemorylessTracker(object):
 
     def update_target_rel(self, targets):
         if self.curr_phi is None:
-            pass
-        rel_targets_x = np.array([x for x, _ in targets])
-        rel_targets_y = np.array([y for _, y in targets])
-        targets_rho, targets_phi = cart2pol(rel_targets_x, rel_targets_y)
-        abs_targets_x = targets_rho*np.cos((targets_phi + self.curr_phi))
-        abs_targets_x += self.curr_x
-        abs_targets_y = targets_rho*np.sin(targets_phi + self.curr_phi)
-        abs_targets_y += self.curr_y
-        self.targets = np.vstack((abs_targets_x, abs_targets_y)).T
-        
+            return
+        self.planned = False
+        self.targets = rel2abs(targets, self.curr_x, self.curr_y, self.curr_phi)
+
+    def update_agent_rel(self, rho, phi):
+        self.curr_phi += phi
+        self.curr_x += rho*np.cos(self.curr_phi)
+        self.curr_y += rho*np.sin(self.curr_phi)
+
+def associate(cost, gate):
+    """Matches rows to columns of a cost matrix, ignoring pairs above gate.
+
+    Uses the Hungarian method when scipy is available and a greedy match in
+    order of increasing cost otherwise. Returns (rows, cols) index arrays.
+    """
+    if not cost.size:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    if linear_sum_assignment is not None:
+        # gated pairs get a cost no real assignment can beat
+        rows, cols = linear_sum_assignment(np.where(cost > gate, 1e6*gate, cost))
+        valid = cost[rows, cols] <= gate
+        return rows[valid], cols[valid]
+    rows, cols = np.nonzero(cost <= gate)
+    order = np.argsort(cost[rows, cols], kind="stable")
+    rows, cols = rows[order], cols[order]
+    row_used = np.zeros(cost.shape[0], dtype=bool)
+    col_used = np.zeros(cost.shape[1], dtype=bool)
+    matched = []
+    for k, (row, col) in enumerate(zip(rows, cols)):
+        if not row_used[row] and not col_used[col]:
+            row_used[row] = col_used[col] = True
+            matched.append(k)
+    return rows[matched], cols[matched]
+
+class PersistentTracker(object):
+    """Keeps a world map of targets with identities across frames.
+
+    Every target is a track with a position Kalman filter (balls are static,
+    so only process noise grows the covariance between updates). Onboard and
+    offboard detections are both converted to absolute coordinates and
+    associated with the tracks on a squared Mahalanobis distance matrix
+    gated at gate. Unmatched detections start new tracks, which are reported
+    once they have been seen min_hits times. A track is dropped after
+    max_misses updates in which it should have been seen and was not; for the
+    onboard camera that only counts tracks inside its field of view. Tracks
+    that end up closer than merge_distance are taken to be the same ball and
+    only the one with the most hits is kept.
+
+    Track positions are also kept in a GridIndex, which answers the target
+    queries and the merge check without visiting every track.
+
+    Has the same interface as MemorylessTracker.
+    """
+
+    def __init__(self, offboard_noise=0.25, onboard_noise=0.1, process_noise=0.001,
+                 gate=9.21, min_hits=2, max_misses=5, merge_distance=0.5,
+                 onboard_range=6.0, onboard_half_angle=0.5, exclude_distance=1,
+                 cell_size=2.0, planner=None):
+        self.offboard_noise = offboard_noise
+        self.onboard_noise = onboard_noise
+        self.process_noise = process_noise
+        self.gate = gate
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.merge_distance = merge_distance
+        self.onboard_range = onboard_range
+        self.onboard_half_angle = onboard_half_angle
+        self.exclude_distance = exclude_distance
+        self.planner = planner
+        self.means = np.empty((0, 2))
+        self.covariances = np.empty((0, 2, 2))
+        self.ids = np.empty(0, dtype=int)
+        self.hits = np.empty(0, dtype=int)
+        self.misses = np.empty(0, dtype=int)
+        self.onboard = np.empty(0, dtype=bool) # last seen by the onboard camera
+        self.next_id = 0
+        self.index = GridIndex(cell_size)
+        self.tentative = set() # ids with fewer than min_hits hits
+        self.curr_x = self.curr_y = self.curr_phi = 0
+
+    @property
+    def targets(self):
+        confirmed = self.hits >= self.min_hits
+        return self.means[confirmed]
+
+    def _row(self, track_id):
+        # ids are handed out in increasing order and rows never reordered
+        return np.searchsorted(self.ids, track_id)
+
+    def _keep(self, keep):
+        for track_id in self.ids[~keep]:
+            self.index.remove(track_id)
+            self.tentative.discard(track_id)
+        self.means, self.covariances = self.means[keep], self.covariances[keep]
+        self.ids, self.hits = self.ids[keep], self.hits[keep]
+        self.misses, self.onboard = self.misses[keep], self.onboard[keep]
+
+    def _merge(self, changed):
+        # only tracks that moved or appeared can have come too close
+        keep = np.ones(len(self.means), dtype=bool)
+        for i in changed:
+            if not keep[i]:
+                continue
+            for track_id in self.index.radius(*self.means[i], self.merge_distance):
+                j = self._row(track_id)
+                if j != i and keep[j]:
+                    keep[j if self.hits[i] >= self.hits[j] else i] = False
+                    if not keep[i]:
+                        break
+        return keep
+
+    def _in_onboard_view(self):
+        delta = self.means - (self.curr_x, self.curr_y)
+        rho = np.sqrt(np.sum(delta**2, axis=1))
+        bearing = np.arctan2(delta[:, 1], delta[:, 0]) - self.curr_phi
+        bearing = (bearing + np.pi) % (2*np.pi) - np.pi
+        return (rho < self.onboard_range) & (np.abs(bearing) < self.onboard_half_angle)
+
+    def update(self, detections, noise, onboard):
+        """Associates absolute detections with the tracks and updates them."""
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 2)
+        self.covariances += self.process_noise*np.eye(2)
+        innovation_cov = self.covariances + noise**2*np.eye(2)
+        inverse = np.linalg.inv(innovation_cov)
+        # squared Mahalanobis distances, spelled out on 2-D arrays since the
+        # (tracks, detections, 2) version is several times slower
+        dx = detections[None, :, 0] - self.means[:, None, 0]
+        dy = detections[None, :, 1] - self.means[:, None, 1]
+        cost = (inverse[:, None, 0, 0]*dx*dx + 2*inverse[:, None, 0, 1]*dx*dy
+                + inverse[:, None, 1, 1]*dy*dy)
+        rows, cols = associate(cost, self.gate)
+
+        # Kalman update of the matched tracks
+        gain = np.einsum("tij,tjk->tik", self.covariances[rows], inverse[rows])
+        residuals = detections[cols] - self.means[rows]
+        self.means[rows] += np.einsum("tij,tj->ti", gain, residuals)
+        self.covariances[rows] -= np.einsum("tij,tjk->tik", gain, self.covariances[rows])
+        self.hits[rows] += 1
+        self.misses[rows] = 0
+        for row in rows:
+            self.index.move(self.ids[row], *self.means[row])
+        self.tentative.difference_update(self.ids[rows][self.hits[rows] >= self.min_hits])
+
+        expected = self._in_onboard_view() if onboard else np.ones(len(self.means), dtype=bool)
+        missed = expected.copy()
+        missed[rows] = False
+        self.misses[missed] += 1
+        if onboard:
+            self.onboard[expected] = False
+            self.onboard[rows] = True
+
+        new = np.ones(len(detections), dtype=bool)
+        new[cols] = False
+        n_new = np.count_nonzero(new)
+        self.means = np.vstack((self.means, detections[new]))
+        self.covariances = np.concatenate((self.covariances,
+                                           np.tile(noise**2*np.eye(2), (n_new, 1, 1))))
+        new_ids = self.next_id + np.arange(n_new)
+        self.ids = np.concatenate((self.ids, new_ids))
+        self.next_id += n_new
+        for track_id, (x, y) in zip(new_ids, detections[new]):
+            self.index.insert(track_id, x, y)
+        if self.min_hits > 1:
+            self.tentative.update(new_ids)
+        self.hits = np.concatenate((self.hits, np.ones(n_new, dtype=int)))
+        self.misses = np.concatenate((self.misses, np.zeros(n_new, dtype=int)))
+        self.onboard = np.concatenate((self.onboard, np.full(n_new, onboard)))
+        changed = np.concatenate((rows, len(self.means) - n_new + np.arange(n_new)))
+        keep = self.misses <= self.max_misses
+        self._keep(keep)
+        # rows of the changed tracks after dropping the missed ones
+        changed = (np.cumsum(keep) - 1)[changed[keep[changed]]]
+        self._keep(self._merge(changed))
+        if self.planner is not None and len(self.targets) and self.curr_x is not None:
+            self.planner.update((self.curr_x, self.curr_y), self.curr_phi, self.targets)
+
+    def _valid(self, track_id):
+        # the offboard camera also sees the robot itself as a target, so
+        # only the onboard camera is trusted right next to the robot
+        x, y = self.index.points[track_id]
+        inside = abs(x - self.curr_x) < self.exclude_distance and \
+            abs(y - self.curr_y) < self.exclude_distance
+        return not inside or self.onboard[self._row(track_id)]
+
+    def get_target_rel(self):
+        if self.curr_x is None:
+            return None
+        agent = (self.curr_x, self.curr_y)
+        target_id = None
+        if self.planner is not None:
+            # first planned target that is still a valid choice
+            for point in self.planner.route:
+                nearest = self.index.nearest(*point, skip=self.tentative)
+                if nearest and self._valid(nearest[0][1]):
+                    target_id = nearest[0][1]
+                    break
+        if target_id is None:
+            candidates = self.index.nearest(*agent, exclude=self.exclude_distance,
+                                            skip=self.tentative)
+            candidates += [(np.hypot(*np.subtract(self.index.points[track_id], agent)), track_id)
+                           for track_id in self.index.box(*agent, self.exclude_distance)
+                           if track_id not in self.tentative and self._valid(track_id)]
+            if not candidates:
+                return None
+            target_id = min(candidates)[1]
+        delta = np.subtract(self.index.points[target_id], agent)
+        rho = np.hypot(*delta)
+        phi = np.arctan2(delta[1], delta[0]) - self.curr_phi
+        phi = (phi + np.pi) % (2*np.pi) - np.pi
+        # targets in the onboard view are approached in short moves
+        return rho, phi, not self.onboard[self._row(target_id)]
+
+    def update_position(self, disp_rho, disp_phi):
+        self.update_agent_rel(disp_rho, disp_phi)
+
+    def update_target_abs(self, targets):
+        self.update(targets, self.offboard_noise, False)
+
+    def update_target_rel(self, targets):
+        # onboard detections cannot be placed without a pose fix
+        if self.curr_phi is None:
+            return
+        if len(targets):
+            targets = rel2abs(targets, self.curr_x, self.curr_y, self.curr_phi)
+        self.update(targets, self.onboard_noise, True)
+
+    def update_agent_abs(self, x, y, phi):
+        self.curr_x, self.curr_y, self.curr_phi = x, y, phi
+
     def update_agent_rel(self, rho, phi):
         self.curr_phi += phi
         self.curr_x += rho*np.cos(self.curr_phi)
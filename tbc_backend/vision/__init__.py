@@ -1,8 +1,43 @@
+"""
+Vision system for tennis ball collector.
+
+Names are imported from their modules on first use, so importing one
+locator does not load picamera, the debug stream or the camera rig.
+Camera is CalibratedPicamera on the Raspberry Pi and CalibratedCamera
+everywhere else.
+"""
+
+import importlib
 import platform
 
-from .localization import TargetLocator, AgentLocator, watch_onboard, watch_offboard
-if platform.uname()[4][:3] == 'arm':
-    from .cameras import CalibratedPicamera as Camera
-else:
-    from .cameras import CalibratedCamera as Camera
+_EXPORTS = {
+    "TargetLocator": "localization", "AgentLocator": "localization",
+    "TargetDetector": "localization", "AgentDetector": "localization",
+    "LensProjector": "localization", "ParallelLocator": "localization",
+    "make_target_locator": "localization", "make_agent_locator": "localization",
+    "watch_onboard": "localization", "watch_offboard": "localization",
+    "watch_offboard_parallel": "localization",
+    "DebugStream": "debug", "Overlay": "debug",
+    "CapturePipeline": "pipeline",
+    "CameraRig": "rig", "watch_rig": "rig",
+    "Camera": "cameras",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    module = importlib.import_module("." + _EXPORTS[name], __name__)
+    if name == "Camera":
+        if platform.uname()[4][:3] == 'arm':
+            value = module.CalibratedPicamera
+        else:
+            value = module.CalibratedCamera
+    else:
+        value = getattr(module, name)
+    globals()[name] = value
+    return value
 
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Cached runtime artifacts for tennis ball collector.
+
+Remap tables and fused projection matrices are derived from the .npz
+calibration and backprojection files. The first process to need them
+builds them and writes every array as its own .npy file under a cache
+directory next to the source files; every later process memory maps those
+files instead, so it neither unzips the .npz files nor reruns
+initUndistortRectifyMap, and processes on the same machine share the
+pages.
+
+Entries are named after a hash of the source files' bytes, the OpenCV
+version and CACHE_FORMAT, so a new calibration, OpenCV release or entry
+layout never reads a stale entry.
+An entry is written to a temporary directory and renamed into place, so a
+reader only ever sees complete entries. On a read-only install the arrays
+are built in memory every time.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the arrays stored for an entry change
+CACHE_FORMAT = 1
+
+def source_key(sources):
+    """Returns a short hash of the files in sources, the OpenCV version and
+    the cache format."""
+    digest = hashlib.sha1(("%s %d" % (cv2.__version__, CACHE_FORMAT)).encode())
+    for source in sources:
+        with open(source, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def entry_path(name, sources, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(sources[0])), "cache")
+    stem = os.path.splitext(os.path.basename(sources[0]))[0]
+    return os.path.join(cache_dir, "%s.%s.%s" % (stem, name, source_key(sources)))
+
+def read_entry(path):
+    """Returns the arrays of a cache entry, memory mapped read only."""
+    return {os.path.splitext(filename)[0]: np.load(os.path.join(path, filename),
+                                                   mmap_mode="r")
+            for filename in os.listdir(path) if filename.endswith(".npy")}
+
+def write_entry(path, arrays):
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=".staging-")
+    try:
+        for key, array in arrays.items():
+            # np.ascontiguousarray would turn 0-d arrays, such as the
+            # calibration's height and width, into shape (1,)
+            np.save(os.path.join(staging, key + ".npy"),
+                    np.require(array, requirements="C"))
+        os.rename(staging, path)
+    except OSError:
+        # another process finished the same entry first, or the disk is full
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+def cached_arrays(name, sources, build, cache_dir=None):
+    """Returns the dict of arrays build() derives from the files in sources.
+
+    The arrays are memory mapped from the cache entry for sources when
+    there is one, and built and cached otherwise. cache_dir defaults to a
+    'cache' directory beside the first source; cache_dir=False always
+    builds.
+    """
+    if cache_dir is False:
+        return build()
+    path = entry_path(name, sources, cache_dir)
+    if os.path.isdir(path):
+        try:
+            return read_entry(path)
+        except (OSError, ValueError):
+            logger.warning("Rebuilding unreadable cache entry %s", path)
+            shutil.rmtree(path, ignore_errors=True)
+    arrays = build()
+    try:
+        write_entry(path, arrays)
+    except OSError as e:
+        logger.info("Not caching %s: %s", path, e) # read-only install
+    return arrays
+
+def clear_cache(cache_dir):
+    """Removes every entry in cache_dir."""
+    shutil.rmtree(cache_dir, ignore_errors=True)
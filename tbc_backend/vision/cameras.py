@@ -16,27 +16,73 @@ try:
 except ImportError:
     pass
 
+from .artifacts import cached_arrays
+
 CURRDIR = os.path.dirname(__file__)
 LOG_CALIBRATION_FILE = os.path.join(CURRDIR, "runtime/logitech_480p_calibration.npz")
 PI_CALIBRATION_FILE = os.path.join(CURRDIR, "runtime/raspicam_v2_m4_calibration.npz")
 LOG_PROJECTION_FILE = os.path.join(CURRDIR, "runtime/logitech_480p_backprojection.npz")
 PI_PROJECTION_FILE = os.path.join(CURRDIR, "runtime/raspicam_v2_m4_backprojection.npz")
 
+def make_undistort_maps(calibration):
+    """Returns fixed-point (CV_16SC2) remap tables for a calibration."""
+    map_x, map_y = cv2.initUndistortRectifyMap(calibration["camera_matrix"],
+                                               calibration["dist_coeffs"],
+                                               None,
+                                               calibration["new_camera_matrix"],
+                                               (int(calibration["width"]),
+                                                int(calibration["height"])),
+                                               cv2.CV_32FC1)
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+def load_calibration(calibration_file, cache_dir=None):
+    """Returns the calibration arrays with their remap tables as map_1 and
+    map_2, memory mapped from the artifact cache when possible."""
+    def build():
+        calibration = dict(np.load(calibration_file))
+        calibration["map_1"], calibration["map_2"] = make_undistort_maps(calibration)
+        return calibration
+    return cached_arrays("maps", [calibration_file], build, cache_dir)
+
+def undistort_image(image, maps, dst=None):
+    """Remaps image with the (map_1, map_2) tables from load_calibration.
+    With maps=None the image is returned as is, or copied into dst."""
+    if maps is None:
+        if dst is None:
+            return image
+        np.copyto(dst, image)
+        return dst
+    return cv2.remap(image, maps[0], maps[1], cv2.INTER_LINEAR, dst=dst)
+
 class CalibratedCamera(object):
+    """USB camera with frame averaging and lens undistortion.
+
+    All frame buffers are allocated once, so the image returned by
+    capture_single is overwritten by the next call. With
+    undistort_frame=False frames are returned raw and callers are expected
+    to project the raw detected points with a LensProjector instead.
+    Every raw frame read is written to recorder, a FrameRecorder, if given.
+    """
 
-    def __init__(self, device, calibration_file=LOG_CALIBRATION_FILE, fps=60, n_frames=5):
+    def __init__(self, device, calibration_file=LOG_CALIBRATION_FILE, fps=60, n_frames=5,
+                 undistort_frame=True, cache_dir=None, recorder=None):
         self.device = device
         self.n_frames = n_frames
-        self.calibration = np.load(calibration_file)
-        self.height = self.calibration["height"]
-        self.width = self.calibration["width"]
-        self.map_x, self.map_y = cv2.initUndistortRectifyMap(
-                                                    self.calibration["camera_matrix"],
-                                                    self.calibration["dist_coeffs"],
-                                                    None,
-                                                    self.calibration["new_camera_matrix"],
-                                                    (self.width, self.height),
-                                                    5)
+        self.undistort_frame = undistort_frame
+        self.calibration_file = calibration_file
+        self.recorder = recorder
+        if recorder is not None:
+            recorder.describe(n_frames=n_frames, undistort_frame=undistort_frame,
+                              calibration_file=os.path.abspath(calibration_file))
+        self.calibration = load_calibration(calibration_file, cache_dir)
+        self.height = int(self.calibration["height"])
+        self.width = int(self.calibration["width"])
+        self.map_1, self.map_2 = self.calibration["map_1"], self.calibration["map_2"]
+        shape = (self.height, self.width, 3)
+        self.frame = np.empty(shape, dtype=np.uint8)
+        self.accumulator = np.empty(shape, dtype=np.float32)
+        self.average = np.empty(shape, dtype=np.uint8)
+        self.image = np.empty(shape, dtype=np.uint8)
         self.camera = cv2.VideoCapture(device)
         if not self.camera.isOpened():
             raise RuntimeError("Camera device %s not found." % device)
@@ -44,14 +90,30 @@ class CalibratedCamera(object):
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
         self.camera.set(cv2.CAP_PROP_FPS, fps)
 
+    def read_raw(self):
+        ret, frame = self.camera.read(self.frame)
+        if not ret:
+            raise RuntimeError("Camera device %s returned no frame." % self.device)
+        if self.recorder is not None:
+            self.recorder.write(frame)
+        return frame
+
+    def undistort(self, image, dst=None):
+        maps = (self.map_1, self.map_2) if self.undistort_frame else None
+        return undistort_image(image, maps, dst)
+
     def capture_single(self):
-        average = np.zeros((self.height, self.width, 3), dtype=np.float32)
-        for i in range(self.n_frames):
-            ret, frame = self.camera.read()
-            cv2.accumulate(frame, average)
-        average = (average/float(self.n_frames)).astype(np.uint8)
-        image = cv2.remap(average, self.map_x, self.map_y, cv2.INTER_LINEAR)
-        return image
+        if self.n_frames == 1:
+            average = self.read_raw()
+        else:
+            self.accumulator.fill(0)
+            for i in range(self.n_frames):
+                cv2.accumulate(self.read_raw(), self.accumulator)
+            average = cv2.convertScaleAbs(self.accumulator, self.average,
+                                          1.0/self.n_frames)
+        if not self.undistort_frame:
+            return average
+        return self.undistort(average, dst=self.image)
 
     def capture(self):
         while True:
@@ -64,42 +126,76 @@ class CalibratedCamera(object):
         self.camera.release()
 
 class CalibratedPicamera(object):
+    """Raspberry Pi camera with lens undistortion.
 
-    def __init__(self, device=None, calibration_file=PI_CALIBRATION_FILE, fps=20, n_frames=2):
+    Reuses one capture stream and one output buffer, so the image returned
+    by capture_single is overwritten by the next call. The sensor needs
+    warmup seconds for its gains and white balance to settle; the first
+    capture waits out whatever is left of them, so the caller can set up
+    its locators and sockets in the meantime. Every frame captured is
+    written to recorder, a FrameRecorder, if given.
+    """
+
+    def __init__(self, device=None, calibration_file=PI_CALIBRATION_FILE, fps=20, n_frames=2,
+                 undistort_frame=True, cache_dir=None, warmup=2.0, recorder=None):
         self.n_frames = n_frames
-        self.calibration = np.load(calibration_file)
-        self.height = self.calibration["height"]
-        self.width = self.calibration["width"]
-        self.map_x, self.map_y = cv2.initUndistortRectifyMap(
-                                                    self.calibration["camera_matrix"],
-                                                    self.calibration["dist_coeffs"],
-                                                    None,
-                                                    self.calibration["new_camera_matrix"],
-                                                    (self.width, self.height),
-                                                    5)
+        self.undistort_frame = undistort_frame
+        self.calibration_file = calibration_file
+        self.recorder = recorder
+        if recorder is not None:
+            # every capture is a single shot, whatever n_frames is
+            recorder.describe(n_frames=1, undistort_frame=undistort_frame,
+                              calibration_file=os.path.abspath(calibration_file))
+        self.calibration = load_calibration(calibration_file, cache_dir)
+        self.height = int(self.calibration["height"])
+        self.width = int(self.calibration["width"])
+        self.map_1, self.map_2 = self.calibration["map_1"], self.calibration["map_2"]
+        self.image = np.empty((self.height, self.width, 3), dtype=np.uint8)
         self.camera = picamera.PiCamera(sensor_mode=4, framerate=5)
         self.camera.resolution = (640, 480)
         self.camera.awb_mode = "auto"
         self.camera.exposure_mode = "auto"
-        time.sleep(2)
+        self.stream = picamera.array.PiRGBArray(self.camera, size=self.camera.resolution)
+        self.ready_at = time.monotonic() + warmup
+
+    def _wait_ready(self):
+        if self.ready_at is not None:
+            time.sleep(max(0.0, self.ready_at - time.monotonic()))
+            self.ready_at = None
+
+    def read_raw(self):
+        self._wait_ready()
+        self.stream.truncate(0)
+        self.camera.capture(self.stream, "bgr")
+        if self.recorder is not None:
+            self.recorder.write(self.stream.array)
+        return self.stream.array
+
+    def undistort(self, image, dst=None):
+        maps = (self.map_1, self.map_2) if self.undistort_frame else None
+        return undistort_image(image, maps, dst)
 
     def capture_single(self):
-        with picamera.array.PiRGBArray(self.camera, size=self.camera.resolution) as stream:
-            self.camera.capture(stream, "bgr")
-            image = stream.array
-            image = cv2.remap(image, self.map_x, self.map_y, cv2.INTER_LINEAR)
+        image = self.read_raw()
+        if not self.undistort_frame:
             return image
-    
+        return self.undistort(image, dst=self.image)
+
     def capture(self):
-        with picamera.array.PiRGBArray(self.camera, size=self.camera.resolution) as stream:
-            for frame in self.camera.capture_continuous(stream, format="bgr", use_video_port=True):
-                try:
-                    image = stream.array
-                    image = cv2.remap(image, self.map_x, self.map_y, cv2.INTER_LINEAR)
-                    yield image
-                    stream.truncate(0)
-                except (KeyboardInterrupt, SystemExit):
-                    return
+        self._wait_ready()
+        self.stream.truncate(0)
+        for frame in self.camera.capture_continuous(self.stream, format="bgr", use_video_port=True):
+            try:
+                image = self.stream.array
+                if self.recorder is not None:
+                    self.recorder.write(image)
+                if self.undistort_frame:
+                    image = self.undistort(image, dst=self.image)
+                yield image
+                self.stream.truncate(0)
+            except (KeyboardInterrupt, SystemExit):
+                return
 
     def __del__(self):
+        self.stream.close()
         self.camera.close()
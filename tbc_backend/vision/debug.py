@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Debug visualization stream for tennis ball collector cameras.
+
+The detection loop hands DebugStream each frame with an Overlay, the
+detected points and the agent arrow in image coordinates. A render thread
+draws and JPEG encodes frames, at most max_fps of them, and serves them as
+an MJPEG stream on a local HTTP port, viewable in any browser. While nobody
+is watching, publish() returns after one attribute check. While someone is,
+it copies a frame at most max_fps times a second.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from collections import namedtuple
+import threading
+import time
+
+import cv2
+
+# image_points and object_points are (n, 2) arrays, agent is (rear, front)
+# image points or None
+Overlay = namedtuple("Overlay", ["image_points", "object_points", "agent"])
+
+def draw_targets(display_image, image_points, object_points):
+    for (img_x, img_y), (obj_x, obj_y) in zip(image_points, object_points):
+        img_x, img_y = int(img_x), int(img_y)
+        cv2.circle(display_image, (img_x, img_y), 3, (0, 0, 0), -1)
+        text = "(%3.1f, %3.1f)" % (obj_x, obj_y)
+        cv2.putText(display_image, text, (img_x + 5, img_y - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, .5, (0, 0, 0))
+
+def draw_agent(display_image, image_rear, image_front):
+    cv2.arrowedLine(display_image, tuple(map(int, image_rear)),
+                    tuple(map(int, image_front)), (0, 0, 0), 3)
+
+def render(image, overlay):
+    """Draws overlay onto image in place and returns it."""
+    if overlay.image_points is not None and len(overlay.image_points):
+        draw_targets(image, overlay.image_points, overlay.object_points)
+    if overlay.agent is not None:
+        draw_agent(image, *overlay.agent)
+    return image
+
+class DebugStream(object):
+    """Renders published frames on a background thread and serves them as
+    MJPEG on http://host:port/ while a viewer is connected."""
+
+    def __init__(self, port=8080, host="127.0.0.1", max_fps=5, quality=70):
+        self.period = 1.0/max_fps
+        self.quality = quality
+        self.viewers = 0
+        self.published = self.rendered = 0
+        self.last_publish = 0.0
+        self.pending = None # (frame copy, overlay) waiting to be rendered
+        self.jpeg = None
+        self.jpeg_count = 0
+        self.condition = threading.Condition()
+        self.running = True
+        self.render_thread = threading.Thread(target=self._render_loop, daemon=True)
+        self.render_thread.start()
+        from http.server import ThreadingHTTPServer
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def publish(self, image, overlay):
+        """Offers a frame and its overlay. Cheap while nobody is watching."""
+        if not self.viewers:
+            return
+        now = time.monotonic()
+        if now - self.last_publish < self.period:
+            return
+        self.last_publish = now
+        with self.condition:
+            self.pending = (image.copy(), overlay)
+            self.published += 1
+            self.condition.notify_all()
+
+    def _render_loop(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                image, overlay = self.pending
+                self.pending = None
+            ok, jpeg = cv2.imencode(".jpg", render(image, overlay),
+                                    (cv2.IMWRITE_JPEG_QUALITY, self.quality))
+            if not ok:
+                continue
+            with self.condition:
+                self.jpeg = jpeg.tobytes()
+                self.jpeg_count += 1
+                self.rendered += 1
+                self.condition.notify_all()
+
+    def _next_jpeg(self, seen):
+        with self.condition:
+            while self.running and self.jpeg_count == seen:
+                self.condition.wait(1.0)
+            return self.jpeg_count, self.jpeg
+
+    def _make_handler(self):
+        # imported here so locators that only draw overlays skip the HTTP stack
+        from http.server import BaseHTTPRequestHandler
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "multipart/x-mixed-replace; boundary=frame")
+                self.end_headers()
+                with stream.condition:
+                    stream.viewers += 1
+                seen = stream.jpeg_count
+                try:
+                    while stream.running:
+                        seen, jpeg = stream._next_jpeg(seen)
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                         b"Content-Length: %d\r\n\r\n" % len(jpeg))
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stream.condition:
+                        stream.viewers -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        self.render_thread.join()
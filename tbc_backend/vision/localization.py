@@ -6,27 +6,50 @@ Vision system for tennis ball collector.
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
+import hashlib
 import json
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
 import os
 
 import cv2
 import numpy as np
 
+from ..common.instruments import INSTRUMENTS
+from .artifacts import cached_arrays
+from .debug import Overlay, draw_agent, draw_targets
+
+logger = logging.getLogger(__name__)
+
 CURRDIR = os.path.dirname(__file__)
 
 CALIBRATION_FILE = os.path.join(CURRDIR, "runtime/raspicam_v2_m4_calibration.npz")
 PROJECTION_FILE = os.path.join(CURRDIR, "runtime/raspicam_v2_m4_backprojection.npz")
 COLORMASK_FILE = os.path.join(CURRDIR, "runtime/tennis_ball_color_mask.json")
 
+def fuse_projection(config_file, calibration_file=None):
+    """Returns the backprojection folded into lhs_part and rhs. With a
+    calibration_file the new camera matrix is folded in as well and the
+    lens parameters are returned with them."""
+    config = np.load(config_file)
+    inv_rotation_matrix = config["inv_rotation_matrix"]
+    arrays = {"lhs_part": inv_rotation_matrix.dot(config["inv_camera_matrix"]),
+              "rhs": inv_rotation_matrix.dot(config["translation_vector"])}
+    if calibration_file is not None:
+        calibration = np.load(calibration_file)
+        arrays["lhs_part"] = arrays["lhs_part"].dot(calibration["new_camera_matrix"])
+        arrays["camera_matrix"] = calibration["camera_matrix"]
+        arrays["dist_coeffs"] = calibration["dist_coeffs"]
+    return arrays
+
 class RANSACProjector(object):
 
-    def __init__(self, config_file=PROJECTION_FILE):
-        self.config = np.load(config_file)
-        self.inv_rotation_matrix = self.config["inv_rotation_matrix"]
-        self.translation_vector = self.config["translation_vector"]
-        self.inv_camera_matrix = self.config["inv_camera_matrix"]
-        self.lhs_part = self.inv_rotation_matrix.dot(self.inv_camera_matrix)
-        self.rhs = self.inv_rotation_matrix.dot(self.translation_vector)
+    def __init__(self, config_file=PROJECTION_FILE, cache_dir=None):
+        fused = cached_arrays("projection", [config_file],
+                              lambda: fuse_projection(config_file), cache_dir)
+        self.lhs_part = fused["lhs_part"]
+        self.rhs = fused["rhs"]
 
     def project(self, image_points, height):
         if not image_points.size:
@@ -38,18 +61,153 @@ class RANSACProjector(object):
         object_points = (s*lhs - self.rhs).T[:, 0:2]
         return object_points
 
+class LensProjector(RANSACProjector):
+    """Projects raw, still distorted, pixel coordinates onto the ground plane.
+
+    Points are undistorted into normalized camera coordinates with
+    cv2.undistortPoints. The new camera matrix that the backprojection was
+    calibrated against is folded into the ground-plane transform, so each
+    point needs one undistortion and one 3x3 product and no frame is ever
+    remapped.
+    """
+
+    def __init__(self, config_file=PROJECTION_FILE, calibration_file=CALIBRATION_FILE,
+                 cache_dir=None):
+        fused = cached_arrays("lens_projection", [config_file, calibration_file],
+                              lambda: fuse_projection(config_file, calibration_file),
+                              cache_dir)
+        self.lhs_part = fused["lhs_part"]
+        self.rhs = fused["rhs"]
+        self.camera_matrix = fused["camera_matrix"]
+        self.dist_coeffs = fused["dist_coeffs"]
+
+    def project(self, image_points, height):
+        if not image_points.size:
+            return image_points
+        image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 1, 2)
+        normalized = cv2.undistortPoints(image_points, self.camera_matrix,
+                                         self.dist_coeffs).reshape(-1, 2)
+        return super().project(normalized, height)
+
+class ColorLookupTable(object):
+    """Quantized BGR to mask lookup table for an HSV inRange threshold.
+
+    Every BGR color is quantized to bits per channel and the table holds the
+    inRange result of each quantized color. A mask then costs one shift, an
+    index computation and one table lookup per pixel, with no HSV
+    conversion. The table is cached in cache_file and rebuilt whenever the
+    digest stored with it differs from the one given.
+    """
+
+    def __init__(self, lower, upper, bits=5, cache_file=None, digest=None):
+        self.bits = bits
+        self.levels = 1 << bits
+        self.shift = 8 - bits
+        self.index_dtype = np.uint16 if 3*bits <= 16 else np.uint32
+        self.table = None
+        if cache_file is not None:
+            try:
+                cached = np.load(cache_file)
+                if str(cached["digest"]) == digest:
+                    self.table = cached["table"]
+            except (OSError, KeyError, ValueError):
+                pass
+        if self.table is None:
+            self.table = self._build(lower, upper)
+            if cache_file is not None:
+                try:
+                    np.savez(cache_file, digest=digest, table=self.table)
+                except OSError:
+                    pass # read-only install, rebuild next time
+        # flat scratch buffers for the largest image seen, viewed per call
+        self.quantized = np.empty(0, dtype=np.uint8)
+        self.index = np.empty(0, dtype=self.index_dtype)
+
+    def _build(self, lower, upper):
+        centers = (np.arange(self.levels) << self.shift) + (1 << self.shift)//2
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        colors = np.stack((b, g, r), axis=-1).reshape(-1, 1, 3).astype(np.uint8)
+        hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+        return cv2.inRange(hsv, lower, upper).ravel()
+
+    def apply(self, image, dst=None):
+        pixels = image.shape[0]*image.shape[1]
+        if self.index.size < pixels:
+            self.quantized = np.empty(3*pixels, dtype=np.uint8)
+            self.index = np.empty(pixels, dtype=self.index_dtype)
+        quantized = self.quantized[:3*pixels].reshape(image.shape)
+        index = self.index[:pixels].reshape(image.shape[:2])
+        np.right_shift(image, self.shift, out=quantized)
+        np.multiply(quantized[..., 0], self.levels, out=index, dtype=self.index_dtype)
+        np.add(index, quantized[..., 1], out=index)
+        np.multiply(index, self.levels, out=index)
+        np.add(index, quantized[..., 2], out=index)
+        if dst is None:
+            dst = np.empty(image.shape[:2], dtype=np.uint8)
+        return np.take(self.table, index, out=dst)
+
 class TargetDetector(object):
-    def __init__(self, config_file=COLORMASK_FILE):
-        with open(config_file) as f:
-            self.config = json.loads(f.read())
+    """Finds tennis balls by color masking and blob detection.
+
+    With color_lut=True the HSV threshold is replaced by a ColorLookupTable
+    cached next to the config file.
+
+    blobs picks how balls are found in the mask. "simple" runs
+    cv2.SimpleBlobDetector and truncates its keypoints to whole pixels.
+    "components" labels the mask once with cv2.connectedComponentsWithStats
+    and filters the components by area and circularity in NumPy. It returns
+    their float centroids, so sub-pixel accuracy survives until projection.
+    Circularity there is the component's area over that of the circle
+    spanning the longer side of its bounding box: 1 for a disk, lower for
+    streaks, rings and clusters. The default min_circularity of 0 keeps
+    every shape, like the simple detector's settings.
+
+    With roi_tracking=True, frames after a detection are only searched in
+    padded windows around the previous ball locations, and the full frame
+    is swept every sweep_interval frames (or whenever the windows come up
+    empty) to pick up new balls. roi_padding must exceed how far a ball
+    can move in the image between two frames.
+    """
+
+    def __init__(self, config_file=COLORMASK_FILE, roi_tracking=False, sweep_interval=10,
+                 roi_padding=24, color_lut=False, lut_bits=5, config=None, blobs="simple",
+                 min_circularity=0.0):
+        if blobs not in ("simple", "components"):
+            raise ValueError("Unknown blob backend %r." % blobs)
+        self.blobs = blobs
+        self.min_circularity = min_circularity
+        self.roi_tracking = roi_tracking
+        self.sweep_interval = sweep_interval
+        self.roi_padding = roi_padding
+        self.last_points = np.empty((0, 2))
+        self.frame_count = 0
+        self.roi_mask = None
+        if config is not None:
+            # candidate settings from the tuner, used instead of config_file
+            config_text = json.dumps(config, sort_keys=True)
+        else:
+            with open(config_file) as f:
+                config_text = f.read()
+        self.config = json.loads(config_text)
         self.lower = np.array(self.config["lower"])
         self.upper = np.array(self.config["upper"])
+        self.lut = None
+        if color_lut:
+            digest = hashlib.sha1(("%d\n%s" % (lut_bits, config_text)).encode()).hexdigest()
+            cache_file = os.path.splitext(config_file)[0] + ".lut.npz"
+            self.lut = ColorLookupTable(self.lower, self.upper, lut_bits, cache_file, digest)
         self.ksize = tuple(self.config["ksize"])
         self.iterations = self.config["iterations"]
+        self.minarea = self.config["minarea"]
+        self.blob_detector = None
+        if blobs == "simple":
+            self.blob_detector = self._make_blob_detector()
+
+    def _make_blob_detector(self):
         params = cv2.SimpleBlobDetector_Params()
         params.blobColor = 255
         params.filterByColor = True
-        params.minArea = self.config["minarea"]
+        params.minArea = self.minarea
         params.maxArea = np.inf
         params.filterByArea = True
         # shape based parameters should be permissive to allow for failures
@@ -62,32 +220,139 @@ class TargetDetector(object):
         params.maxInertiaRatio = np.inf
         params.filterByInertia = False
         params.filterByConvexity = False
-        self.blob_detector = cv2.SimpleBlobDetector_create(params)
+        return cv2.SimpleBlobDetector_create(params)
 
     def _make_mask(self, image):
-        blurred = cv2.blur(image, self.ksize)
-        hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, self.lower, self.upper)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_DILATE, self.ksize, iterations=self.iterations)
+        with INSTRUMENTS.time("vision.mask"):
+            blurred = cv2.blur(image, self.ksize)
+            if self.lut is not None:
+                mask = self.lut.apply(blurred)
+            else:
+                hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+                mask = cv2.inRange(hsv, self.lower, self.upper)
+            mask = cv2.morphologyEx(mask, cv2.MORPH_DILATE, self.ksize,
+                                    iterations=self.iterations)
         return mask
 
     def _get_coords(self, mask):
         x, y, w, h = cv2.boundingRect(mask)
         if not mask[y:(y + h), x:(x + w)].size:
             return np.empty((2, 0), dtype=np.float32)
-        keypoints = self.blob_detector.detect(mask[y:(y+h), x:(x+w)])
+        if self.blob_detector is None:
+            # Grana labelling is 2-3x slower on odd sized images, so grow the
+            # crop to even coordinates
+            x0, y0 = x & ~1, y & ~1
+            x1 = min(mask.shape[1], (x + w + 1) & ~1)
+            y1 = min(mask.shape[0], (y + h + 1) & ~1)
+            return self._get_centroids(mask[y0:y1, x0:x1]) + (x0, y0)
+        with INSTRUMENTS.time("vision.blobs"):
+            keypoints = self.blob_detector.detect(mask[y:(y+h), x:(x+w)])
         image_points = np.array([(int(point.pt[0] + x), int(point.pt[1] + y)) for point in keypoints])
         return image_points
 
+    def _get_centroids(self, mask):
+        """Returns an (n, 2) float array of the centroids of the components
+        of mask that pass the area and circularity filters."""
+        with INSTRUMENTS.time("vision.blobs"):
+            # block based Grana labelling; the default algorithm's stats pass
+            # is several times slower on sparse masks
+            _, _, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+                mask, 8, cv2.CV_32S, cv2.CCL_GRANA)
+            # label 0 is the background
+            area = stats[1:, cv2.CC_STAT_AREA]
+            keep = area >= self.minarea
+            if self.min_circularity > 0:
+                side = np.maximum(stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT])
+                keep &= 4*area >= self.min_circularity*np.pi*side**2
+            return centroids[1:][keep]
+
+    def _get_windows(self, shape):
+        height, width = shape[:2]
+        windows = [[max(0, int(x) - self.roi_padding), max(0, int(y) - self.roi_padding),
+                    min(width, int(x) + self.roi_padding + 1),
+                    min(height, int(y) + self.roi_padding + 1)]
+                   for x, y in self.last_points]
+        # merge overlapping windows so no ball is detected twice
+        merged = []
+        for window in windows:
+            while True:
+                overlapping = [other for other in merged
+                               if (window[0] < other[2] and other[0] < window[2] and
+                                   window[1] < other[3] and other[1] < window[3])]
+                if not overlapping:
+                    break
+                for other in overlapping:
+                    merged.remove(other)
+                    window = [min(window[0], other[0]), min(window[1], other[1]),
+                              max(window[2], other[2]), max(window[3], other[3])]
+            merged.append(window)
+        return merged
+
+    def _detect_windows(self, image):
+        if self.roi_mask is None or self.roi_mask.shape != image.shape[:2]:
+            self.roi_mask = np.zeros(image.shape[:2], dtype=np.uint8)
+        else:
+            self.roi_mask.fill(0)
+        image_points = []
+        for x0, y0, x1, y1 in self._get_windows(image.shape):
+            window_mask = self._make_mask(image[y0:y1, x0:x1])
+            self.roi_mask[y0:y1, x0:x1] = window_mask
+            window_points = np.reshape(self._get_coords(window_mask), (-1, 2))
+            image_points.append(window_points + (x0, y0))
+        image_points = np.concatenate(image_points)
+        if self.blob_detector is not None:
+            image_points = image_points.astype(int)
+        return image_points, self.roi_mask
+
     def detect(self, image):
-        mask = self._make_mask(image)
-        image_points = self._get_coords(mask)
+        sweep = (not self.roi_tracking or not len(self.last_points) or
+                 not self.frame_count % self.sweep_interval)
+        self.frame_count += 1
+        if not sweep:
+            image_points, mask = self._detect_windows(image)
+            sweep = not len(image_points)
+        if sweep:
+            mask = self._make_mask(image)
+            image_points = self._get_coords(mask)
+        if self.roi_tracking:
+            self.last_points = np.reshape(image_points, (-1, 2))
         return image_points, mask
 
 class AgentDetector(object):
+    """Finds the robot's ArUco marker (id 0) and returns its front and rear
+    edge midpoints in image coordinates.
+
+    The dictionary, detector parameters and detector are built once. Both
+    the cv2.aruco.ArucoDetector API and the older module-level
+    detectMarkers are supported.
 
-    def __init__(self):
+    With roi_tracking, the marker's next position is predicted from its
+    last two detections and only a crop around the prediction, padded by
+    roi_padding pixels, is searched. When the crop comes up empty the whole
+    frame is searched in the same call, so a lost marker is picked up again
+    on the frame it reappears. ArUco's minimum marker size is a fraction of
+    the searched image's size, so the crop search gets its own parameters
+    with the minimum raised to half the last marker's perimeter; at the
+    default the small crop yields many times more candidates and is no
+    faster than the whole frame.
+    """
+
+    def __init__(self, roi_tracking=False, roi_padding=40):
         self.dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_6X6_50)
+        if hasattr(cv2.aruco, "ArucoDetector"):
+            self.parameters = cv2.aruco.DetectorParameters()
+            self.roi_parameters = cv2.aruco.DetectorParameters()
+            self.aruco = cv2.aruco.ArucoDetector(self.dictionary, self.parameters)
+            self.roi_aruco = cv2.aruco.ArucoDetector(self.dictionary, self.roi_parameters)
+        else:
+            self.parameters = cv2.aruco.DetectorParameters_create()
+            self.roi_parameters = cv2.aruco.DetectorParameters_create()
+            self.aruco = self.roi_aruco = None
+        self.roi_tracking = roi_tracking
+        self.roi_padding = roi_padding
+        self.corners = None # last detection
+        self.velocity = np.zeros(2)
+        self.searches = {"roi": 0, "full": 0}
 
     def _make_mask(self, image, lower, upper):
         hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
@@ -101,14 +366,59 @@ class AgentDetector(object):
             return None
         return x, y, w, h       
 
-    def _get_coords(self, image):
-        corners, ids, _ = cv2.aruco.detectMarkers(image, self.dictionary)
+    def _find(self, image, roi=False):
+        aruco = self.roi_aruco if roi else self.aruco
+        parameters = self.roi_parameters if roi else self.parameters
+        with INSTRUMENTS.time("vision.aruco"):
+            if aruco is not None:
+                corners, ids, _ = aruco.detectMarkers(image)
+            else:
+                corners, ids, _ = cv2.aruco.detectMarkers(image, self.dictionary,
+                                                          parameters=parameters)
         if ids is None:
-            return None, None
+            return None
         corners = [c for c, i in zip(corners, ids) if i == 0]
         if not corners:
+            return None
+        return np.squeeze(corners[0])
+
+    def _predicted_window(self, shape):
+        predicted = self.corners + self.velocity
+        x_0, y_0 = np.floor(predicted.min(axis=0)).astype(int) - self.roi_padding
+        x_1, y_1 = np.ceil(predicted.max(axis=0)).astype(int) + self.roi_padding
+        x_0, y_0 = max(x_0, 0), max(y_0, 0)
+        x_1, y_1 = min(x_1, shape[1]), min(y_1, shape[0])
+        if x_1 <= x_0 or y_1 <= y_0:
+            return None
+        return x_0, y_0, x_1, y_1
+
+    def _get_coords(self, image):
+        selected = None
+        if self.roi_tracking and self.corners is not None:
+            window = self._predicted_window(image.shape)
+            if window is not None:
+                x_0, y_0, x_1, y_1 = window
+                self.searches["roi"] += 1
+                perimeter = np.sum(np.linalg.norm(self.corners - np.roll(self.corners, 1, axis=0),
+                                                  axis=1))
+                self.roi_parameters.minMarkerPerimeterRate = max(
+                    self.parameters.minMarkerPerimeterRate,
+                    0.5*perimeter/max(x_1 - x_0, y_1 - y_0))
+                if self.roi_aruco is not None:
+                    self.roi_aruco.setDetectorParameters(self.roi_parameters)
+                selected = self._find(image[y_0:y_1, x_0:x_1], roi=True)
+                if selected is not None:
+                    selected = selected + (x_0, y_0)
+        if selected is None:
+            self.searches["full"] += 1
+            selected = self._find(image)
+        if selected is None:
+            self.corners = None
+            self.velocity = np.zeros(2)
             return None, None
-        selected = np.squeeze(corners[0])
+        if self.corners is not None:
+            self.velocity = np.mean(selected - self.corners, axis=0)
+        self.corners = selected
         front = np.round(np.mean(selected[0:2], axis=0))
         rear = np.round(np.mean(selected[2:4], axis=0))
         return front, rear
@@ -118,20 +428,25 @@ class AgentDetector(object):
         return front_left, front_right
 
 class TargetLocator(object):
+    """Locates tennis balls on the ground plane.
 
-    def __init__(self):
-        self.detector = TargetDetector()
-        self.projector = RANSACProjector()
+    If the camera returns raw frames, pass a LensProjector as projector so
+    that only the detected points are undistorted. The image and world
+    points of the last call are kept for debug overlays.
+    """
+
+    def __init__(self, projector=None, detector=None):
+        self.detector = detector or TargetDetector()
+        self.projector = projector or RANSACProjector()
+        self.image_points = self.object_points = None
 
     def locate(self, image, display_image=None):
         image_points, mask = self.detector.detect(image)
-        object_points = self.projector.project(image_points, 1/12.)
+        with INSTRUMENTS.time("vision.projection"):
+            object_points = self.projector.project(image_points, 1/12.)
+        self.image_points, self.object_points = image_points, object_points
         if display_image is not None and object_points.size:
-            for (img_x, img_y), (obj_x, obj_y) in zip(image_points, object_points):
-                cv2.circle(display_image, (img_x, img_y), 3, (0, 0, 0), -1)
-                text = "(%3.1f, %3.1f)" % (obj_x, obj_y)
-                cv2.putText(display_image, text, (img_x + 5, img_y - 5),
-                            cv2.FONT_HERSHEY_SIMPLEX, .5, (0, 0, 0))
+            draw_targets(display_image, image_points, object_points)
         if object_points.size:
             return list(map(tuple, object_points)), display_image
         else:
@@ -139,17 +454,21 @@ class TargetLocator(object):
 
 class AgentLocator(object):
 
-    def __init__(self):
-        self.detector = AgentDetector()
-        self.projector = RANSACProjector()
+    def __init__(self, projector=None, detector=None):
+        self.detector = detector or AgentDetector()
+        self.projector = projector or RANSACProjector()
+        self.image_points = None # (rear, front) of the last call
 
     def locate(self, image, display_image=None):
         image_front, image_rear = self.detector.detect(image)
         if image_front is None:
+            self.image_points = None
             return (None, None, None), display_image
-        print(image_front)
-        object_front = self.projector.project(np.array([image_front]), 0.5)
-        object_rear = self.projector.project(np.array([image_rear]), 0.5)
+        self.image_points = (image_rear, image_front)
+        logger.debug("agent marker front %s rear %s", image_front, image_rear)
+        with INSTRUMENTS.time("vision.projection"):
+            object_front = self.projector.project(np.array([image_front]), 0.5)
+            object_rear = self.projector.project(np.array([image_rear]), 0.5)
         object_delta = object_front - object_rear
         delta_x, delta_y = tuple(object_delta[0])
         x, y = tuple(object_front[0])
@@ -157,31 +476,206 @@ class AgentLocator(object):
         x += .5*np.cos(phi)
         y += .5*np.sin(phi)
         if display_image is not None:
-            cv2.arrowedLine(display_image, tuple(image_rear), tuple(image_front),
-                            (0, 0, 0), 3)
+            draw_agent(display_image, image_rear, image_front)
         return (x, y, phi), display_image
 
-def watch_offboard(camera, target_locator, agent_locator, show=False):
+def make_target_locator(undistort_points=False, calibration_file=CALIBRATION_FILE,
+                        **detector_args):
+    """Builds a TargetLocator from picklable arguments, for worker processes.
+    calibration_file is that of the camera the raw points come from."""
+    projector = LensProjector(calibration_file=calibration_file) \
+        if undistort_points else None
+    return TargetLocator(projector, TargetDetector(**detector_args))
+
+def make_agent_locator(undistort_points=False, calibration_file=CALIBRATION_FILE,
+                       **detector_args):
+    """Builds an AgentLocator from picklable arguments, for worker processes.
+    calibration_file is that of the camera the raw points come from."""
+    projector = LensProjector(calibration_file=calibration_file) \
+        if undistort_points else None
+    return AgentLocator(projector, AgentDetector(**detector_args))
+
+def _locator_worker(names, shape, jobs, results, target_locator, agent_locator, overlays):
+    # attaching registers the segments with the parent's resource tracker a
+    # second time, which it ignores, the parent unlinks them in close()
+    slots = [shared_memory.SharedMemory(name=name) for name in names]
+    frames = [np.ndarray(shape, dtype=np.uint8, buffer=slot.buf) for slot in slots]
+    locators = {"targets": target_locator(), "agent": agent_locator()}
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        index, slot, kind = job
+        locator = locators[kind]
+        points = None
+        try:
+            result, _ = locator.locate(frames[slot])
+            if overlays and kind == "targets":
+                points = (locator.image_points, locator.object_points)
+            elif overlays:
+                points = locator.image_points
+        except Exception as error:
+            result = error
+        results.put((index, kind, result, points))
+    del frames
+    for slot in slots:
+        slot.close()
+
+class ParallelLocator(object):
+    """Runs target and agent location for a stream of frames on worker
+    processes.
+
+    Each submitted frame is copied once into one of n_slots shared memory
+    buffers, and its target and agent jobs go to whichever workers are free,
+    so both locators and consecutive frames run in parallel. Results come
+    back in submission order.
+
+    target_locator and agent_locator are picklable callables that build a
+    locator in each worker, such as functools.partial objects of
+    make_target_locator and make_agent_locator. A worker's detectors only
+    see whichever frames it happened to pick up, so their ROI windows would
+    follow detections from an arbitrary earlier frame. Build them without
+    roi_tracking.
+
+    With overlays=True the workers also send back the detected points, and
+    next_result leaves the frame and an Overlay for it in last_frame and
+    last_overlay.
+    """
+
+    def __init__(self, shape, n_workers=2, n_slots=None, target_locator=None,
+                 agent_locator=None, start_method="spawn", overlays=False):
+        self.shape = tuple(shape)
+        self.kinds = ("targets", "agent")
+        n_slots = n_slots or 2*n_workers
+        size = int(np.prod(self.shape))
+        self.slots = [shared_memory.SharedMemory(create=True, size=size)
+                      for _ in range(n_slots)]
+        self.frames = [np.ndarray(self.shape, dtype=np.uint8, buffer=slot.buf)
+                       for slot in self.slots]
+        self.free = list(range(n_slots))
+        context = multiprocessing.get_context(start_method)
+        self.jobs = context.Queue()
+        self.results = context.Queue()
+        names = [slot.name for slot in self.slots]
+        self.workers = [context.Process(target=_locator_worker, daemon=True,
+                                        args=(names, self.shape, self.jobs, self.results,
+                                              target_locator or make_target_locator,
+                                              agent_locator or make_agent_locator,
+                                              overlays))
+                        for _ in range(n_workers)]
+        for worker in self.workers:
+            worker.start()
+        self.submitted = 0
+        self.delivered = 0
+        self.pending = {} # index -> [slot, {kind: (result, points)}]
+        self.last_frame = self.last_overlay = None
+
+    def has_free_slot(self):
+        return bool(self.free)
+
+    def submit(self, image):
+        """Queues a frame and returns its index. Needs a free slot."""
+        slot = self.free.pop()
+        np.copyto(self.frames[slot], image)
+        index = self.submitted
+        self.pending[index] = [slot, {}]
+        for kind in self.kinds:
+            self.jobs.put((index, slot, kind))
+        self.submitted += 1
+        return index
+
+    def _collect(self):
+        index, kind, result, points = self.results.get()
+        if isinstance(result, Exception):
+            raise result
+        slot, done = self.pending[index]
+        done[kind] = (result, points)
+        if len(done) == len(self.kinds):
+            self.free.append(slot)
+
+    def next_result(self):
+        """Blocks until the oldest submitted frame is done and returns its
+        (targets, agent). Its slot may be refilled by the next submit."""
+        while len(self.pending[self.delivered][1]) < len(self.kinds):
+            self._collect()
+        slot, done = self.pending.pop(self.delivered)
+        self.delivered += 1
+        (targets, target_points), (agent, agent_points) = done["targets"], done["agent"]
+        if target_points is not None:
+            self.last_frame = self.frames[slot]
+            self.last_overlay = Overlay(target_points[0], target_points[1], agent_points)
+        return targets, agent
+
+    def close(self):
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+        del self.frames
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+
+def _in_court(targets):
+    return [(x, y) for x, y in targets if ((0 < x < 8) and (0 < y < 8))]
+
+def watch_offboard_parallel(camera, n_workers=2, target_locator=None, agent_locator=None,
+                            debug=None):
+    """watch_offboard with location done by a ParallelLocator sized from the
+    first frame. Frames are captured while earlier ones are still being
+    located. Located frames and their overlays are offered to debug, a
+    DebugStream, if given."""
+    image = camera.capture_single()
+    locator = ParallelLocator(image.shape, n_workers, target_locator=target_locator,
+                              agent_locator=agent_locator, overlays=debug is not None)
+
+    def next_result():
+        targets, agent = locator.next_result()
+        if debug is not None:
+            # before the slot is refilled, publish copies the frame
+            debug.publish(locator.last_frame, locator.last_overlay)
+        return _in_court(targets), agent
+
+    try:
+        locator.submit(image)
+        while True:
+            try:
+                while locator.has_free_slot():
+                    with INSTRUMENTS.time("vision.capture"):
+                        image = camera.capture_single()
+                    locator.submit(image)
+            except EOFError:
+                # out of frames, hand out what is still in flight
+                while locator.delivered < locator.submitted:
+                    yield next_result()
+                raise
+            yield next_result()
+    except (KeyboardInterrupt, SystemExit):
+        return
+    finally:
+        locator.close()
+
+def watch_offboard(camera, target_locator, agent_locator, debug=None):
+    """Yields (targets, agent) per frame. Frames and their overlays are
+    offered to debug, a DebugStream, if given."""
     while True:
         try:
-            image = camera.capture_single()
-            targets, display_image = target_locator.locate(image, image.copy())
-            targets = [(x, y) for x, y in targets if ((0 < x < 8) and (0 < y < 8))]
-            agent, display_image = agent_locator.locate(image, display_image)
-            if show:
-                cv2.imwrite("analysis_feed.jpg", display_image)
-                #cv2.imshow("analysis_feed", display_image)
-                #if cv2.waitKey(1) & 0xFF == ord('q'):
-                #    break
-            yield targets, agent
+            with INSTRUMENTS.time("vision.capture"):
+                image = camera.capture_single()
+            targets, _ = target_locator.locate(image)
+            agent, _ = agent_locator.locate(image)
+            if debug is not None:
+                debug.publish(image, Overlay(target_locator.image_points,
+                                             target_locator.object_points,
+                                             agent_locator.image_points))
+            yield _in_court(targets), agent
         except (KeyboardInterrupt, SystemExit):
             return
 
-def watch_onboard(camera, target_locator, show=False):
+def watch_onboard(camera, target_locator, debug=None):
     for image in camera.capture():
-        targets, display_image = target_locator.locate(image, image.copy())
-        if show:
-            cv2.imshow("analysis_feed", display_image)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        targets, _ = target_locator.locate(image)
+        if debug is not None:
+            debug.publish(image, Overlay(target_locator.image_points,
+                                         target_locator.object_points, None))
         yield targets
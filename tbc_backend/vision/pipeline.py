@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Threaded capture pipeline for tennis ball collector cameras.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from collections import deque
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from .cameras import CalibratedPicamera
+
+class PipelineStats(object):
+    """Per-stage timing and frame rate counters for CapturePipeline.
+
+    Every stage is timed once per pipeline frame, so grab and average
+    include all of the raw frames averaged into it.
+    """
+
+    def __init__(self, stages, window=30):
+        self.stages = {stage: [0, 0.0, 0.0] for stage in stages} # count, total, last
+        self.frame_times = {"grabbed": deque(maxlen=window),
+                            "delivered": deque(maxlen=window)}
+        self.dropped = 0
+
+    def add(self, stage, seconds):
+        counters = self.stages[stage]
+        counters[0] += 1
+        counters[1] += seconds
+        counters[2] = seconds
+
+    def mark_frame(self, kind):
+        self.frame_times[kind].append(time.perf_counter())
+
+    def fps(self, kind="delivered"):
+        times = self.frame_times[kind]
+        if len(times) < 2:
+            return 0.0
+        return (len(times) - 1)/(times[-1] - times[0])
+
+    def summary(self):
+        summary = {"%s_fps" % kind: self.fps(kind) for kind in self.frame_times}
+        summary["dropped"] = self.dropped
+        for stage, (count, total, last) in self.stages.items():
+            summary["%s_ms" % stage] = 1000*total/count if count else 0.0
+        return summary
+
+class CapturePipeline(object):
+    """Overlaps frame capture with detection.
+
+    A background thread grabs and averages camera.n_frames raw frames and
+    undistorts the result into one of a small ring of preallocated buffers.
+    A CalibratedPicamera takes a single shot per capture_single, so the
+    pipeline does the same for it unless n_frames is given.
+    The consumer always receives the newest finished frame. Frames it was
+    too slow to pick up are dropped instead of queued, so the consumer never
+    falls behind the camera. A frame returned by capture_single stays valid
+    until the next call.
+
+    Wraps a CalibratedCamera or CalibratedPicamera and has the same
+    capture_single and capture interface.
+    """
+
+    def __init__(self, camera, n_buffers=3, n_frames=None):
+        if n_buffers < 3:
+            raise ValueError("CapturePipeline needs at least 3 buffers.")
+        self.camera = camera
+        if n_frames is None:
+            n_frames = 1 if isinstance(camera, CalibratedPicamera) else \
+                getattr(camera, "n_frames", 1)
+        self.n_frames = n_frames
+        shape = (int(camera.height), int(camera.width), 3)
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(n_buffers)]
+        self.accumulator = np.empty(shape, dtype=np.float32)
+        self.average = np.empty(shape, dtype=np.uint8)
+        self.stats = PipelineStats(("grab", "average", "remap", "process"))
+        self.condition = threading.Condition()
+        self.latest = None  # newest finished slot not yet handed out
+        self.reading = None # slot currently held by the consumer
+        self.handed_out = None
+        self.error = None
+        self.running = True
+        self.thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self.thread.start()
+
+    def _free_slot(self):
+        with self.condition:
+            for slot in range(len(self.buffers)):
+                if slot != self.latest and slot != self.reading:
+                    return slot
+
+    def _grab_into(self, buffer):
+        grabbing = averaging = 0.0
+        if self.n_frames == 1:
+            start = time.perf_counter()
+            average = self.camera.read_raw()
+            grabbing = time.perf_counter() - start
+        else:
+            self.accumulator.fill(0)
+            for _ in range(self.n_frames):
+                start = time.perf_counter()
+                frame = self.camera.read_raw()
+                grabbed = time.perf_counter()
+                cv2.accumulate(frame, self.accumulator)
+                grabbing += grabbed - start
+                averaging += time.perf_counter() - grabbed
+            start = time.perf_counter()
+            average = cv2.convertScaleAbs(self.accumulator, self.average,
+                                          1.0/self.n_frames)
+            averaging += time.perf_counter() - start
+        start = time.perf_counter()
+        self.camera.undistort(average, dst=buffer)
+        self.stats.add("grab", grabbing)
+        self.stats.add("average", averaging)
+        self.stats.add("remap", time.perf_counter() - start)
+
+    def _grab_loop(self):
+        try:
+            while self.running:
+                slot = self._free_slot()
+                self._grab_into(self.buffers[slot])
+                self.stats.mark_frame("grabbed")
+                with self.condition:
+                    if self.latest is not None:
+                        self.stats.dropped += 1
+                    self.latest = slot
+                    self.condition.notify()
+        except Exception as error:
+            with self.condition:
+                self.error = error
+                self.condition.notify()
+
+    def capture_single(self):
+        if self.handed_out is not None:
+            self.stats.add("process", time.perf_counter() - self.handed_out)
+        with self.condition:
+            self.reading = None
+            while self.latest is None:
+                if self.error is not None:
+                    raise self.error
+                self.condition.wait()
+            self.reading, self.latest = self.latest, None
+        self.stats.mark_frame("delivered")
+        self.handed_out = time.perf_counter()
+        return self.buffers[self.reading]
+
+    def capture(self):
+        while True:
+            try:
+                yield self.capture_single()
+            except (KeyboardInterrupt, SystemExit):
+                return
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
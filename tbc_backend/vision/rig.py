@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Multi-camera offboard rig for tennis ball collector.
+
+Several fixed cameras, each with its own calibration and backprojection,
+watch parts of one court. Every camera is captured and located on its own
+thread, and their world-frame detections are merged into a single set of
+targets and one agent pose.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
+import numpy as np
+
+from ..common.instruments import INSTRUMENTS
+from .localization import (AgentDetector, AgentLocator, RANSACProjector, TargetDetector,
+                           TargetLocator, PROJECTION_FILE, _in_court)
+
+def merge_targets(views, merge_distance=0.5):
+    """Merges the world-frame targets of several cameras, a list of target
+    lists, into their means. A target only merges with the nearest target
+    of each other camera within merge_distance, so two balls close together
+    in one camera's view stay two balls."""
+    points = [np.asarray(targets, dtype=np.float64).reshape(-1, 2) for targets in views]
+    cameras = np.concatenate([np.full(len(p), i) for i, p in enumerate(points)]).astype(int)
+    points = np.concatenate(points)
+    if len(points) < 2:
+        return list(map(tuple, points))
+    distance = np.sqrt(np.sum((points[:, None, :] - points[None, :, :])**2, axis=2))
+    distance[cameras[:, None] == cameras[None, :]] = np.inf
+    unassigned = np.ones(len(points), dtype=bool)
+    merged = []
+    for i in range(len(points)):
+        if not unassigned[i]:
+            continue
+        cluster = [i]
+        for camera in np.unique(cameras[unassigned & (distance[i] < merge_distance)]):
+            candidates = np.flatnonzero(unassigned & (cameras == camera))
+            cluster.append(candidates[np.argmin(distance[i, candidates])])
+        unassigned[cluster] = False
+        merged.append(tuple(points[cluster].mean(axis=0)))
+    return merged
+
+def merge_agents(agents):
+    """Averages the agent fixes that found the marker, None if none did."""
+    found = np.array([agent for agent in agents if None not in agent], dtype=np.float64)
+    if not len(found):
+        return None, None, None
+    x, y = found[:, :2].mean(axis=0)
+    phi = np.arctan2(np.sin(found[:, 2]).mean(), np.cos(found[:, 2]).mean())
+    return x, y, phi
+
+class CameraRig(object):
+    """Captures and locates on every camera concurrently and merges the
+    results.
+
+    views is a list of (camera, target_locator, agent_locator, bounds)
+    tuples. bounds is the (x_min, y_min, x_max, y_max) part of the court a
+    camera reports targets for, or None for the whole court.
+    """
+
+    def __init__(self, views, merge_distance=0.5):
+        self.views = views
+        self.merge_distance = merge_distance
+        self.pool = ThreadPoolExecutor(max_workers=len(views))
+        self.frames = 0
+
+    @classmethod
+    def from_config(cls, config_file, camera_class, merge_distance=0.5, roi_tracking=False,
+                    **detector_args):
+        """Builds a rig from a JSON list of cameras, each with a 'device' and
+        optional 'calibration', 'projection' and 'bounds' entries. Relative
+        file paths are taken from the directory of config_file. detector_args
+        are passed on to every TargetDetector."""
+        with open(config_file) as f:
+            config = json.loads(f.read())
+        directory = os.path.dirname(os.path.abspath(config_file))
+        views = []
+        for entry in config:
+            camera_args = {}
+            if "calibration" in entry:
+                camera_args["calibration_file"] = os.path.join(directory, entry["calibration"])
+            camera = camera_class(entry["device"], **camera_args)
+            projector = RANSACProjector(os.path.join(directory,
+                                                     entry.get("projection", PROJECTION_FILE)))
+            views.append((camera,
+                          TargetLocator(projector, TargetDetector(roi_tracking=roi_tracking,
+                                                                  **detector_args)),
+                          AgentLocator(projector, AgentDetector(roi_tracking=roi_tracking)),
+                          entry.get("bounds")))
+        return cls(views, merge_distance)
+
+    def _locate_view(self, view):
+        camera, target_locator, agent_locator, bounds = view
+        with INSTRUMENTS.time("vision.capture"):
+            image = camera.capture_single()
+        targets, _ = target_locator.locate(image)
+        agent, _ = agent_locator.locate(image)
+        if bounds is None:
+            targets = _in_court(targets)
+        else:
+            x_min, y_min, x_max, y_max = bounds
+            targets = [(x, y) for x, y in targets
+                       if x_min < x < x_max and y_min < y < y_max]
+        return targets, agent
+
+    def locate(self):
+        """Returns the merged (targets, agent) for one frame from every camera."""
+        results = list(self.pool.map(self._locate_view, self.views))
+        self.frames += len(results)
+        targets = merge_targets([view_targets for view_targets, _ in results],
+                                self.merge_distance)
+        return targets, merge_agents([view_agent for _, view_agent in results])
+
+    def close(self):
+        self.pool.shutdown()
+
+def watch_rig(rig):
+    while True:
+        try:
+            yield rig.locate()
+        except (KeyboardInterrupt, SystemExit):
+            return
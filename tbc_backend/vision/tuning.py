@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Color mask tuning for tennis ball collector.
+
+Scores candidate TargetDetector settings (HSV bounds, ksize, iterations
+and minarea, the keys of tennis_ball_color_mask.json) against recorded
+frames with labelled ball positions. The labels are a JSON object mapping
+frame indices to lists of [x, y] image points, every ball in the frame.
+
+Candidates are evaluated in batches: each frame is blurred and converted
+to HSV once per ksize, and only the threshold, dilation and blob detection
+are run per candidate.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import json
+
+import cv2
+import numpy as np
+
+from .localization import TargetDetector
+
+def read_labels(path):
+    with open(path) as f:
+        labels = json.loads(f.read())
+    return {int(index): np.reshape(points, (-1, 2)) for index, points in labels.items()}
+
+def match_points(detected, truth, radius):
+    """Returns how many detected points match a distinct true point within
+    radius pixels, matching the closest pairs first."""
+    detected = np.reshape(detected, (-1, 2)).astype(np.float64)
+    truth = np.reshape(truth, (-1, 2)).astype(np.float64)
+    if not len(detected) or not len(truth):
+        return 0
+    distance = np.sqrt(np.sum((detected[:, None] - truth[None])**2, axis=2))
+    rows, cols = np.nonzero(distance < radius)
+    order = np.argsort(distance[rows, cols], kind="stable")
+    used_rows, used_cols = set(), set()
+    for row, col in zip(rows[order], cols[order]):
+        if row not in used_rows and col not in used_cols:
+            used_rows.add(row)
+            used_cols.add(col)
+    return len(used_rows)
+
+def mask_candidates(base, n_candidates, seed=0, hue_spread=8, value_spread=40,
+                    ksizes=(3, 5, 7), iterations=(0, 1, 2), minareas=(5, 10, 20)):
+    """Returns base followed by n_candidates - 1 random variations of it.
+
+    Hue bounds move by up to hue_spread and saturation and value bounds by
+    up to value_spread.
+    """
+    rng = np.random.default_rng(seed)
+    spread = np.array([hue_spread, value_spread, value_spread])
+    limit = np.array([179, 255, 255])
+    candidates = [dict(base)]
+    for _ in range(n_candidates - 1):
+        lower = np.clip(np.array(base["lower"]) + rng.integers(-spread, spread + 1), 0, limit)
+        upper = np.clip(np.array(base["upper"]) + rng.integers(-spread, spread + 1), 0, limit)
+        ksize = int(rng.choice(ksizes))
+        candidates.append({"lower": lower.tolist(), "upper": np.maximum(upper, lower).tolist(),
+                           "minarea": int(rng.choice(minareas)), "ksize": [ksize, ksize],
+                           "iterations": int(rng.choice(iterations))})
+    return candidates
+
+def evaluate_masks(frames, labels, candidates, radius=8, blobs="simple"):
+    """Returns (true positives, false positives, false negatives) for each
+    candidate over the labelled frames. frames is indexable by the label
+    indices."""
+    detectors = [TargetDetector(config=candidate, blobs=blobs) for candidate in candidates]
+    counts = np.zeros((len(candidates), 3), dtype=int)
+    groups = {}
+    for k, detector in enumerate(detectors):
+        groups.setdefault(detector.ksize, []).append(k)
+    for index, truth in labels.items():
+        frame = frames[index]
+        for ksize, members in groups.items():
+            hsv = cv2.cvtColor(cv2.blur(frame, ksize), cv2.COLOR_BGR2HSV)
+            for k in members:
+                detector = detectors[k]
+                mask = cv2.inRange(hsv, detector.lower, detector.upper)
+                mask = cv2.morphologyEx(mask, cv2.MORPH_DILATE, detector.ksize,
+                                        iterations=detector.iterations)
+                detected = np.reshape(detector._get_coords(mask), (-1, 2))
+                matched = match_points(detected, truth, radius)
+                counts[k] += matched, len(detected) - matched, len(truth) - matched
+    return counts
+
+def scores(counts):
+    """Returns precision, recall and F1 columns for evaluate_masks counts."""
+    tp, fp, fn = np.asarray(counts, dtype=np.float64).T
+    precision = np.divide(tp, tp + fp, out=np.ones_like(tp), where=tp + fp > 0)
+    recall = np.divide(tp, tp + fn, out=np.ones_like(tp), where=tp + fn > 0)
+    f1 = np.divide(2*precision*recall, precision + recall, out=np.zeros_like(tp),
+                   where=precision + recall > 0)
+    return np.stack((precision, recall, f1), axis=1)
@@ -0,0 +1,20 @@
+"""
+Tests for the runtime artifact cache.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import numpy as np
+
+from tbc_backend.vision.cameras import PI_CALIBRATION_FILE, load_calibration
+
+def test_cached_calibration_matches_built(tmp_path):
+    built = load_calibration(PI_CALIBRATION_FILE, tmp_path)
+    cached = load_calibration(PI_CALIBRATION_FILE, tmp_path)
+    assert isinstance(cached["map_1"], np.memmap)
+    assert sorted(cached) == sorted(built)
+    for key, array in built.items():
+        assert cached[key].shape == array.shape
+        assert np.array_equal(cached[key], array)
+    assert int(cached["height"]) == 480
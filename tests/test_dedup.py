@@ -0,0 +1,51 @@
+"""
+Tests for request deduplication.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+from tbc_backend.common.codecs import StringCodec
+from tbc_backend.common.dedup import DedupCache
+
+def test_size_stays_bounded():
+    cache = DedupCache(max_entries=100)
+    for sequence in range(10000):
+        assert not cache.seen((1, sequence))
+        assert len(cache) <= 100
+    assert len(cache) == 100
+    assert cache.misses == 10000
+    assert cache.evictions == 10000 - 100
+    assert cache.hits == 0
+
+def test_counters():
+    cache = DedupCache(max_entries=2)
+    assert not cache.seen((1, 0))
+    assert cache.seen((1, 0))
+    assert not cache.seen((2, 0))
+    assert not cache.seen((1, 1))
+    # (1, 0) was the least recently seen key and has been evicted
+    assert not cache.seen((1, 0))
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 4, "evictions": 2}
+
+def test_max_age():
+    cache = DedupCache(max_entries=100, max_age=1.0)
+    cache.seen((1, 0), now=0.0)
+    assert cache.seen((1, 0), now=0.5)
+    cache.seen((1, 1), now=2.0)
+    assert len(cache) == 1
+    assert cache.evictions == 1
+    assert not cache.seen((1, 0), now=2.1)
+
+def test_string_codec_reads_legacy_requests():
+    codec = StringCodec()
+    header, message_type, message = \
+        codec.decode_request([b"1.5 offboard_targets [[1.0, 2.0], [3.0, 4.0]]"])
+    assert header == (1.5, None, None)
+    assert message_type == "offboard_targets"
+    assert message == [[1.0, 2.0], [3.0, 4.0]]
+    frames = codec.encode_request("agent_abs", (1.0, 2.0, 0.5), sender=7, sequence=3)
+    header, message_type, message = codec.decode_request(frames)
+    assert header[1:] == (7, 3)
+    assert message_type == "agent_abs"
+    assert message == (1.0, 2.0, 0.5)
@@ -0,0 +1,63 @@
+"""
+Tests for the motor controller commanders, against a pty in place of the
+Arduino's serial port.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import os
+import time
+
+import pytest
+from serial import Serial
+
+from tbc_backend.control.devices import ScheduledArduinoRobot
+
+@pytest.fixture
+def arduino():
+    master, slave = os.openpty()
+    os.set_blocking(master, False)
+    robot = ScheduledArduinoRobot(None, None, min_interval=.01,
+                                  serial=Serial(os.ttyname(slave), 9600))
+    yield robot, master
+    robot.close()
+    robot.serial.close()
+    os.close(slave)
+    os.close(master)
+
+def read_messages(master):
+    data = b""
+    while True:
+        try:
+            chunk = os.read(master, 1024)
+        except BlockingIOError:
+            break
+        if not chunk:
+            break
+        data += chunk
+    return [line.strip() for line in data.decode().splitlines() if line.strip()]
+
+def test_preemption(arduino):
+    robot, master = arduino
+    start = time.monotonic()
+    first = robot.command(100, 100, move_time=2.0, stop=True, delta=(4.0, 0.0))
+    time.sleep(.2)
+    second = robot.command(-50, 50, move_time=.1, stop=True, preempt=True)
+    assert robot.wait(timeout=1.0)
+    assert time.monotonic() - start < 1.0
+    assert first.interrupted and not second.interrupted
+    assert 0.05 < first.fraction < 0.5
+    assert robot.executed_deltas() == [(pytest.approx(4.0*first.fraction), 0.0)]
+    # the preempted move hands over without stopping in between
+    assert read_messages(master) == ["100 100", "-50 50", "0 0"]
+
+def test_cancel_drops_queued_segments(arduino):
+    robot, master = arduino
+    running = robot.command(100, 100, move_time=2.0)
+    queued = robot.command(80, 80, move_time=2.0)
+    time.sleep(.1)
+    robot.cancel()
+    assert robot.wait(timeout=1.0)
+    assert running.interrupted and queued.interrupted
+    assert read_messages(master) == ["100 100", "0 0"]
@@ -0,0 +1,75 @@
+"""
+Tests for the agent pose estimator.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import numpy as np
+
+from tbc_backend.tracking.estimators import PoseEstimator, wrap_angle
+
+def synthetic_stream(seed=0, duration=20.0, rate=50.0, fix_period=.1, latency=.15):
+    """Returns the true poses by tick time and the (arrival, timestamp, kind,
+    data) inputs the estimator would see, in arrival order."""
+    rng = np.random.default_rng(seed)
+    times = np.arange(0, duration, 1.0/rate)
+    rho = (0.5 + 0.3*np.sin(times/3.0))/rate
+    phi = (0.6*np.sin(times/2.0) + 0.3*np.sin(times/0.7))/rate
+    headings = np.cumsum(phi)
+    poses = np.stack((np.cumsum(rho*np.cos(headings)),
+                      np.cumsum(rho*np.sin(headings)), headings), axis=1)
+    inputs = [(t, t, "move", (r*1.05*(1 + rng.normal(0, .02)),
+                              p*0.95 + rng.normal(0, .002)))
+              for t, r, p in zip(times, rho, phi)]
+    step = int(round(fix_period*rate))
+    for i in range(0, len(times), step):
+        x, y, heading = poses[i]
+        fix = (x + rng.normal(0, .15), y + rng.normal(0, .15),
+               wrap_angle(heading + rng.normal(0, .05)))
+        inputs.append((times[i] + latency + abs(rng.normal(0, .03)),
+                       times[i], "fix", fix))
+    inputs.sort(key=lambda item: item[0])
+    return dict(zip(times, poses)), inputs
+
+def feed(estimator, timestamp, kind, data):
+    if kind == "move":
+        return estimator.predict(*data, timestamp=timestamp)
+    return estimator.correct(*data, timestamp=timestamp)
+
+def test_late_inputs_match_in_order():
+    _, inputs = synthetic_stream()
+    late = PoseEstimator()
+    for _, timestamp, kind, data in inputs:
+        assert feed(late, timestamp, kind, data)
+    assert late.replayed > 0
+    in_order = PoseEstimator()
+    # moves go before fixes with the same timestamp, as bisect_right slots them
+    for _, timestamp, kind, data in sorted(inputs, key=lambda item:
+                                           (item[1], item[2] == "fix")):
+        feed(in_order, timestamp, kind, data)
+    assert in_order.replayed == 0
+    assert np.allclose(late.pose(), in_order.pose())
+    assert np.allclose(late.covariance, in_order.covariance)
+
+def test_error_bounded_on_trajectory():
+    poses, inputs = synthetic_stream(seed=1)
+    estimator = PoseEstimator()
+    errors = []
+    for _, timestamp, kind, data in inputs:
+        feed(estimator, timestamp, kind, data)
+        if kind == "move" and timestamp > 2.0:
+            x, y, heading = estimator.pose()
+            true_x, true_y, true_heading = poses[timestamp]
+            errors.append((np.hypot(x - true_x, y - true_y),
+                           abs(wrap_angle(heading - true_heading))))
+    errors = np.array(errors)
+    # fixes are 0.15 ft and 0.05 rad noisy and odometry is 5% off
+    assert errors[:, 0].max() < 0.3
+    assert errors[:, 1].max() < 0.15
+
+def test_inputs_older_than_history_are_ignored():
+    estimator = PoseEstimator(history=1.0)
+    estimator.predict(1.0, 0.0, timestamp=10.0)
+    assert not estimator.correct(5.0, 5.0, 0.0, timestamp=8.5)
+    assert np.allclose(estimator.pose(), (1.0, 0.0, 0.0))
@@ -0,0 +1,42 @@
+"""
+Tests for point-level projection of raw detections.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import numpy as np
+import cv2
+
+from tbc_backend.vision.cameras import load_calibration, undistort_image
+from tbc_backend.vision.localization import (CALIBRATION_FILE, LensProjector,
+                                             RANSACProjector, TargetDetector)
+
+TOLERANCE = 0.5/12 # ft
+
+def synthetic_frame(rng, n_balls, width=640, height=480):
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = (120, 80, 40)
+    for x, y in rng.uniform((60, 60), (width - 60, height - 60), (n_balls, 2)):
+        cv2.circle(frame, (int(x), int(y)), 8, (40, 220, 200), -1)
+    return frame
+
+def test_lens_projection_matches_remap(tmp_path):
+    calibration = load_calibration(CALIBRATION_FILE, tmp_path)
+    maps = calibration["map_1"], calibration["map_2"]
+    detector = TargetDetector()
+    ransac = RANSACProjector(cache_dir=tmp_path)
+    lens = LensProjector(cache_dir=tmp_path)
+    rng = np.random.RandomState(0)
+    errors = []
+    for _ in range(10):
+        frame = synthetic_frame(rng, 10)
+        remap_points, _ = detector.detect(undistort_image(frame, maps))
+        raw_points, _ = detector.detect(frame)
+        remap_world = ransac.project(remap_points, 1/12.)
+        lens_world = lens.project(raw_points, 1/12.)
+        assert len(remap_world) == len(lens_world) > 0
+        distance = np.linalg.norm(remap_world[:, None, :] - lens_world[None, :, :],
+                                  axis=2)
+        errors.extend(distance.min(axis=1))
+    assert max(errors) < TOLERANCE
@@ -7,41 +7,46 @@ Tracking server for tennis ball collector.
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
-from tbc_backend.common import Server
-from tbc_backend.tracking import MemorylessTracker
+import logging
 
-def main(port):
-    """ main function for server """
-    server = Server(args.port)
-    onboard_tracker = MemorylessTracker(in_view=False)
-    offboard_tracker = MemorylessTracker(in_view=True)
-    misses = 0
+from tbc_backend.common import AsyncServer, Server, MessageRecorder, CODECS
+from tbc_backend.common.instruments import add_arguments, configure
+from tbc_backend.tracking import TrackingService
+
+logger = logging.getLogger("tracking")
+
+def serve(server, service):
+    """synchronous loop over a single REP socket and the camera stream"""
     for message_type, message in server.listen():
-        print("message recieved: ", message_type)
-
-        if message_type == "get_target_rel":
-            target = onboard_tracker.get_target_rel()
-            if not target:
-                if not misses % 2:
-                    target = None
-                else:
-                    target = offboard_tracker.get_target_rel()
-                misses += 1
-            server.reply(target)
-            continue
-        else:
-            server.reply(True)
-
-        if message_type == "offboard_targets":
-            offboard_tracker.update_target_abs(message)
-        elif message_type == "onboard_targets":
-            onboard_tracker.update_target_rel(message)
-        elif message_type == "agent_rel":
-            onboard_tracker.update_agent_rel(*message)
-            offboard_tracker.update_agent_rel(*message)
-        elif message_type == "agent_abs":
-            onboard_tracker.update_agent_abs(*message)
-            offboard_tracker.update_agent_abs(*message)
+        logger.debug("message received: %s", message_type)
+        server.reply(service.handle(message_type, message,
+                                    server.last_header.timestamp))
+
+def serve_async(server, service):
+    """asyncio loop with one ROUTER endpoint per peer"""
+    def handler(endpoint, message_type, message):
+        logger.debug("message received: %s %s", endpoint, message_type)
+        return service.handle(message_type, message, server.last_header.timestamp)
+    server.run(handler)
+
+def main(args):
+    """ main function for server """
+    configure(args.log_level, args.stats_port, args.stats_every)
+    service = TrackingService(plan=args.plan, turn_weight=args.turn_weight,
+                              persistent=args.persistent,
+                              estimate_pose=args.estimate_pose,
+                              fix_latency=args.fix_latency)
+    recorder = MessageRecorder(args.record) if args.record else None
+    if args.asynchronous:
+        server = AsyncServer({"controller": args.port,
+                              "onboard": args.onboard_port,
+                              "offboard": args.offboard_port},
+                             codec=args.codec, recorder=recorder)
+        serve_async(server, service)
+    else:
+        server = Server(args.port, codec=args.codec, stream_port=args.stream_port,
+                        recorder=recorder)
+        serve(server, service)
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
@@ -49,6 +54,40 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--port", dest="port", default="5555", type=str,
                         help="TCP Port to serve on.")
+    parser.add_argument("--stream_port", dest="stream_port", default="5556", type=str,
+                        help="""TCP Port to receive streamed camera results on.
+                        Defaults to '5556'.""")
+    parser.add_argument("--codec", dest="codec", default="binary",
+                        choices=sorted(CODECS), help="""Wire format for
+                        messages. Defaults to 'binary'.""")
+    parser.add_argument("--async", dest="asynchronous", action="store_true",
+                        help="""Serve the controller, onboard camera and offboard
+                        camera on separate endpoints with asyncio. '--port'
+                        is then used by the controller only.""")
+    parser.add_argument("--onboard_port", dest="onboard_port", default="5557",
+                        type=str, help="""Onboard camera port in '--async' mode.
+                        Defaults to '5557'.""")
+    parser.add_argument("--offboard_port", dest="offboard_port", default="5558",
+                        type=str, help="""Offboard camera port in '--async' mode.
+                        Defaults to '5558'.""")
+    parser.add_argument("--record", dest="record", default=None, type=str,
+                        help="Append every message served to this file.")
+    parser.add_argument("--plan", dest="plan", action="store_true",
+                        help="""Visit offboard targets in a planned route order
+                        instead of nearest first.""")
+    parser.add_argument("--turn_weight", dest="turn_weight", default=0.5,
+                        type=float, help="""Feet of travel one radian of turning
+                        is worth to the route planner. Defaults to 0.5.""")
+    parser.add_argument("--persistent", dest="persistent", action="store_true",
+                        help="""Keep one fused map of tracked targets instead
+                        of the latest frame from each camera.""")
+    parser.add_argument("--estimate_pose", dest="estimate_pose", action="store_true",
+                        help="""Fuse ArUco fixes with the controller's moves in
+                        a pose filter instead of overwriting the pose.""")
+    parser.add_argument("--fix_latency", dest="fix_latency", default=0.0,
+                        type=float, help="""Seconds between taking an offboard
+                        frame and sending its agent fix. Defaults to 0.""")
+    add_arguments(parser)
     args = parser.parse_args()
 
     main(args)
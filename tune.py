@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+"""
+Parameter tuning for tennis ball collector.
+
+  mask    scores random variations of the color mask settings against a
+          recording made with 'vision.py --record' and a labels file, and
+          writes the best back to the color mask config
+  motion  fits turn_scaling and forward_scaling to moves logged with
+          'control.py --log_moves' (or 'simulate.py --log_moves') and
+          writes them to the controller config
+  policy  sweeps buffer_distance and max_turn_time in simulated episodes
+          with the configured scaling constants and writes the best to the
+          controller config
+
+Every candidate is listed in the --report CSV file with its precision and
+recall or its pose error or its collection results. Mask candidates and
+policy episodes are spread over --workers processes; the motion fit scores
+its whole grid in one vectorized pass.
+"""
+
+__author__ = "Andrew Benton"
+__version__ = "0.1.0"
+
+import csv
+import json
+from multiprocessing import Pool
+import os
+import time
+
+import numpy as np
+
+from tbc_backend.common import FrameReader
+from tbc_backend.control import CONTROLLER_FILE
+from tbc_backend.control.tuning import fit_scaling, pose_errors, read_moves
+from tbc_backend.vision.localization import COLORMASK_FILE
+from tbc_backend.vision.tuning import (evaluate_masks, mask_candidates, read_labels,
+                                       scores)
+
+_frames = _labels = None
+
+def _init_mask_worker(recording, labels_file):
+    global _frames, _labels
+    _frames = FrameReader(recording)
+    _labels = read_labels(labels_file)
+
+def _evaluate_mask_chunk(job):
+    candidates, radius, blobs = job
+    return evaluate_masks(_frames, _labels, candidates, radius, blobs)
+
+def write_report(path, header, rows):
+    if path is None:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def read_config(path):
+    with open(path) as f:
+        return json.loads(f.read())
+
+def write_config(path, config):
+    with open(path, "w") as f:
+        f.write(json.dumps(config, indent=2) + "\n")
+
+def tune_mask(args):
+    labels_file = args.labels or os.path.join(args.recording, "labels.json")
+    candidates = mask_candidates(read_config(args.config), args.candidates, args.seed)
+    chunks = [candidates[i::args.workers] for i in range(args.workers)]
+    start = time.perf_counter()
+    with Pool(args.workers, _init_mask_worker, (args.recording, labels_file)) as pool:
+        chunk_counts = pool.map(_evaluate_mask_chunk, [(chunk, args.radius, args.blobs)
+                                                       for chunk in chunks])
+    elapsed = time.perf_counter() - start
+    # undo the round robin split
+    counts = np.empty((len(candidates), 3), dtype=int)
+    for i, chunk in enumerate(chunk_counts):
+        counts[i::args.workers] = chunk
+    results = scores(counts)
+    write_report(args.report, ["candidate", "precision", "recall", "f1", "true_positives",
+                               "false_positives", "false_negatives", "config"],
+                 [[k, *results[k], *counts[k], json.dumps(candidate)]
+                  for k, candidate in enumerate(candidates)])
+    best = int(np.argmax(results[:, 2])) # ties keep the earliest, the current config first
+    print("%d candidates on %d labelled frames in %.1f s" %
+          (len(candidates), len(read_labels(labels_file)), elapsed))
+    for name, k in (("current", 0), ("best", best)):
+        print("%-8s precision %.3f  recall %.3f  f1 %.3f  %s" %
+              (name, *results[k], json.dumps(candidates[k])))
+    write_config(args.output or args.config, candidates[best])
+
+def tune_motion(args):
+    moves = read_moves(args.moves)
+    config = read_config(args.config)
+    turn_scalings = np.arange(args.turn_range[0], args.turn_range[1] + 1e-9, args.step)
+    forward_scalings = np.arange(args.forward_range[0], args.forward_range[1] + 1e-9,
+                                 args.step)
+    start = time.perf_counter()
+    candidates, position, heading, best = fit_scaling(moves, turn_scalings,
+                                                      forward_scalings, args.send_delay)
+    elapsed = time.perf_counter() - start
+    write_report(args.report, ["turn_scaling", "forward_scaling", "position_rms_ft",
+                               "heading_rms_rad"],
+                 np.column_stack((candidates, position, heading)).tolist())
+    current = pose_errors(moves, config["turn_scaling"], config["forward_scaling"],
+                          args.send_delay)
+    print("%d moves, %d candidates in %.3f s" % (len(moves[0]), len(candidates), elapsed))
+    print("current  turn_scaling %6.1f  forward_scaling %6.1f  position rms %.3f ft  "
+          "heading rms %.3f rad" % (config["turn_scaling"], config["forward_scaling"],
+                                    current[0][0], current[1][0]))
+    print("best     turn_scaling %6.1f  forward_scaling %6.1f  position rms %.3f ft  "
+          "heading rms %.3f rad" % (*candidates[best], position[best], heading[best]))
+    config["turn_scaling"], config["forward_scaling"] = \
+        [round(float(value), 1) for value in candidates[best]]
+    write_config(args.output or args.config, config)
+
+def tune_policy(args):
+    import simulate
+    config = read_config(args.config)
+    grid = [(buffer_distance, max_turn_time) for buffer_distance in args.buffer_distances
+            for max_turn_time in args.max_turn_times]
+    episodes = []
+    for buffer_distance, max_turn_time in grid:
+        for seed in range(args.episodes):
+            episodes.append({"n_balls": args.n_balls, "seed": seed,
+                             "gain_error": args.gain_error, "time_limit": args.time_limit,
+                             "miss_rate": .1, "latency": .02, "offboard_period": .1,
+                             "onboard_period": None, "codec": None,
+                             "tracker": "memoryless", "log_moves": None,
+                             "turn_scaling": config["turn_scaling"],
+                             "forward_scaling": config["forward_scaling"],
+                             "world_turn_scaling": config["turn_scaling"],
+                             "world_forward_scaling": config["forward_scaling"],
+                             "buffer_distance": buffer_distance,
+                             "max_turn_time": max_turn_time,
+                             "max_forward_time": config["max_forward_time"]})
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        results = pool.map(simulate.run_episode, episodes)
+    elapsed = time.perf_counter() - start
+    rows = []
+    for k, (buffer_distance, max_turn_time) in enumerate(grid):
+        group = results[k*args.episodes:(k + 1)*args.episodes]
+        # episodes that miss balls count as running to the time limit
+        finish = [r["last_capture"] if r["collected"] == 1 else args.time_limit
+                  for r in group]
+        rows.append([buffer_distance, max_turn_time,
+                     np.mean([r["collected"] for r in group]), np.mean(finish)])
+    write_report(args.report, ["buffer_distance", "max_turn_time", "collected",
+                               "mean_finish_s"], rows)
+    best = min(rows, key=lambda row: (-row[2], row[3]))
+    print("%d settings x %d episodes in %.1f s" % (len(grid), args.episodes, elapsed))
+    for row in sorted(rows, key=lambda row: (-row[2], row[3]))[:5]:
+        print("buffer_distance %4.2f  max_turn_time %4.2f  collected %5.1f%%  "
+              "finished in %6.1f s" % (row[0], row[1], 100*row[2], row[3]))
+    config["buffer_distance"], config["max_turn_time"] = best[0], best[1]
+    write_config(args.output or args.config, config)
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    mask = commands.add_parser("mask", help="Tune the color mask settings.")
+    mask.add_argument("recording", type=str,
+                      help="Directory written by 'vision.py --record'.")
+    mask.add_argument("--labels", dest="labels", default=None, type=str,
+                      help="""JSON object of frame index to [x, y] ball image
+                      points. Defaults to 'labels.json' in the recording.""")
+    mask.add_argument("--config", dest="config", default=COLORMASK_FILE, type=str,
+                      help="Color mask config to start from. Defaults to the runtime one.")
+    mask.add_argument("--candidates", dest="candidates", default=200, type=int,
+                      help="Settings to try, the current one included. Defaults to 200.")
+    mask.add_argument("--radius", dest="radius", default=8.0, type=float,
+                      help="Pixels a detection may be off its label. Defaults to 8.")
+    mask.add_argument("--seed", dest="seed", default=0, type=int,
+                      help="Random seed. Defaults to 0.")
+    mask.add_argument("--blobs", dest="blobs", default="simple",
+                      choices=["simple", "components"],
+                      help="Blob backend to score with, as 'vision.py --blobs'.")
+
+    motion = commands.add_parser("motion", help="Fit the motion scaling constants.")
+    motion.add_argument("moves", type=str, help="File written by '--log_moves'.")
+    motion.add_argument("--config", dest="config", default=CONTROLLER_FILE, type=str,
+                        help="Controller config to update. Defaults to the runtime one.")
+    motion.add_argument("--turn_range", dest="turn_range", default=[50, 150], nargs=2,
+                        type=float, help="Turn scaling grid bounds. Defaults to 50 150.")
+    motion.add_argument("--forward_range", dest="forward_range", default=[50, 200],
+                        nargs=2, type=float, help="""Forward scaling grid bounds.
+                        Defaults to 50 200.""")
+    motion.add_argument("--step", dest="step", default=0.5, type=float,
+                        help="Grid step. Defaults to 0.5.")
+    motion.add_argument("--send_delay", dest="send_delay", default=.10, type=float,
+                        help="""Seconds each move runs before its move time
+                        starts. Defaults to 0.1, ArduinoRobot's pause.""")
+
+    policy = commands.add_parser("policy", help="Sweep the controller move limits.")
+    policy.add_argument("--config", dest="config", default=CONTROLLER_FILE, type=str,
+                        help="Controller config to update. Defaults to the runtime one.")
+    policy.add_argument("--buffer_distance", dest="buffer_distances", nargs="+",
+                        type=float, default=[0.25, 0.5, 1.0, 1.5],
+                        help="Buffer distances to try. Defaults to 0.25 0.5 1 1.5.")
+    policy.add_argument("--max_turn_time", dest="max_turn_times", nargs="+",
+                        type=float, default=[0.5, 1.0, 2.0],
+                        help="Turn move limits to try. Defaults to 0.5 1 2.")
+    policy.add_argument("--episodes", dest="episodes", default=20, type=int,
+                        help="Simulated episodes per setting. Defaults to 20.")
+    policy.add_argument("--balls", dest="n_balls", default=20, type=int,
+                        help="Balls per episode. Defaults to 20.")
+    policy.add_argument("--gain_error", dest="gain_error", default=.05, type=float,
+                        help="Wheel gain error. Defaults to 0.05.")
+    policy.add_argument("--time_limit", dest="time_limit", default=600.0, type=float,
+                        help="Simulated seconds per episode. Defaults to 600.")
+
+    for command in (mask, motion, policy):
+        command.add_argument("--output", dest="output", default=None, type=str,
+                             help="Where to write the tuned config. Defaults to '--config'.")
+        command.add_argument("--report", dest="report", default=None, type=str,
+                             help="CSV file listing every candidate's results.")
+        command.add_argument("--workers", dest="workers", default=os.cpu_count(), type=int,
+                             help="Processes to evaluate on. Defaults to the core count.")
+    args = parser.parse_args()
+
+    {"mask": tune_mask, "motion": tune_motion, "policy": tune_policy}[args.command](args)
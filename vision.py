@@ -7,22 +7,111 @@ Vision system for tennis ball collector.
 __author__ = "Andrew Benton"
 __version__ = "0.1.0"
 
-from tbc_backend.common import Client
+from functools import partial
+import logging
+import os
+
+from tbc_backend.common import Client, Publisher, FrameRecorder, MessageRecorder, CODECS
+from tbc_backend.common.instruments import add_arguments, configure
 from tbc_backend.vision import *
 
+logger = logging.getLogger("vision")
+
+def report_stats(camera, i, every=100):
+    if isinstance(camera, CapturePipeline) and i and not i % every:
+        logger.info(" ".join("%s=%.1f" % item for item in camera.stats.summary().items()))
+
+def run(camera, target_locator, agent_locator, publisher, debug=None, parallel=None):
+    """locate targets (and the agent, if agent_locator is given) and publish
+    them until interrupted or the camera runs out of frames; debug is a
+    DebugStream to offer annotated frames to and parallel holds
+    watch_offboard_parallel arguments to locate on worker processes"""
+    try:
+        if agent_locator is not None and parallel:
+            for i, (targets, agent) in enumerate(watch_offboard_parallel(camera, debug=debug,
+                                                                         **parallel)):
+                publisher.send("agent_abs", agent)
+                publisher.send("offboard_targets", targets)
+                report_stats(camera, i)
+        elif agent_locator is None:
+            for i, targets in enumerate(watch_onboard(camera, target_locator, debug)):
+                publisher.send("onboard_targets", targets)
+                report_stats(camera, i)
+        else:
+            for i, (targets, agent) in enumerate(watch_offboard(camera, target_locator,
+                                                                agent_locator, debug)):
+                publisher.send("agent_abs", agent)
+                publisher.send("offboard_targets", targets)
+                report_stats(camera, i)
+    except EOFError:
+        return
+
+def run_rig(rig, publisher):
+    """publish the merged targets and agent of every camera in rig as one
+    offboard stream until interrupted or a camera runs out of frames"""
+    try:
+        for targets, agent in watch_rig(rig):
+            publisher.send("agent_abs", agent)
+            publisher.send("offboard_targets", targets)
+    except EOFError:
+        return
+    finally:
+        rig.close()
+
 def main(args):
-    camera = Camera(args.device)
-    target_locator = TargetLocator()
-    client = Client(args.port, args.host)
-    if args.onboard:
-        for targets in watch_onboard(camera, target_locator, args.show):
-            client.send("onboard_targets", targets)
+    configure(args.log_level, args.stats_port, args.stats_every)
+    recorder = frame_recorder = None
+    if args.record:
+        frame_recorder = FrameRecorder(os.path.join(args.record, "frames"))
+        recorder = MessageRecorder(os.path.join(args.record, "messages.jsonl"))
+    if args.request:
+        publisher = Client(args.port, args.host, codec=args.codec, recorder=recorder)
     else:
-        agent_locator = AgentLocator()
-        for targets, agent in watch_offboard(camera, target_locator,
-                                         agent_locator, args.show):
-            client.send("agent_abs", agent)
-            client.send("offboard_targets", targets)
+        publisher = Publisher(args.port, args.host, codec=args.codec, recorder=recorder)
+    if args.rig:
+        rig = CameraRig.from_config(args.rig, Camera, args.merge_distance,
+                                    args.roi_tracking, color_lut=args.color_lut,
+                                    blobs=args.blobs,
+                                    min_circularity=args.min_circularity)
+        run_rig(rig, publisher)
+        return
+    camera = Camera(args.device, undistort_frame=not args.undistort_points,
+                    recorder=frame_recorder)
+    calibration_file = camera.calibration_file
+    projector = LensProjector(calibration_file=calibration_file) \
+        if args.undistort_points else None
+    if args.pipeline:
+        camera = CapturePipeline(camera)
+        # the pipeline stats are logged at INFO whatever '--log_level' is
+        if logger.getEffectiveLevel() > logging.INFO:
+            logger.setLevel(logging.INFO)
+    target_locator = TargetLocator(projector,
+                                   TargetDetector(roi_tracking=args.roi_tracking,
+                                                  color_lut=args.color_lut,
+                                                  blobs=args.blobs,
+                                                  min_circularity=args.min_circularity))
+    agent_locator = None if args.onboard else \
+        AgentLocator(projector, AgentDetector(roi_tracking=args.roi_tracking))
+    parallel = None
+    if args.workers:
+        # workers see interleaved frames, so they never track ROIs
+        parallel = {"n_workers": args.workers,
+                    "target_locator": partial(make_target_locator, args.undistort_points,
+                                              calibration_file,
+                                              color_lut=args.color_lut,
+                                              blobs=args.blobs,
+                                              min_circularity=args.min_circularity),
+                    "agent_locator": partial(make_agent_locator, args.undistort_points,
+                                             calibration_file)}
+    debug = DebugStream(args.debug_port, max_fps=args.debug_fps) if args.show else None
+    try:
+        run(camera, target_locator, agent_locator, publisher, debug, parallel)
+    finally:
+        if debug is not None:
+            debug.close()
+        if frame_recorder is not None:
+            frame_recorder.close()
+            recorder.close()
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
@@ -30,18 +119,79 @@ if __name__ == "__main__":
     parser.add_argument("--device", dest="device", default="/dev/video0", type=str,
                         help="Unix device path for camera. Defaults to '/dev/video0'.")
     parser.add_argument("--show", dest="show", action="store_true",
-                        help="""Display camera feed with locations. This requires
-                        significant CPU, should only be active for
-                        troubleshooting.""")
+                        help="""Serve the camera feed with locations as an MJPEG
+                        stream on http://localhost:'--debug_port'/. Frames are
+                        only drawn and encoded while a viewer is connected.""")
+    parser.add_argument("--debug_port", dest="debug_port", default=8080, type=int,
+                        help="Port for the '--show' stream. Defaults to 8080.")
+    parser.add_argument("--debug_fps", dest="debug_fps", default=5, type=float,
+                        help="Frame rate limit of the '--show' stream. Defaults to 5.")
     parser.add_argument("--nearest", dest="nearest", action="store_true",
                         help="""Publish nearest point directly to 'target_rel' topic.
                         This must be activated if running in single camera locate
                         and control mode.""")
+    parser.add_argument("--pipeline", dest="pipeline", action="store_true",
+                        help="""Capture on a background thread so grabbing and
+                        undistortion overlap with detection. Logs frame
+                        rate and per-stage timings every 100 frames.""")
+    parser.add_argument("--undistort_points", dest="undistort_points",
+                        action="store_true", help="""Skip undistorting whole
+                        frames. Detection runs on raw frames and only the
+                        detected points are undistorted and projected.""")
+    parser.add_argument("--roi_tracking", dest="roi_tracking", action="store_true",
+                        help="""Only search for balls near their last known
+                        locations, with a full frame sweep every 10 frames,
+                        and for the agent marker near its predicted location.
+                        Ignored with '--workers', whose workers each see only
+                        some of the frames.""")
+    parser.add_argument("--color_lut", dest="color_lut", action="store_true",
+                        help="""Threshold colors with a cached BGR lookup table
+                        instead of an HSV conversion.""")
+    parser.add_argument("--blobs", dest="blobs", default="simple",
+                        choices=["simple", "components"],
+                        help="""Find balls in the mask with SimpleBlobDetector or
+                        with connected components, which keeps sub-pixel
+                        centroids. Defaults to 'simple'.""")
+    parser.add_argument("--min_circularity", dest="min_circularity", default=0.0,
+                        type=float, help="""Smallest circularity a component may
+                        have with '--blobs components'. Defaults to 0, any shape.""")
+    parser.add_argument("--record", dest="record", default=None, type=str,
+                        help="""Record raw camera frames and published
+                        messages into this directory for replay.py.""")
     parser.add_argument("--onboard", dest="onboard", action="store_true")
     parser.add_argument("--host", dest="host", default="localhost", type=str,
                         help="Hostname for publishing. Defaults to 'localhost'.")
-    parser.add_argument("--port", dest="port", default="5555", type=str,
-                        help="Port for publishing. Defaults to '5555'.")
+    parser.add_argument("--port", dest="port", default="5556", type=str,
+                        help="""Stream port of the tracking server to publish
+                        to. Defaults to '5556'.""")
+    parser.add_argument("--codec", dest="codec", default="binary",
+                        choices=sorted(CODECS), help="""Wire format for
+                        messages. Defaults to 'binary'.""")
+    parser.add_argument("--workers", dest="workers", default=0, type=int,
+                        help="""Locate targets and the agent on this many worker
+                        processes. Offboard only.""")
+    parser.add_argument("--request", dest="request", action="store_true",
+                        help="""Send results as acknowledged requests instead of
+                        streaming them, as needed by 'tracking.py --async'.""")
+    parser.add_argument("--rig", dest="rig", default=None, type=str,
+                        help="""JSON file listing several offboard cameras, each
+                        with its own 'device', 'calibration', 'projection' and
+                        optional 'bounds'. Their detections are merged and
+                        published as one offboard stream. Cannot be combined
+                        with '--record', '--pipeline', '--undistort_points',
+                        '--workers', '--onboard' or '--show'.""")
+    parser.add_argument("--merge_distance", dest="merge_distance", default=0.5,
+                        type=float, help="""Feet within which targets seen by
+                        several rig cameras are merged. Defaults to 0.5.""")
+    add_arguments(parser)
     args = parser.parse_args()
+    if args.rig:
+        # these only apply to a single camera
+        unsupported = [flag for flag in ("record", "pipeline", "undistort_points",
+                                         "workers", "onboard", "show")
+                       if getattr(args, flag)]
+        if unsupported:
+            parser.error("'--rig' cannot be combined with %s." %
+                         ", ".join("'--%s'" % flag for flag in unsupported))
 
     main(args)